@@ -1,6 +1,6 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Shipping, Order, Shipped, Delivered, Canceled
-from store.models import Product  # ✅ Import Product model
+from .models import Cart, CartItem, Shipping, Order, Shipped, Delivered, Canceled, OrderLine
+from . import history, orders
 
 # ======================= CART ADMIN ======================= #
 class CartItemInline(admin.TabularInline):
@@ -22,110 +22,65 @@ class ShippingAdmin(admin.ModelAdmin):
 admin.site.register(Shipping, ShippingAdmin)
 
 # ======================= ORDER ADMIN ======================= #
-@admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user','product_details', 'total_price', 'status', 'order_date', 'order_time', 'address')
-    list_filter = ('status', 'order_date')
-    actions = ['mark_as_shipped', 'mark_as_canceled']
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    fields = ('product', 'product_name', 'unit_price', 'quantity')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
 
-    def product_details(self, obj):
-        return ", ".join([f"{name} ({qty})" for name, qty in obj.products.items()])
-    product_details.short_description = "Products"
-    def mark_as_shipped(self, request, queryset):
-        for order in queryset.filter(status="pending"):
-            Shipped.objects.create(
-                user=order.user,
-                products=order.products,
-                total_price=order.total_price,
-                shipping=order.shipping,
-                address=order.address,
-                status="shipped"
-            )
-            order.delete()  # ✅ Remove the order after shipping
+    def has_add_permission(self, request, obj=None):
+        return False
 
-    def mark_as_canceled(self, request, queryset):
-        for order in queryset.filter(status="pending"):
-            # ✅ Restore stock for each product in the order
-            for product_name, quantity in order.products.items():
-                try:
-                    product = Product.objects.get(name=product_name)
-                    product.quantity_available += quantity
-                    product.save()
-                except Product.DoesNotExist:
-                    pass  # Product might have been deleted
-
-            # ✅ Move order to Canceled table
-            Canceled.objects.create(
-                user=order.user,
-                products=order.products,
-                total_price=order.total_price,
-                shipping=order.shipping,
-                address=order.address,
-            )
-            order.delete()  # ✅ Remove the canceled order
+class OrderAdminMixin:
+    inlines = [OrderLineInline]
 
-    mark_as_shipped.short_description = "Mark selected orders as shipped"
-    mark_as_canceled.short_description = "Cancel selected orders and restore stock"
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'address').prefetch_related('lines')
 
-# ======================= SHIPPED ADMIN ======================= #
-@admin.register(Shipped)
-class ShippedAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'product_details','total_price', 'status', 'shipped_date' ,'address')
-    actions = ['mark_as_delivered', 'mark_as_canceled']
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        history.record([form.instance.id])  # Edits made in the form bypass cart/orders.py
 
     def product_details(self, obj):
         return ", ".join([f"{name} ({qty})" for name, qty in obj.products.items()])
     product_details.short_description = "Products"
+
+    # ✅ Each action is one UPDATE over the selected orders that may make the move
+    def mark_as_shipped(self, request, queryset):
+        orders.ship(queryset)
+
     def mark_as_delivered(self, request, queryset):
-        for shipped in queryset.filter(status="shipped"):
-            Delivered.objects.create(
-                user=shipped.user,
-                products=shipped.products,
-                total_price=shipped.total_price,
-                shipping=shipped.shipping,
-                address=shipped.address,
-            )
-            shipped.delete()  # ✅ Remove the shipped order
+        orders.deliver(queryset)
 
     def mark_as_canceled(self, request, queryset):
-        for shipped in queryset.filter(status="shipped"):
-            # ✅ Restore stock for each product in the canceled shipped order
-            for product_name, quantity in shipped.products.items():
-                try:
-                    product = Product.objects.get(name=product_name)
-                    product.quantity_available += quantity
-                    product.save()
-                except Product.DoesNotExist:
-                    pass  # Product might have been deleted
-
-            Canceled.objects.create(
-                user=shipped.user,
-                products=shipped.products,
-                total_price=shipped.total_price,
-                shipping=shipped.shipping,
-                address=shipped.address,
-            )
-            shipped.delete()  # ✅ Remove the shipped order
+        orders.cancel(queryset)  # ✅ Restores stock too
 
+    mark_as_shipped.short_description = "Mark selected orders as shipped"
     mark_as_delivered.short_description = "Mark selected orders as delivered"
     mark_as_canceled.short_description = "Cancel selected orders and restore stock"
 
+@admin.register(Order)
+class OrderAdmin(OrderAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user','product_details', 'total_price', 'status', 'order_date', 'order_time', 'address')
+    list_filter = ('status', 'order_date')
+    actions = ['mark_as_shipped', 'mark_as_delivered', 'mark_as_canceled']
+
+# ======================= SHIPPED ADMIN ======================= #
+@admin.register(Shipped)
+class ShippedAdmin(OrderAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'product_details','total_price', 'status', 'shipped_at' ,'address')
+    actions = ['mark_as_delivered', 'mark_as_canceled']
+
 # ======================= DELIVERED ADMIN ======================= #
 @admin.register(Delivered)
-class DeliveredAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'product_details','total_price', 'delivered_date' ,  'address')
+class DeliveredAdmin(OrderAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'product_details','total_price', 'delivered_at' ,  'address')
 
-    def product_details(self, obj):
-        return ", ".join([f"{name} ({qty})" for name, qty in obj.products.items()])
-    product_details.short_description = "Products"
 # ======================= CANCELED ADMIN ======================= #
 @admin.register(Canceled)
-class CanceledAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'product_details','total_price', 'canceled_date',  'address')
-
-    def product_details(self, obj):
-        return ", ".join([f"{name} ({qty})" for name, qty in obj.products.items()])
-    product_details.short_description = "Products"
+class CanceledAdmin(OrderAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'product_details','total_price', 'canceled_at',  'address')
 
 from django.contrib import admin
 from django.contrib.auth.models import Group
@@ -0,0 +1,6 @@
+from .summary import get_cart_summary
+
+
+def cart_summary(request):
+    """ Expose the header cart badge count without an extra AJAX round trip. """
+    return {'cart_item_count': get_cart_summary(request)['item_count']}
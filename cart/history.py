@@ -0,0 +1,75 @@
+"""
+Order history projection.
+
+OrderHistoryEntry holds everything the order history page shows of an
+order (status, its date, total, line names, quantities and thumbnail URLs)
+so a page of history is one query, whatever the number of lines or
+products. `record` writes the entries of new orders; `set_status` follows
+the transitions in cart/orders.py.
+"""
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+
+from store import images
+from store.models import ProductImage
+
+from .models import Order, OrderHistoryEntry, OrderLine
+
+# Width of the order history thumbnails, one of images.WIDTHS
+THUMBNAIL_WIDTH = 160
+
+# Orders read and written per batch by `record`
+BATCH_SIZE = 500
+
+
+def thumbnail_url(image):
+    """ URL of the smallest derivative of a ProductImage that fits THUMBNAIL_WIDTH, else of the original. """
+    if image is None or not image.image:
+        return None
+    name = image.image.name
+    if THUMBNAIL_WIDTH in images.derivative_widths(image.width):
+        name = images.derivative_name(name, THUMBNAIL_WIDTH, 'jpeg')
+    return default_storage.url(name)
+
+
+def _entries(orders):
+    product_ids = {line.product_id for order in orders for line in order.lines.all() if line.product_id}
+    thumbnails = {}
+    # Main images in id order: the first one of each product wins, as in Product.main_image
+    for image in ProductImage.objects.filter(product_id__in=product_ids, is_main=True).order_by('-id'):
+        thumbnails[image.product_id] = thumbnail_url(image)
+    return [
+        OrderHistoryEntry(
+            order=order,
+            user_id=order.user_id,
+            status=order.status,
+            status_date=order.status_date,
+            placed_at=order.placed_at,
+            total_price=order.total_price,
+            lines=[
+                {'name': line.product_name, 'quantity': line.quantity, 'thumbnail': thumbnails.get(line.product_id)}
+                for line in order.lines.all()
+            ],
+        )
+        for order in orders
+    ]
+
+
+def record(order_ids):
+    """ Write (or rewrite) the history entries of `order_ids`, a few queries per BATCH_SIZE orders. """
+    order_ids = list(order_ids)
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        orders = Order.objects.filter(id__in=order_ids[start:start + BATCH_SIZE]).prefetch_related(
+            Prefetch('lines', queryset=OrderLine.objects.order_by('id'))
+        )
+        OrderHistoryEntry.objects.bulk_create(
+            _entries(orders),
+            update_conflicts=True,
+            unique_fields=['order'],
+            update_fields=['status', 'status_date', 'total_price', 'lines'],
+        )
+
+
+def set_status(order_ids, status, when):
+    """ Follow a transition of `order_ids` to `status` at `when`. """
+    return OrderHistoryEntry.objects.filter(order_id__in=order_ids).update(status=status, status_date=when)
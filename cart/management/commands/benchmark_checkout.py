@@ -0,0 +1,124 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client
+from django.urls import reverse
+
+from cart.models import Cart, CartItem, Order
+from petshop.database import SQLITE_PRAGMAS, SQLITE_WAL_PRAGMAS, sqlite_init_command
+from store.benchmark import percentile, throwaway_database
+from store.models import Product
+from store.synthetic import create_catalog
+from userlogin.models import ContactInfo, CustomUser
+
+# Settings overrides compared per engine; the last profile is what settings.py configures
+# (for SQLite, with DATABASE_SQLITE_WAL)
+PROFILES = {
+    'sqlite': (
+        ('rollback journal', {'OPTIONS': {}}),
+        ('WAL + IMMEDIATE', {'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': sqlite_init_command({**SQLITE_WAL_PRAGMAS, **SQLITE_PRAGMAS}),
+        }}),
+    ),
+    'postgresql': (
+        ('per-request connections', {'CONN_MAX_AGE': 0}),
+        ('persistent connections', {}),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent checkout throughput under each database profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--checkouts', type=int, default=25, help="Checkouts per thread.")
+        parser.add_argument('--lines', type=int, default=3, help="Cart lines per checkout.")
+        parser.add_argument('--products', type=int, default=500)
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        original = {key: settings_dict.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE', 'TEST')}
+        workdir = tempfile.mkdtemp()
+
+        self.stdout.write(
+            f"{'profile':<26}{'threads':>8}{'orders':>8}{'failed':>8}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        )
+        try:
+            for label, overrides in PROFILES[connection.vendor]:
+                connection.close()  # The next connection picks up the overrides
+                settings_dict.update(original, **overrides)
+                if connection.vendor == 'sqlite':
+                    # The default in-memory test database has no journal to compare
+                    settings_dict['TEST'] = {**original['TEST'], 'NAME': os.path.join(workdir, 'checkout.sqlite3')}
+                with throwaway_database():
+                    result = self.run_profile(options)
+                self.stdout.write(
+                    f"{label:<26}{options['threads']:>8}{result['orders']:>8}{result['failed']:>8}"
+                    f"{result['orders'] / result['seconds']:>10.1f}"
+                    f"{percentile(result['latencies'], 50):>9.1f}{percentile(result['latencies'], 99):>9.1f}"
+                )
+        finally:
+            connection.close()
+            settings_dict.update(original)
+            os.rmdir(workdir)
+
+    def run_profile(self, options):
+        create_catalog(options['products'], images_per_product=0)
+        Product.objects.update(quantity_available=1_000_000)
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        shoppers = []
+        for i in range(options['threads']):
+            user = CustomUser.objects.create_user(email=f"bench{i}@example.com", username=f"bench{i}", password="x")
+            address = ContactInfo.objects.create(
+                user=user, phone_number="0", first_name="Bench", last_name=str(i),
+                address="1 Main St", city="Town", district="District", state="State", zipcode="00000",
+            )
+            client = Client(SERVER_NAME='localhost')
+            client.force_login(user)
+            shoppers.append((client, address.id, Cart.objects.create(user=user)))
+
+        latencies = []
+        failures = []
+        barrier = threading.Barrier(len(shoppers))
+
+        def shop(client, address_id, cart, seed):
+            rng = random.Random(seed)
+            barrier.wait()
+            try:
+                for _ in range(options['checkouts']):
+                    start = time.perf_counter()
+                    try:
+                        CartItem.objects.bulk_create(
+                            CartItem(cart=cart, product_id=pk, quantity=1)
+                            for pk in rng.sample(product_ids, options['lines'])
+                        )
+                        client.post(reverse('cart:place_order'), {'address_id': address_id})
+                    except OperationalError:  # "database is locked"
+                        failures.append(1)
+                        CartItem.objects.filter(cart=cart).delete()
+                        continue
+                    latencies.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=shop, args=(*shopper, i)) for i, shopper in enumerate(shoppers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        return {
+            'orders': Order.objects.count(),
+            'failed': len(failures),
+            'seconds': seconds,
+            'latencies': latencies or [0],
+        }
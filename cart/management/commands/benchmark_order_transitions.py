@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from cart import orders
+from cart.models import Order, OrderLine
+from store.benchmark import throwaway_database
+from store.models import Product
+from store.synthetic import create_catalog
+from userlogin.models import CustomUser
+
+
+class QueryCounter:
+    """ execute_wrapper counting statements; unlike CaptureQueriesContext it has no log size cap. """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def one_at_a_time(queryset, status):
+    # How the admin actions used to work: a separate move per selected order
+    for order_id in list(queryset.values_list('id', flat=True)):
+        orders.transition(Order.objects.filter(id=order_id), status)
+
+
+def set_based(queryset, status):
+    orders.transition(queryset, status)
+
+
+class Command(BaseCommand):
+    help = "Count database round trips and time for bulk order status transitions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--lines', type=int, default=3, help="Order lines per order.")
+        parser.add_argument('--products', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.populate(options['orders'], options['lines'], options['products'])
+
+            self.stdout.write(f"{'action':<10}{'strategy':<16}{'orders':>8}{'queries':>10}{'ms':>10}")
+            for label, move in (('per order', one_at_a_time), ('set-based', set_based)):
+                with transaction.atomic():
+                    # Each strategy starts from the same pending orders
+                    for action, status, queryset in (
+                        ('ship', 'shipped', Order.objects.all()),
+                        ('deliver', 'delivered', Order.objects.filter(id__in=self.even_ids)),
+                        ('cancel', 'canceled', Order.objects.all()),
+                    ):
+                        count = queryset.filter(status__in=orders.TRANSITIONS[status]).count()
+                        start = time.perf_counter()
+                        counter = QueryCounter()
+                        with connection.execute_wrapper(counter):
+                            move(queryset, status)
+                        elapsed = (time.perf_counter() - start) * 1000
+                        self.stdout.write(f"{action:<10}{label:<16}{count:>8}{counter.count:>10}{elapsed:>10.1f}")
+                    transaction.set_rollback(True)
+
+    def populate(self, order_count, lines_per_order, product_count):
+        self.stdout.write(f"Generating {order_count} orders of {lines_per_order} lines...")
+        create_catalog(product_count)
+        rng = random.Random(0)
+        user = CustomUser.objects.create_user(email="bench@example.com", username="bench", password="bench-pass")
+        products = list(Product.objects.values_list('id', 'name', 'price'))
+        day = timezone.now().strftime('%A')
+        created = Order.objects.bulk_create(
+            Order(user=user, total_price=0, order_day=day) for _ in range(order_count)
+        )
+        OrderLine.objects.bulk_create(
+            (
+                OrderLine(order=order, product_id=pk, product_name=name, unit_price=price, quantity=rng.randint(1, 3))
+                for order in created
+                for pk, name, price in rng.sample(products, lines_per_order)
+            ),
+            batch_size=5000,
+        )
+        self.even_ids = [order.id for order in created[::2]]
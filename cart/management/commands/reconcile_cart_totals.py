@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cart import totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the running item_count and subtotal of carts that disagree with their lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted carts without fixing them.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = totals.drifted().order_by('id')
+            if options['verbosity'] > 1:
+                rows = drifted.values_list('id', 'item_count', 'actual_item_count', 'subtotal', 'actual_subtotal')
+                for pk, item_count, actual_item_count, subtotal, actual_subtotal in rows:
+                    self.stdout.write(
+                        f"Cart {pk}: {item_count} items / {subtotal:.2f} stored, "
+                        f"{actual_item_count} items / {actual_subtotal:.2f} actual"
+                    )
+            if options['dry_run']:
+                count = drifted.count()
+            else:
+                count = totals.update_totals(totals.drifted())
+
+        verb = "would be reconciled" if options['dry_run'] else "reconciled"
+        self.stdout.write(f"{count} cart(s) {verb}.")
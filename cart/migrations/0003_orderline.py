@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_initial'),
+        ('store', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='canceled',
+            options={'verbose_name_plural': 'Canceled'},
+        ),
+        migrations.AlterModelOptions(
+            name='delivered',
+            options={'verbose_name_plural': 'Delivered'},
+        ),
+        migrations.AlterModelOptions(
+            name='order',
+            options={'verbose_name_plural': 'Order'},
+        ),
+        migrations.AlterModelOptions(
+            name='shipped',
+            options={'verbose_name_plural': 'Shipped'},
+        ),
+        migrations.AlterModelOptions(
+            name='shipping',
+            options={'verbose_name_plural': 'Shipping Charge'},
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=200)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField()),
+                ('canceled', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cart.canceled')),
+                ('delivered', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cart.delivered')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cart.order')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='store.product')),
+                ('shipped', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cart.shipped')),
+            ],
+            options={
+                'verbose_name_plural': 'Order Line',
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+import ast
+import json
+from decimal import Decimal
+
+from django.db import migrations
+
+# Order table -> OrderLine foreign key pointing at it
+ORDER_MODELS = {
+    'Order': 'order',
+    'Shipped': 'shipped',
+    'Delivered': 'delivered',
+    'Canceled': 'canceled',
+}
+
+
+def _parse_products(products):
+    # Early orders stored the dict as its repr() instead of JSON
+    if isinstance(products, str):
+        try:
+            products = json.loads(products)
+        except ValueError:
+            products = ast.literal_eval(products)
+    return products or {}
+
+
+def json_to_lines(apps, schema_editor):
+    OrderLine = apps.get_model('cart', 'OrderLine')
+    Product = apps.get_model('store', 'Product')
+    # One pass over the catalog instead of a name lookup per line
+    products = {}
+    for pk, name, price in Product.objects.order_by('-id').values_list('id', 'name', 'price'):
+        products[name] = (pk, price)
+
+    for model_name, field in ORDER_MODELS.items():
+        lines = []
+        for order in apps.get_model('cart', model_name).objects.all().iterator():
+            for name, quantity in _parse_products(order.products).items():
+                product_id, price = products.get(name, (None, Decimal('0.00')))
+                lines.append(OrderLine(
+                    product_id=product_id,
+                    product_name=name,
+                    unit_price=price,
+                    quantity=quantity,
+                    **{f'{field}_id': order.pk},
+                ))
+        OrderLine.objects.bulk_create(lines, batch_size=1000)
+
+
+def lines_to_json(apps, schema_editor):
+    OrderLine = apps.get_model('cart', 'OrderLine')
+    for model_name, field in ORDER_MODELS.items():
+        Model = apps.get_model('cart', model_name)
+        products = {}
+        for order_id, name, quantity in OrderLine.objects.filter(**{f'{field}__isnull': False}).values_list(
+            f'{field}_id', 'product_name', 'quantity'
+        ):
+            products.setdefault(order_id, {})[name] = quantity
+        for order in Model.objects.all().iterator():
+            order.products = products.get(order.pk, {})
+            order.save(update_fields=['products'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(json_to_lines, lines_to_json),
+    ]
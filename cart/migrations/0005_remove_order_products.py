@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0004_orderline_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='canceled',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='delivered',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='shipped',
+            name='products',
+        ),
+    ]
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+from django.utils import timezone
+
+# Legacy table -> (its date field, OrderLine foreign key pointing at it)
+LEGACY_TABLES = {
+    'Shipped': ('shipped_date', 'shipped'),
+    'Delivered': ('delivered_date', 'delivered'),
+    'Canceled': ('canceled_date', 'canceled'),
+}
+
+# Status an order has after being folded in from each legacy table
+LEGACY_STATUS = {'Shipped': 'shipped', 'Delivered': 'delivered', 'Canceled': 'canceled'}
+
+
+def fold_into_order(apps, schema_editor):
+    Order = apps.get_model('cart', 'Order')
+    OrderLine = apps.get_model('cart', 'OrderLine')
+
+    for order in Order.objects.all().iterator():
+        placed_at = datetime.combine(order.order_date, order.order_time)
+        Order.objects.filter(pk=order.pk).update(placed_at=timezone.make_aware(placed_at, dt_timezone.utc))
+
+    for model_name, (date_field, line_field) in LEGACY_TABLES.items():
+        for legacy in apps.get_model('cart', model_name).objects.all().iterator():
+            date = getattr(legacy, date_field)
+            # Shipped rows carry their own status; the other tables imply it
+            status = getattr(legacy, 'status', None) or LEGACY_STATUS[model_name]
+            order = Order.objects.create(
+                user_id=legacy.user_id,
+                total_price=legacy.total_price,
+                shipping_id=legacy.shipping_id,
+                address_id=legacy.address_id,
+                status=status,
+                order_day=date.strftime('%A'),
+                placed_at=date,
+                **{f'{status}_at': date},
+            )
+            # order_date and order_time are auto_now_add, so set them after the insert
+            Order.objects.filter(pk=order.pk).update(order_date=date.date(), order_time=date.time())
+            OrderLine.objects.filter(**{line_field: legacy}).update(**{line_field: None, 'order': order})
+        apps.get_model('cart', model_name).objects.all().delete()
+
+
+def split_from_order(apps, schema_editor):
+    Order = apps.get_model('cart', 'Order')
+    OrderLine = apps.get_model('cart', 'OrderLine')
+
+    for model_name, (date_field, line_field) in LEGACY_TABLES.items():
+        Model = apps.get_model('cart', model_name)
+        for order in Order.objects.filter(status=LEGACY_STATUS[model_name]).iterator():
+            extra = {'status': order.status} if model_name == 'Shipped' else {}
+            legacy = Model.objects.create(
+                user_id=order.user_id,
+                total_price=order.total_price,
+                shipping_id=order.shipping_id,
+                address_id=order.address_id,
+                **{date_field: getattr(order, f'{order.status}_at') or order.placed_at},
+                **extra,
+            )
+            OrderLine.objects.filter(order=order).update(order=None, **{line_field: legacy})
+            order.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0006_order_status_timestamps'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_into_order, split_from_order),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0007_fold_order_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='orderline',
+            name='canceled',
+        ),
+        migrations.RemoveField(
+            model_name='orderline',
+            name='delivered',
+        ),
+        migrations.RemoveField(
+            model_name='orderline',
+            name='shipped',
+        ),
+        migrations.AlterField(
+            model_name='orderline',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cart.order'),
+        ),
+        migrations.DeleteModel(
+            name='Canceled',
+        ),
+        migrations.DeleteModel(
+            name='Delivered',
+        ),
+        migrations.DeleteModel(
+            name='Shipped',
+        ),
+        migrations.CreateModel(
+            name='Canceled',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'Canceled',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('cart.order',),
+        ),
+        migrations.CreateModel(
+            name='Delivered',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'Delivered',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('cart.order',),
+        ),
+        migrations.CreateModel(
+            name='Shipped',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'Shipped',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('cart.order',),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:24
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Make room for the one-cart-per-user and one-line-per-product constraints:
+    each user keeps their oldest cart, which takes over the items of the
+    others, and repeated lines for a product are summed into the first.
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    duplicated_users = Cart.objects.values('user').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+    for row in duplicated_users:
+        extra = Cart.objects.filter(user=row['user']).exclude(id=row['keep'])
+        CartItem.objects.filter(cart__in=extra).update(cart=row['keep'])
+        extra.delete()
+
+    duplicated_lines = (
+        CartItem.objects.values('cart', 'product')
+        .annotate(lines=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicated_lines:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['quantity'])
+        CartItem.objects.filter(cart=row['cart'], product=row['product']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0008_remove_legacy_order_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_totals(apps, schema_editor):
+    """ Fill the new running totals of existing carts from their lines. """
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    line_total = models.ExpressionWrapper(
+        F('quantity') * F('product__price'), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+    Cart.objects.update(
+        item_count=Coalesce(Subquery(lines.annotate(n=Count('id')).values('n')), 0),
+        subtotal=Round(Coalesce(Subquery(lines.annotate(total=Sum(line_total)).values('total')), Decimal('0.00')), 2),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0010_cart_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
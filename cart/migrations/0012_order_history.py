@@ -0,0 +1,72 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:35
+
+import os
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def thumbnail_name(name, width):
+    # The 160px JPEG derivative, if one was made, named as store.images did when this was written
+    if width and width > 160:
+        root, _ = os.path.splitext(name)
+        return f"derivatives/{root}-160w.jpg"
+    return name
+
+
+def backfill_history(apps, schema_editor):
+    """ Project every existing order, as cart.history.record does for new ones. """
+    Order = apps.get_model('cart', 'Order')
+    OrderHistoryEntry = apps.get_model('cart', 'OrderHistoryEntry')
+    ProductImage = apps.get_model('store', 'ProductImage')
+
+    thumbnails = {}
+    for image in ProductImage.objects.filter(is_main=True).exclude(image='').order_by('-id'):
+        thumbnails[image.product_id] = default_storage.url(thumbnail_name(image.image.name, image.width))
+
+    entries = []
+    for order in Order.objects.prefetch_related('lines').iterator(chunk_size=500):
+        entries.append(OrderHistoryEntry(
+            order=order,
+            user_id=order.user_id,
+            status=order.status,
+            status_date=getattr(order, f'{order.status}_at', None) or order.placed_at,
+            placed_at=order.placed_at,
+            total_price=order.total_price,
+            lines=[
+                {'name': line.product_name, 'quantity': line.quantity, 'thumbnail': thumbnails.get(line.product_id)}
+                for line in sorted(order.lines.all(), key=lambda line: line.id)
+            ],
+        ))
+    OrderHistoryEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0011_cart_totals'),
+        ('store', '0005_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHistoryEntry',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='history_entry', serialize=False, to='cart.order')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], default='pending', max_length=10)),
+                ('status_date', models.DateTimeField()),
+                ('placed_at', models.DateTimeField()),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('lines', models.JSONField(default=list)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Order History',
+                'indexes': [models.Index(fields=['user', '-placed_at', '-order'], name='cart_history_user_placed_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0012_order_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at'], name='cart_order_placed_idx'),
+        ),
+    ]
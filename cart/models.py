@@ -8,12 +8,17 @@ from userlogin.models import ContactInfo
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(default=timezone.now)
+    # ✅ Running totals of the items below, kept by cart/totals.py
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
     def __str__(self):
         return f"Cart of {self.user.username}"
 
     class Meta:
         verbose_name_plural = "Cart"
+        # One cart per user, so concurrent get_or_create calls cannot both insert
+        constraints = [models.UniqueConstraint(fields=['user'], name='cart_cart_one_per_user')]
 
 # Cart Item Model
 class CartItem(models.Model):
@@ -29,6 +34,7 @@ class CartItem(models.Model):
     
     class Meta:
         verbose_name_plural = "Cart Item"
+        constraints = [models.UniqueConstraint(fields=['cart', 'product'], name='cart_cartitem_cart_product_unique')]
 
 # Shipping Model
 class Shipping(models.Model):
@@ -42,15 +48,25 @@ class Shipping(models.Model):
 
 # Order Model
 class Order(models.Model):
+    """
+    An order and its fulfilment state. Orders move through
+    pending -> shipped -> delivered, or to canceled from pending or shipped,
+    by updating `status` in place (see cart/orders.py).
+    """
+    STATUS_CHOICES = [('pending', 'Pending'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    products = models.JSONField(default=dict)  # Store multiple products as {"product_name": quantity}
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     shipping = models.ForeignKey(Shipping, on_delete=models.SET_NULL, null=True)
     address = models.ForeignKey(ContactInfo, on_delete=models.SET_NULL, null=True)
-    status = models.CharField(max_length=10, choices=[('pending', 'Pending'), ('shipped', 'Shipped'), ('canceled', 'Canceled')], default='pending')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
     order_date = models.DateField(auto_now_add=True)
     order_time = models.TimeField(auto_now_add=True)
     order_day = models.CharField(max_length=20)
+    placed_at = models.DateTimeField(default=timezone.now)
+    shipped_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    canceled_at = models.DateTimeField(null=True, blank=True)
 
     def save(self, *args, **kwargs):
         self.order_day = timezone.now().strftime('%A')  # Set dynamically on save
@@ -59,48 +75,102 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.id} - {self.user.username} - {self.status}"
 
+    @property
+    def products(self):
+        # Compatibility accessor for the former {"product_name": quantity} JSON field
+        return {line.product_name: line.quantity for line in self.lines.all()}
+
+    @property
+    def status_date(self):
+        """ When the order entered its current status. """
+        return getattr(self, f'{self.status}_at', None) or self.placed_at
+
     class Meta:
         verbose_name_plural = "Order"
+        indexes = [
+            models.Index(fields=['user', '-placed_at'], name='cart_order_user_placed_idx'),
+            models.Index(fields=['placed_at'], name='cart_order_placed_idx'),  # New orders, for store.recommendations
+        ]
+
+class OrderStatusManager(models.Manager):
+    """ Default manager of the per-status proxies below. """
+
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+
+    def get_queryset(self):
+        return super().get_queryset().filter(status=self.status)
+
 # Shipped Orders Model
-class Shipped(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    products = models.JSONField(default=dict)
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    shipping = models.ForeignKey(Shipping, on_delete=models.SET_NULL, null=True)
-    address = models.ForeignKey(ContactInfo, on_delete=models.SET_NULL, null=True)
-    status = models.CharField(max_length=10, choices=[('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], default='shipped')
-    shipped_date = models.DateTimeField(default=timezone.now)
-    
+class Shipped(Order):
+    objects = OrderStatusManager('shipped')
+
     def __str__(self):
         return f"Shipped Order {self.id} - {self.user.username} - {self.status}"
 
     class Meta:
+        proxy = True
         verbose_name_plural = "Shipped"
 # Delivered Orders Model
-class Delivered(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    products = models.JSONField(default=dict)
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    shipping = models.ForeignKey(Shipping, on_delete=models.SET_NULL, null=True)
-    address = models.ForeignKey(ContactInfo, on_delete=models.SET_NULL, null=True)
-    delivered_date = models.DateTimeField(default=timezone.now)
-    
+class Delivered(Order):
+    objects = OrderStatusManager('delivered')
+
     def __str__(self):
         return f"Delivered Order {self.id} - {self.user.username}"
 
     class Meta:
+        proxy = True
         verbose_name_plural = "Delivered"
 # Canceled Orders Model
-class Canceled(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    products = models.JSONField(default=dict)  # Store product details as JSON
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    shipping = models.ForeignKey(Shipping, on_delete=models.SET_NULL, null=True)
-    address = models.ForeignKey(ContactInfo, on_delete=models.SET_NULL, null=True)
-    canceled_date = models.DateTimeField(default=timezone.now)
-    
+class Canceled(Order):
+    objects = OrderStatusManager('canceled')
+
     def __str__(self):
         return f"Canceled Order {self.id} - {self.user.username}"
 
     class Meta:
-        verbose_name_plural = "Canceled"
\ No newline at end of file
+        proxy = True
+        verbose_name_plural = "Canceled"
+# Order Line Model
+class OrderLine(models.Model):
+    """
+    One product of an order, with the name and price it was ordered at.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='order_lines')
+    product_name = models.CharField(max_length=200)  # Snapshot, kept if the product is deleted
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)  # Price when the order was placed
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_name}"
+
+    def get_total_price(self):
+        return self.unit_price * self.quantity
+
+    class Meta:
+        verbose_name_plural = "Order Line"
+
+# Order History Model
+class OrderHistoryEntry(models.Model):
+    """
+    What the order history page shows of one order, in one row: the page is
+    a single indexed query over (user, placed_at). Written when the order is
+    placed and kept in step with its status by cart/history.py.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='history_entry')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES, default='pending')
+    status_date = models.DateTimeField()  # When the order entered `status`
+    placed_at = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    lines = models.JSONField(default=list)  # [{"name", "quantity", "thumbnail"}], thumbnail a URL or null
+
+    def __str__(self):
+        return f"History of order {self.order_id}"
+
+    class Meta:
+        verbose_name_plural = "Order History"
+        indexes = [models.Index(fields=['user', '-placed_at', '-order'], name='cart_history_user_placed_idx')]
+
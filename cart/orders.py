@@ -0,0 +1,67 @@
+"""
+Order status transitions.
+
+Orders stay in the one `Order` table; a transition is an UPDATE of its
+`status` and the matching `<status>_at` timestamp, applied to every order
+of a queryset that is allowed to make it. The whole move, including giving
+stock back on cancellation, runs inside one transaction and costs a few
+statements for the whole selection rather than a few per order.
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Order, OrderLine
+from . import history, stock
+
+# new status -> statuses it can be reached from
+TRANSITIONS = {
+    'shipped': ('pending',),
+    'delivered': ('shipped',),
+    'canceled': ('pending', 'shipped'),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def restock(order_ids):
+    """ Give the quantities ordered in `order_ids` back to stock, summed per product. """
+    stock.release(dict(
+        OrderLine.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .values('product_id').annotate(total=Sum('quantity')).order_by('product_id')
+        .values_list('product_id', 'total')
+    ))
+
+
+def transition(orders, status):
+    """
+    Move the orders of `orders` that may reach `status` into it and return
+    how many were moved. Canceled orders give their stock back.
+    """
+    if status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown order status {status!r}")
+
+    with transaction.atomic():
+        orders = orders.filter(status__in=TRANSITIONS[status])
+        order_ids = list(orders.select_for_update().values_list('id', flat=True))
+        if not order_ids:
+            return 0
+        if status == 'canceled':
+            restock(order_ids)
+        now = timezone.now()
+        history.set_status(order_ids, status, now)
+        return Order.objects.filter(id__in=order_ids).update(status=status, **{f'{status}_at': now})
+
+
+def ship(orders):
+    return transition(orders, 'shipped')
+
+
+def deliver(orders):
+    return transition(orders, 'delivered')
+
+
+def cancel(orders):
+    return transition(orders, 'canceled')
@@ -0,0 +1,31 @@
+from django.db.models import DecimalField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+
+from store.models import Product
+
+from .models import Cart, CartItem
+from . import totals
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_price(sender, instance, raw, **kwargs):
+    instance._previous_price = None
+    if instance.pk and not raw:
+        instance._previous_price = Product.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, **kwargs):
+    # Subtotals follow the current price of the products in the cart: each
+    # cart holding it gains its quantity times the price change
+    previous = getattr(instance, '_previous_price', None)
+    if created or previous is None:
+        return
+    change = sender._meta.get_field('price').to_python(instance.price) - previous
+    if change:
+        quantity = CartItem.objects.filter(cart=OuterRef('pk'), product=instance).values('quantity')
+        totals.add_to_totals(
+            Cart.objects.filter(items__product=instance),
+            subtotal=ExpressionWrapper(Subquery(quantity) * change, output_field=DecimalField()),
+        )
@@ -0,0 +1,102 @@
+"""
+Stock reservation.
+
+Stock is only ever changed with conditional, relative UPDATEs computed by
+the database, never by saving a quantity read earlier, so concurrent
+checkouts cannot oversell and unrelated product columns are not rewritten.
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from store.catalog import bump_stock_versions, bump_storefront_version
+from store.models import Product
+
+# Products changed per UPDATE, to stay under the database's parameter limit
+BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """ Raised when some products do not have the requested quantity. """
+
+    def __init__(self, shortages):
+        # product id -> quantity still available
+        self.shortages = shortages
+        super().__init__(f"Not enough stock for products {sorted(shortages)}")
+
+
+def _per_product(quantities):
+    """ CASE expression giving each product its quantity; equal quantities share a branch. """
+    by_quantity = defaultdict(list)
+    for pk, quantity in quantities.items():
+        by_quantity[quantity].append(pk)
+    return Case(
+        *[When(pk__in=pks, then=Value(quantity)) for quantity, pks in by_quantity.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _batches(quantities):
+    items = sorted(quantities.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        yield dict(items[start:start + BATCH_SIZE])
+
+
+def reserve(quantities):
+    """
+    Take `quantities` ({product_id: quantity}) out of stock, all or nothing.
+    Each product is decremented only if it still has enough stock at the
+    moment of the UPDATE; if any does not, nothing is reserved and
+    InsufficientStock reports the products that fell short.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    with transaction.atomic():
+        reserved = 0
+        for batch in _batches(quantities):
+            wanted = _per_product(batch)
+            reserved += Product.objects.filter(pk__in=batch, quantity_available__gte=wanted).update(
+                quantity_available=F('quantity_available') - wanted
+            )
+        complete = reserved == len(quantities)
+        if not complete:
+            transaction.set_rollback(True)
+        else:
+            _stock_changed(quantities)
+
+    if not complete:
+        # Read after the rollback so our own partial decrements are not counted
+        available = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'quantity_available'))
+        raise InsufficientStock({
+            pk: available.get(pk, 0) for pk, quantity in quantities.items() if available.get(pk, 0) < quantity
+        })
+
+
+def release(quantities):
+    """ Put `quantities` ({product_id: quantity}) back into stock. """
+    for batch in _batches(quantities):
+        Product.objects.filter(pk__in=batch).update(quantity_available=F('quantity_available') + _per_product(batch))
+    _stock_changed(quantities, released=True)
+
+
+def _stock_changed(quantities, released=False):
+    """
+    UPDATEs send no signals, but cached pages show stock levels: once the
+    transaction commits, the pages of the products, their categories and
+    the best sellers get new stock versions. Only a product going out of or
+    back into stock bumps the storefront version, and with it every page.
+    """
+    scopes, crossed_zero = set(), False
+    for batch in _batches(quantities):
+        rows = Product.objects.filter(pk__in=batch).values_list('pk', 'category_id', 'best_selling', 'quantity_available')
+        for pk, category_id, best_selling, available in rows:
+            scopes.update((f'product:{pk}', f'category:{category_id}'))
+            if best_selling:
+                scopes.add('best-selling')
+            # Released stock crossed zero if it is all there is now
+            crossed_zero = crossed_zero or available == (batch[pk] if released else 0)
+    if scopes:
+        transaction.on_commit(partial(bump_stock_versions, scopes))
+    if crossed_zero:
+        transaction.on_commit(bump_storefront_version)
@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import CartItem
+
+# Seconds a summary may live in the cache; cart views invalidate it explicitly,
+# the timeout only bounds staleness after e.g. a product price change.
+CART_SUMMARY_TIMEOUT = 300
+
+EMPTY_CART_SUMMARY = {'product_ids': frozenset(), 'item_count': 0, 'subtotal': Decimal('0.00')}
+
+
+def _cache_key(user_id):
+    return f"cart-summary:{user_id}"
+
+
+def _summary(rows):
+    # Each row repeats the cart's running totals (cart/totals.py) next to one of its lines
+    product_ids = frozenset(product_id for product_id, _, _ in rows)
+    if not rows:
+        return EMPTY_CART_SUMMARY
+    _, item_count, subtotal = rows[0]
+    return {'product_ids': product_ids, 'item_count': item_count, 'subtotal': subtotal}
+
+
+def _rows(user):
+    return CartItem.objects.filter(cart__user=user).values_list('product_id', 'cart__item_count', 'cart__subtotal')
+
+
+def compute_cart_summary(user):
+    """ Build the summary of a user's cart with a single query, the totals read from the cart row. """
+    return _summary(list(_rows(user)))
+
+
+async def acompute_cart_summary(user):
+    """ compute_cart_summary() for async views. """
+    return _summary([row async for row in _rows(user)])
+
+
+def get_cart_summary(request):
+    """
+    Return the cart summary (`product_ids`, `item_count`, `subtotal`) of the
+    current user. It is computed at most once per request and cached per user
+    until the cart changes.
+    """
+    summary = getattr(request, '_cart_summary', None)
+    if summary is not None:
+        return summary
+
+    if not request.user.is_authenticated:
+        summary = EMPTY_CART_SUMMARY
+    else:
+        key = _cache_key(request.user.pk)
+        summary = cache.get(key)
+        if summary is None:
+            summary = compute_cart_summary(request.user)
+            cache.set(key, summary, CART_SUMMARY_TIMEOUT)
+
+    request._cart_summary = summary
+    return summary
+
+
+async def aget_cart_summary(request):
+    """ get_cart_summary() for async views. """
+    summary = getattr(request, '_cart_summary', None)
+    if summary is not None:
+        return summary
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        summary = EMPTY_CART_SUMMARY
+    else:
+        key = _cache_key(user.pk)
+        summary = await cache.aget(key)
+        if summary is None:
+            summary = await acompute_cart_summary(user)
+            await cache.aset(key, summary, CART_SUMMARY_TIMEOUT)
+
+    request._cart_summary = summary
+    return summary
+
+
+def invalidate_cart_summary(user):
+    """ Drop the cached summary; call after any change to the user's cart. """
+    cache.delete(_cache_key(user.pk))
+
+
+async def ainvalidate_cart_summary(user):
+    await cache.adelete(_cache_key(user.pk))
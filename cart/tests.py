@@ -1,3 +1,482 @@
-from django.test import TestCase
+from django.core.cache import cache
+import threading
+from inspect import iscoroutinefunction
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.urls import resolve, reverse
+from decimal import Decimal
+from functools import partial
+from io import StringIO
+from unittest.mock import patch
+
+from userlogin.models import CustomUser, ContactInfo
+from store import typeahead
+from store.benchmark import routed_for
+from store.models import Category, Product, ProductImage
+from .models import Cart, CartItem, Shipping, Order, OrderHistoryEntry, Shipped, Delivered, Canceled
+from . import orders, stock, totals, views
+from .summary import get_cart_summary
+
+
+class CartTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Cats")
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        self.address = ContactInfo.objects.create(user=self.user, address="1 Main Street", city="Pune")
+        self.cart = Cart.objects.create(user=self.user)
+        Shipping.objects.create(charge=70)
+        self.client.force_login(self.user)
+
+    def add_items(self, count, quantity=1, stock=10):
+        items = []
+        for _ in range(count):
+            n = Product.objects.count()
+            product = Product.objects.create(
+                name=f"Cat Toy {n}", category=self.category, price=50 + n, quantity_available=stock
+            )
+            ProductImage.objects.create(product=product, image=f"product_images/toy{n}.jpg", is_main=True)
+            items.append(CartItem.objects.create(cart=self.cart, product=product, quantity=quantity))
+        totals.update_totals(self.cart)
+        return items
+
+
+class CartMainImageQueryCountTests(CartTestCase):
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_items(2)
+        before = self.count_queries(url)
+        self.add_items(5)
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_view_cart(self):
+        self.assertConstantQueries(reverse('cart:view_cart'))
+
+    def test_checkout(self):
+        self.assertConstantQueries(reverse('cart:checkout'))
+
+
+class CartSummaryTests(CartTestCase):
+
+    def get_count(self):
+        response = self.client.get(reverse('store:get_cart_item_count'))
+        return response.json()['cart_item_count']
+
+    def test_summary_is_cached_between_requests(self):
+        self.add_items(2, quantity=3)
+        self.assertEqual(self.get_count(), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_count(), 2)
+        self.assertFalse(any('cart_cartitem' in q['sql'] for q in queries))
+
+    def test_summary_totals(self):
+        first, second = self.add_items(2, quantity=3)
+        request = self.client.get(reverse('store:index')).wsgi_request
+        summary = get_cart_summary(request)
+        self.assertEqual(summary['product_ids'], {first.product_id, second.product_id})
+        self.assertEqual(summary['subtotal'], first.get_total_price() + second.get_total_price())
+
+    def test_cart_changes_invalidate_summary(self):
+        item, = self.add_items(1)
+        self.assertEqual(self.get_count(), 1)
+
+        product = Product.objects.create(name="Scratcher", category=self.category, price=30, quantity_available=5)
+        self.client.post(reverse('cart:add_to_cart', args=[product.id]), {'quantity': 1})
+        self.assertEqual(self.get_count(), 2)
+
+        self.client.post(reverse('cart:remove_from_cart', args=[item.id]))
+        self.assertEqual(self.get_count(), 1)
+
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        self.assertEqual(self.get_count(), 0)
+
+    def test_header_badge_uses_summary(self):
+        self.add_items(3)
+        response = self.client.get(reverse('store:about_us'))
+        self.assertContains(response, '<span class="cart-count" id="cart-count">3</span>', html=False)
+        # Rendered with the page, so not fetched again once it loads
+        self.assertContains(response, 'function updateCartCount()', count=1)
+        self.assertNotContains(response, 'updateCartCount();')
+
+
+class OrderLineTests(CartTestCase):
+
+    def place_order(self):
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        return Order.objects.latest('id')
+
+    def test_place_order_snapshots_lines(self):
+        first, second = self.add_items(2, quantity=2)
+        order = self.place_order()
+        first.product.price = 1
+        first.product.save()
+        line = order.lines.get(product=first.product)
+        self.assertEqual(line.unit_price, 50)
+        self.assertEqual(order.products, {first.product.name: 2, second.product.name: 2})
+
+    def test_cancel_order_restocks(self):
+        item, = self.add_items(1, quantity=3, stock=10)
+        order = self.place_order()
+        self.assertEqual(Product.objects.get(id=item.product_id).quantity_available, 7)
+
+        self.client.post(reverse('cart:cancel_order', args=[order.id]))
+        self.assertEqual(Product.objects.get(id=item.product_id).quantity_available, 10)
+        canceled = Canceled.objects.get(user=self.user)
+        self.assertEqual(canceled.id, order.id)
+        self.assertEqual(canceled.products, {item.product.name: 3})
+
+        # Canceling again must not restock twice
+        self.client.post(reverse('cart:cancel_order', args=[order.id]))
+        self.assertEqual(Product.objects.get(id=item.product_id).quantity_available, 10)
+
+    def test_order_history_query_count_is_constant(self):
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('cart:order_history'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.add_items(2)
+        self.place_order()
+        before = count_queries()
+        for _ in range(3):
+            self.add_items(3)
+            self.place_order()
+        self.assertEqual(count_queries(), before)
+
+
+class OrderStatusTests(CartTestCase):
+
+    def place_orders(self, count):
+        for _ in range(count):
+            self.add_items(1, quantity=2, stock=5)
+            self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        return Order.objects.order_by('id')
+
+    def test_transitions_follow_state_machine(self):
+        first, second, third = self.place_orders(3)
+        self.assertEqual(orders.ship(Order.objects.filter(id__in=[first.id, second.id])), 2)
+        self.assertEqual(orders.deliver(Order.objects.all()), 2)
+        self.assertEqual(orders.ship(Order.objects.filter(id=first.id)), 0)  # Already delivered
+        self.assertEqual(orders.cancel(Order.objects.all()), 1)
+
+        self.assertEqual(list(Delivered.objects.values_list('id', flat=True)), [first.id, second.id])
+        self.assertFalse(Shipped.objects.exists())
+        canceled = Canceled.objects.get()
+        self.assertEqual(canceled.id, third.id)
+        self.assertIsNotNone(canceled.canceled_at)
+        self.assertEqual(canceled.status_date, canceled.canceled_at)
+        self.assertEqual(Product.objects.get(order_lines__order=third).quantity_available, 5)
+        self.assertEqual(Product.objects.get(order_lines__order=first).quantity_available, 3)
+
+        with self.assertRaises(orders.InvalidTransition):
+            orders.transition(Order.objects.all(), 'pending')
+
+    def test_cancel_is_set_based(self):
+        def cancel_queries(count):
+            self.place_orders(count)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(orders.cancel(Order.objects.filter(status='pending')), count)
+            return len(queries)
+
+        self.assertEqual(cancel_queries(1), cancel_queries(6))
+        self.assertEqual(set(Product.objects.values_list('quantity_available', flat=True)), {5})
+
+    def test_restock_sums_lines_per_product(self):
+        first, second = self.add_items(2, quantity=2, stock=5)
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        CartItem.objects.create(cart=self.cart, product=first.product, quantity=3)
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        self.assertEqual(Product.objects.get(id=first.product_id).quantity_available, 0)
+
+        orders.restock(Order.objects.values_list('id', flat=True))
+        self.assertEqual(Product.objects.get(id=first.product_id).quantity_available, 5)
+        self.assertEqual(Product.objects.get(id=second.product_id).quantity_available, 5)
+
+    def test_history_is_one_ordered_query(self):
+        first, second, third = self.place_orders(3)
+        orders.ship(Order.objects.filter(id=first.id))
+        orders.cancel(Order.objects.filter(id=second.id))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart:order_history'))
+        self.assertEqual(len([q for q in queries if 'cart_order' in q['sql']]), 1)
+        self.assertEqual(
+            [(o.order_id, o.get_status_display()) for o in response.context['orders']],
+            [(third.id, 'Pending'), (second.id, 'Canceled'), (first.id, 'Shipped')],
+        )
+
+
+class AsyncEndpointTests(CartTestCase):
+
+    URLS = ('store:get_cart_item_count', 'store:ajax_search')
+
+    def test_wsgi_routes_the_sync_views(self):
+        for name in self.URLS:
+            self.assertFalse(iscoroutinefunction(resolve(reverse(name)).func), name)
+
+    async def test_json_endpoints_run_async(self):
+        self.enterContext(routed_for('asgi'))
+        for name in self.URLS:
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name)).func), name)
+        item, = await sync_to_async(self.add_items)(1, quantity=2)
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+
+        response = await client.get(reverse('store:get_cart_item_count'))
+        self.assertEqual(response.json(), {'cart_item_count': 1})
+
+        response = await client.post(reverse('cart:update_cart', args=[item.id]), {'quantity_change': 'increase'})
+        self.assertEqual(response.json()['cart_summary']['subtotal'], '$150.00')
+        # Queries made from the async view's threads are still counted
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+        self.assertEqual((await CartItem.objects.aget(id=item.id)).quantity, 3)
+
+        # Built here: async rebuilds use their own connection, outside this test's transaction
+        await sync_to_async(typeahead.get_index)()
+        response = await client.get(reverse('store:ajax_search'), {'q': 'cat'})
+        self.assertEqual([p['name'] for p in response.json()['results']['products']], [item.product.name])
+
+
+class OrderHistoryTests(CartTestCase):
+
+    def place_order(self, count=1, quantity=1):
+        self.add_items(count, quantity=quantity)
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        return Order.objects.latest('id')
+
+    def test_entry_snapshots_order(self):
+        order = self.place_order(2, quantity=2)
+        entry = OrderHistoryEntry.objects.get(order=order)
+        self.assertEqual((entry.user, entry.status, entry.total_price), (self.user, 'pending', order.total_price))
+        self.assertEqual(entry.lines, [
+            {'name': line.product_name, 'quantity': 2, 'thumbnail': f'/media/{line.product.main_image.image.name}'}
+            for line in order.lines.order_by('id')
+        ])
+
+    def test_entry_follows_transitions(self):
+        order = self.place_order()
+        orders.ship(Order.objects.filter(id=order.id))
+        order.refresh_from_db()
+        entry = OrderHistoryEntry.objects.get(order=order)
+        self.assertEqual((entry.status, entry.status_date), ('shipped', order.shipped_at))
+
+    def test_pages_are_one_query(self):
+        for _ in range(3):
+            self.place_order()
+        with patch('cart.views.ORDER_HISTORY_PAGE_SIZE', 2):
+            with CaptureQueriesContext(connection) as queries:
+                first_page = self.client.get(reverse('cart:order_history'))
+            self.assertEqual(len([q for q in queries if 'cart_order' in q['sql']]), 1)
+            second_page = self.client.get(reverse('cart:order_history'), {'page': 2})
+        self.assertEqual(len(first_page.context['orders']), 2)
+        self.assertEqual((first_page.context['previous_page'], first_page.context['next_page']), (None, 2))
+        self.assertEqual(len(second_page.context['orders']), 1)
+        self.assertEqual((second_page.context['previous_page'], second_page.context['next_page']), (1, None))
+
+
+class StockReservationTests(CartTestCase):
+
+    def place_order(self):
+        return self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+
+    def test_short_line_rolls_back_whole_order(self):
+        plenty, short = self.add_items(2, quantity=3, stock=5)
+        Product.objects.filter(id=short.product_id).update(quantity_available=2)
+
+        response = self.place_order()
+        self.assertRedirects(response, reverse('cart:view_cart'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertEqual(Product.objects.get(id=plenty.product_id).quantity_available, 5)
+        self.assertEqual(Product.objects.get(id=short.product_id).quantity_available, 2)
+
+    def test_reports_every_short_product(self):
+        first, second, third = self.add_items(3, stock=4)
+        with self.assertRaises(stock.InsufficientStock) as raised:
+            stock.reserve({first.product_id: 4, second.product_id: 5, third.product_id: 9})
+        self.assertEqual(raised.exception.shortages, {second.product_id: 4, third.product_id: 4})
+        self.assertEqual(Product.objects.get(id=first.product_id).quantity_available, 4)
+
+    def test_place_order_query_count_is_constant(self):
+        def order_queries(count):
+            self.add_items(count)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.place_order()
+            return len(queries)
+
+        self.assertEqual(order_queries(1), order_queries(6))
+        self.assertEqual(set(Product.objects.values_list('quantity_available', flat=True)), {9})
+
+
+class CartConstraintTests(CartTestCase):
+
+    def test_one_cart_per_user(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+    def test_one_line_per_product(self):
+        item, = self.add_items(1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=item.product)
+
+    def test_adding_twice_increments_the_line(self):
+        item, = self.add_items(1, quantity=1)
+        self.client.post(reverse('cart:add_to_cart', args=[item.product_id]), {'quantity': 2})
+        self.assertEqual(list(self.cart.items.values_list('product_id', 'quantity')), [(item.product_id, 3)])
+
+
+class CartTotalsTests(CartTestCase):
+
+    def assertTotals(self, item_count, subtotal):
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (item_count, Decimal(subtotal)))
+
+    def test_cart_views_keep_totals(self):
+        first, second = self.add_items(2, quantity=2)  # priced 50 and 51
+        self.assertTotals(2, '202.00')
+
+        product = Product.objects.create(name="Scratcher", category=self.category, price=Decimal('30.50'), quantity_available=5)
+        self.client.post(reverse('cart:add_to_cart', args=[product.id]), {'quantity': 3})
+        self.assertTotals(3, '293.50')
+
+        self.client.post(reverse('cart:update_cart', args=[first.id]), {'quantity_change': 'decrease'})
+        self.assertTotals(3, '243.50')
+
+        self.client.post(reverse('cart:remove_from_cart', args=[second.id]))
+        self.assertTotals(2, '141.50')
+
+        self.assertFalse(totals.drifted().exists())
+
+        self.client.post(reverse('cart:place_order'), {'address_id': self.address.id})
+        self.assertTotals(0, '0.00')
+        self.assertEqual(Order.objects.get().total_price, Decimal('211.50'))
+
+    def test_update_cart_reads_totals_from_cart(self):
+        item, *_ = self.add_items(5)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('cart:update_cart', args=[item.id]), {'quantity_change': 'increase'})
+        self.assertEqual(response.json()['cart_summary'], {
+            'subtotal': '$310.00', 'shipping_charge': '$70.00', 'total': '$380.00',
+        })
+        # Only the updated line itself is read; the change is added to the cart's totals
+        self.assertEqual(sum('FROM "cart_cartitem"' in q['sql'] for q in queries), 1)
+        self.assertFalse(any('SUM(' in q['sql'] for q in queries))
+
+    def test_repeated_remove_counts_once(self):
+        item, _ = self.add_items(2)  # priced 50 and 51
+        url = reverse('cart:remove_from_cart', args=[item.id])
+        self.client.post(url)
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('cart:view_cart'), fetch_redirect_response=False)
+        self.assertTotals(1, '51.00')
+        self.assertFalse(totals.delete_item(CartItem.objects.filter(pk=item.pk)))
+        self.assertTotals(1, '51.00')
+
+    def test_overlapping_updates_count_from_the_written_line(self):
+        item, = self.add_items(1)  # priced 50
+        lines = CartItem.objects.filter(pk=item.pk)
+        # Another request's +1 commits after this request looked up the line
+        totals.update_item(lines, partial(views._change_quantity, post={'quantity_change': 'increase'}))
+        response = self.client.post(reverse('cart:update_cart', args=[item.id]), {'quantity_change': 'increase'})
+        self.assertEqual(response.json()['item_total_price'], '150.00')
+        self.assertTotals(1, '150.00')
+        self.assertFalse(totals.drifted().exists())
+
+    def test_summary_reads_cart_totals(self):
+        self.add_items(2)
+        Cart.objects.filter(pk=self.cart.pk).update(item_count=7)
+        response = self.client.get(reverse('store:get_cart_item_count'))
+        self.assertEqual(response.json()['cart_item_count'], 7)
+
+    def test_price_change_reprices_carts(self):
+        item, other = self.add_items(2, quantity=3)  # priced 50 and 51
+        item.product.price = Decimal('19.99')
+        item.product.save()
+        self.assertTotals(2, '212.97')
+        item.product.price = 20.01  # Floats are saved as the field's Decimal
+        item.product.save()
+        self.assertTotals(2, '213.03')
+        self.assertFalse(totals.drifted().exists())
+
+    def test_empty_totals_block_checkout(self):
+        response = self.client.get(reverse('cart:checkout'))
+        self.assertRedirects(response, reverse('cart:view_cart'), fetch_redirect_response=False)
+
+    def test_reconcile_command_fixes_drift(self):
+        self.add_items(2, quantity=2)
+        other = CustomUser.objects.create_user(email="other@example.com", username="other", password="secret-pass")
+        Cart.objects.create(user=other, item_count=4, subtotal=10)
+        Cart.objects.filter(pk=self.cart.pk).update(subtotal=1)
+
+        out = StringIO()
+        call_command('reconcile_cart_totals', dry_run=True, stdout=out)
+        self.assertIn("2 cart(s) would be reconciled.", out.getvalue())
+        self.assertEqual(totals.drifted().count(), 2)
+
+        out = StringIO()
+        call_command('reconcile_cart_totals', stdout=out)
+        self.assertIn("2 cart(s) reconciled.", out.getvalue())
+        self.assertFalse(totals.drifted().exists())
+        self.assertTotals(2, '202.00')
+        self.assertEqual(Cart.objects.filter(user=other).values_list('item_count', 'subtotal').get(), (0, Decimal('0.00')))
+
+
+class StockReservationStressTests(TransactionTestCase):
+    """ Many threads competing for the same stock must never oversell it. """
+
+    THREADS = 16
+
+    def test_no_oversell_under_contention(self):
+        category = Category.objects.create(name="Cats")
+        first = Product.objects.create(name="Scratcher", category=category, price=10, quantity_available=20)
+        second = Product.objects.create(name="Tunnel", category=category, price=10, quantity_available=15)
+        reserved = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def checkout(quantities):
+            barrier.wait()
+            try:
+                for _ in range(4):
+                    while True:
+                        try:
+                            stock.reserve(quantities)
+                        except stock.InsufficientStock:
+                            pass
+                        except OperationalError:
+                            continue  # SQLite table lock held by another writer; try again
+                        else:
+                            reserved.append(quantities)
+                        break
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=checkout, args=({first.id: 1 + i % 3, second.id: 1 + i % 2},))
+            for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for product in (first, second):
+            taken = sum(quantities[product.id] for quantities in reserved)
+            remaining = Product.objects.get(id=product.id).quantity_available
+            self.assertGreaterEqual(remaining, 0)
+            self.assertEqual(remaining, product.quantity_available - taken)
+        self.assertTrue(reserved)
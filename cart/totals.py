@@ -0,0 +1,129 @@
+"""
+Running cart totals.
+
+Each Cart keeps `item_count` (its number of lines, what the header badge
+shows) and `subtotal` so the cart pages and the AJAX quantity buttons can
+read them from the cart row instead of summing every line. Code that
+changes a cart's items goes through `add_item`, `update_item` and
+`delete_item`, which add the change to both columns with one relative
+UPDATE (`subtotal = subtotal + delta`) in the same transaction as the line
+write; nothing re-reads the cart's other lines. The change is computed from
+the line locked and re-read in that transaction, so two requests changing
+the same line at once cannot both count it. Paths that bypass them
+(bulk_create, queryset updates) are caught by
+`manage.py reconcile_cart_totals`, which recomputes the totals in full with
+`update_totals`.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .models import Cart, CartItem
+
+_ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _actual_totals():
+    """ Expressions giving each cart's item count and subtotal from its lines. """
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    line_total = ExpressionWrapper(
+        F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    return {
+        'item_count': Coalesce(Subquery(lines.annotate(n=Count('id')).values('n')), 0),
+        # Rounded so SQLite's floating point sums compare equal to the stored value
+        'subtotal': Round(Coalesce(Subquery(lines.annotate(total=Sum(line_total)).values('total')), _ZERO), 2),
+    }
+
+
+def update_totals(carts):
+    """ Recompute the totals of a Cart, or of a queryset of carts, from their lines with one UPDATE. """
+    if isinstance(carts, Cart):
+        Cart.objects.filter(pk=carts.pk).update(**_actual_totals())
+        carts.refresh_from_db(fields=['item_count', 'subtotal'])
+        return 1
+    return carts.update(**_actual_totals())
+
+
+def add_to_totals(carts, item_count=0, subtotal=0):
+    """
+    Add to the totals of a queryset of carts with one relative UPDATE.
+    `subtotal` is an amount or an expression evaluated per cart.
+    """
+    if not hasattr(subtotal, 'resolve_expression'):
+        subtotal = Value(subtotal)
+    subtotal = ExpressionWrapper(F('subtotal') + subtotal, output_field=_ZERO.output_field)
+    # Rounded so SQLite's floating point sums compare equal to the lines' total
+    return carts.update(item_count=F('item_count') + item_count, subtotal=Round(subtotal, 2))
+
+
+def _add(cart, item_count, subtotal):
+    add_to_totals(Cart.objects.filter(pk=cart.pk), item_count, subtotal)
+    # As of this request; a concurrent change in another tab is in the row, not here
+    cart.item_count += item_count
+    cart.subtotal += subtotal
+
+
+def _locked(lines):
+    # Re-read under a row lock (SQLite's IMMEDIATE transactions already hold the database's),
+    # so the change is computed from the line as it is written, not as the request first saw it
+    return lines.select_for_update(of=('self',)).select_related('cart', 'product').get()
+
+
+def add_item(item):
+    """ Save a CartItem new to its cart and add it to the cart's totals, in one transaction. """
+    with transaction.atomic():
+        item.save()
+        _add(item.cart, 1, item.quantity * item.product.price)
+
+
+def update_item(lines, change):
+    """
+    Lock the line selected by the `lines` queryset, let `change(line)` set
+    its quantity and save it, adding the difference to the cart's totals,
+    in one transaction. `change` returns False to leave the line alone.
+    Returns the line as saved, or None if it was left alone; raises
+    CartItem.DoesNotExist if there is no such line (any more).
+    """
+    with transaction.atomic():
+        line = _locked(lines)
+        previous_quantity = line.quantity
+        if change(line) is False:
+            return None
+        line.save(update_fields=['quantity'])
+        _add(line.cart, 0, (line.quantity - previous_quantity) * line.product.price)
+    return line
+
+
+def delete_item(lines):
+    """
+    Delete the line selected by the `lines` queryset and take it out of its
+    cart's totals, in one transaction. Returns whether there was a line to
+    delete: a repeated request finds none and changes nothing.
+    """
+    with transaction.atomic():
+        try:
+            line = _locked(lines)
+        except CartItem.DoesNotExist:
+            return False
+        deleted, _ = CartItem.objects.filter(pk=line.pk).delete()
+        if deleted:
+            _add(line.cart, -1, -line.quantity * line.product.price)
+    return bool(deleted)
+
+
+def clear_totals(cart):
+    """ Zero the totals of a cart whose items were all deleted. """
+    Cart.objects.filter(pk=cart.pk).update(item_count=0, subtotal=Decimal('0.00'))
+    cart.item_count, cart.subtotal = 0, Decimal('0.00')
+
+
+def drifted(carts=None):
+    """ Carts whose stored totals disagree with their lines, annotated with `actual_item_count` and `actual_subtotal`. """
+    actual = _actual_totals()
+    carts = Cart.objects.all() if carts is None else carts
+    return carts.annotate(
+        actual_item_count=actual['item_count'], actual_subtotal=actual['subtotal'],
+    ).filter(~Q(item_count=F('actual_item_count')) | ~Q(subtotal=F('actual_subtotal')))
@@ -1,9 +1,15 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.db import IntegrityError, transaction
 from .models import Cart, CartItem,  Shipping
-from store.models import Product, Category
+from .summary import ainvalidate_cart_summary, invalidate_cart_summary
+from . import totals
+from store.models import Product, main_image_prefetch
 from userlogin.models import ContactInfo  # Import the user address model
 
 @login_required(login_url='userlogin:login')
@@ -15,53 +21,53 @@ def add_to_cart(request, product_id):
 	
 	cart, created = Cart.objects.get_or_create(user=request.user)
 	quantity = int(request.POST.get('quantity', 1))
-	cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
 	
-	if not created:
-		if cart_item.quantity + quantity <= product.quantity_available:
-			cart_item.quantity += quantity
-		else:
-			messages.error(request, "Not enough stock available.")
-			return redirect('cart:view_cart')
-	else:
-		cart_item.quantity = min(quantity, product.quantity_available)
+	def add(line):
+		if line.quantity + quantity > product.quantity_available:
+			return False
+		line.quantity += quantity
 	
-	cart_item.save()
+	# ✅ Adds the change to the cart's totals instead of re-summing its lines
+	try:
+		added = totals.update_item(CartItem.objects.filter(cart=cart, product=product), add)
+	except CartItem.DoesNotExist:
+		try:
+			totals.add_item(CartItem(cart=cart, product=product, quantity=min(quantity, product.quantity_available)))
+			added = True
+		except IntegrityError:  # Added by a request running alongside this one
+			added = totals.update_item(CartItem.objects.filter(cart=cart, product=product), add)
+	if not added:
+		messages.error(request, "Not enough stock available.")
+		return redirect('cart:view_cart')
+	invalidate_cart_summary(request.user)
 	return redirect('cart:view_cart')
 
 @login_required(login_url='userlogin:login')
 def view_cart(request):
 	cart, _ = Cart.objects.get_or_create(user=request.user)
-	cart_items = cart.items.all()
-	categories = Category.objects.all()
-	subtotal = sum(item.get_total_price() for item in cart_items)
+	cart_items = cart.items.select_related('product').prefetch_related(main_image_prefetch('product__images'))
 	shipping = Shipping.objects.first()
 	shipping_charge = shipping.charge if shipping else 0
-	total = subtotal + shipping_charge
-	
-	for item in cart_items:
-		item.main_image = item.product.images.filter(is_main=True).first()
+	total = cart.subtotal + shipping_charge
 
 	return render(request, 'cart.html', {
 		'cart_items': cart_items,
-		'subtotal': subtotal,
+		'subtotal': cart.subtotal,
 		'shipping_charge': shipping_charge,
 		'total': total,
-		'categories': categories,
-		'is_cart_empty': cart_items.count() == 0
+		'is_cart_empty': cart.item_count == 0
 	})
 
 @login_required(login_url='userlogin:login')
 def remove_from_cart(request, item_id):
-	cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-	cart_item.delete()
+	# ✅ A repeated request finds the line gone and leaves the totals alone
+	totals.delete_item(CartItem.objects.filter(id=item_id, cart__user=request.user))
+	invalidate_cart_summary(request.user)
 	return redirect('cart:view_cart')
 
-@login_required(login_url='userlogin:login')
-def update_cart(request, item_id):
-	cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-	quantity = int(request.POST.get('quantity', cart_item.quantity))
-	quantity_change = request.POST.get('quantity_change')
+def _change_quantity(cart_item, post):
+	quantity = int(post.get('quantity', cart_item.quantity))
+	quantity_change = post.get('quantity_change')
 	
 	if quantity_change == 'increase':
 		if cart_item.quantity < cart_item.product.quantity_available:
@@ -70,10 +76,10 @@ def update_cart(request, item_id):
 		cart_item.quantity -= 1
 	else:
 		cart_item.quantity = min(quantity, cart_item.product.quantity_available)
-	
-	cart_item.save()
-	subtotal = sum(item.get_total_price() for item in cart_item.cart.items.all())
-	shipping = Shipping.objects.first()
+
+def _update_cart_response(cart_item, shipping):
+	# ✅ The new totals come back from the cart row, not from re-reading every line
+	subtotal = cart_item.cart.subtotal
 	shipping_charge = shipping.charge if shipping else 0
 	total = subtotal + shipping_charge
 	
@@ -87,33 +93,53 @@ def update_cart(request, item_id):
 		}
 	})
 
+@login_required(login_url='userlogin:login')
+def update_cart(request, item_id):
+	try:
+		# ✅ Changes the line as locked in the transaction, so overlapping clicks each count once
+		cart_item = totals.update_item(
+			CartItem.objects.filter(id=item_id, cart__user=request.user), partial(_change_quantity, post=request.POST)
+		)
+	except CartItem.DoesNotExist:
+		raise Http404
+	invalidate_cart_summary(request.user)
+	return _update_cart_response(cart_item, Shipping.objects.first())
+
+@login_required(login_url='userlogin:login')
+async def aupdate_cart(request, item_id):
+	# ✅ update_cart for ASGI (cart/urls.py): the +/- buttons fire rapidly and only wait on the database
+	user = await request.auser()
+	try:
+		cart_item = await sync_to_async(totals.update_item)(  # transaction.atomic() has no async form
+			CartItem.objects.filter(id=item_id, cart__user=user), partial(_change_quantity, post=request.POST)
+		)
+	except CartItem.DoesNotExist:
+		raise Http404
+	await ainvalidate_cart_summary(user)
+	return _update_cart_response(cart_item, await Shipping.objects.afirst())
+
 @login_required
 def checkout(request):
     cart = Cart.objects.filter(user=request.user).first()
     
     # If cart is empty, prevent access to checkout
-    if not cart or not cart.items.exists():
+    if not cart or not cart.item_count:
         messages.error(request, "Your cart is empty! Add items before proceeding to checkout.")
         return redirect("cart:view_cart")
 
-    cart_items = cart.items.all()
-    subtotal = sum(item.get_total_price() for item in cart_items)
+    cart_items = cart.items.select_related('product').prefetch_related(main_image_prefetch('product__images'))
+    subtotal = cart.subtotal
     shipping = Shipping.objects.first()
     shipping_charge = shipping.charge if shipping else 0
     total = subtotal + shipping_charge
     addresses = ContactInfo.objects.filter(user=request.user)
-    categories = Category.objects.all()
 
-    for item in cart_items:
-        item.main_image = item.product.images.filter(is_main=True).first()
-        
     return render(request, "checkout.html", {
         "cart_items": cart_items,
         "subtotal": subtotal,
         "shipping_charge": shipping_charge,
         "total": total,
         "addresses": addresses,
-        'categories': categories,
     })
 
 
@@ -124,7 +150,8 @@ from django.http import JsonResponse
 from django.utils.timezone import now
 from django.db import transaction
 from datetime import timedelta
-from .models import Cart, CartItem, Order, Shipped, Delivered, Canceled, Shipping
+from .models import Cart, CartItem, Order, Shipping, OrderLine
+from . import history, stock
 from store.models import Product
 from userlogin.models import ContactInfo
 
@@ -132,7 +159,7 @@ from userlogin.models import ContactInfo
 def place_order(request):
     if request.method == "POST":
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        cart_items = cart.items.all()
+        cart_items = cart.items.select_related('product')
         address_id = request.POST.get("address_id")
 
         if not address_id:
@@ -140,30 +167,42 @@ def place_order(request):
             return redirect("cart:checkout")
 
         address = get_object_or_404(ContactInfo, id=address_id)
+        # Charged from the lines fetched here, the same prices the order lines record
         subtotal = sum(item.get_total_price() for item in cart_items)
         shipping = Shipping.objects.first()
         shipping_charge = shipping.charge if shipping else 0
         total = subtotal + shipping_charge
         
-        # ✅ Use `products` instead of `product_details`
-        products = {item.product.name: item.quantity for item in cart_items}
-
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user,
-                products=products,  # ✅ Fixed Field Name
-                total_price=total,
-                shipping=shipping,
-                address=address,
-                status='pending'
-            )
-            
-            # Deduct stock
-            for item in cart_items:
-                item.product.quantity_available -= item.quantity
-                item.product.save()
-            
-        cart_items.delete()
+        try:
+            with transaction.atomic():
+                # ✅ Conditional UPDATE for the whole cart; rolls back the order if any line is short
+                stock.reserve({item.product_id: item.quantity for item in cart_items})
+                order = Order.objects.create(
+                    user=request.user,
+                    total_price=total,
+                    shipping=shipping,
+                    address=address,
+                    status='pending'
+                )
+                OrderLine.objects.bulk_create([
+                    OrderLine(
+                        order=order,
+                        product=item.product,
+                        product_name=item.product.name,
+                        unit_price=item.product.price,
+                        quantity=item.quantity,
+                    )
+                    for item in cart_items
+                ])
+                history.record([order.id])
+                cart_items.delete()
+                totals.clear_totals(cart)
+        except stock.InsufficientStock as e:
+            names = ", ".join(item.product.name for item in cart_items if item.product_id in e.shortages)
+            messages.error(request, f"Not enough stock available for: {names}")
+            return redirect("cart:view_cart")
+
+        invalidate_cart_summary(request.user)
         return redirect("cart:order_history")
 
     return redirect("cart:checkout")
@@ -175,75 +214,30 @@ from django.http import JsonResponse
 from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Order, Shipped, Delivered, Canceled
+from .models import OrderHistoryEntry
 from store.models import Product  # ✅ Import Product
 
+ORDER_HISTORY_PAGE_SIZE = 20
+
 @login_required
 def order_history(request):
-    all_orders = []
-    categories = Category.objects.all()
-    def get_main_image(product_name):
-        product = Product.objects.filter(name=product_name).first()
-        return product.images.filter(is_main=True).first() if product else None
-
-    for order in Order.objects.filter(user=request.user):
-        products_with_images = [
-            {'name': product, 'quantity': qty, 'main_image': get_main_image(product)}
-            for product, qty in order.products.items()
-        ]
-
-        all_orders.append({
-            'products': products_with_images,
-            'date': timezone.make_aware(datetime.combine(order.order_date, datetime.min.time())),  
-            'status': 'Pending',
-            'total_price': order.total_price,
-            'id': order.id,
-            'order_time': order.order_time,
-        })
-
-    for order in Shipped.objects.filter(user=request.user):
-        products_with_images = [
-            {'name': product, 'quantity': qty, 'main_image': get_main_image(product)}
-            for product, qty in order.products.items()
-        ]
-
-        all_orders.append({
-            'products': products_with_images,
-            'date': order.shipped_date,
-            'status': 'Shipped',
-            'total_price': order.total_price,
-        })
-
-    for order in Delivered.objects.filter(user=request.user):
-        products_with_images = [
-            {'name': product, 'quantity': qty, 'main_image': get_main_image(product)}
-            for product, qty in order.products.items()
-        ]
-
-        all_orders.append({
-            'products': products_with_images,
-            'date': order.delivered_date,
-            'status': 'Delivered',
-            'total_price': order.total_price,
-        })
-
-    for order in Canceled.objects.filter(user=request.user):
-        products_with_images = [
-            {'name': product, 'quantity': qty, 'main_image': get_main_image(product)}
-            for product, qty in order.products.items()
-        ]
-
-        all_orders.append({
-            'products': products_with_images,
-            'date': order.canceled_date,
-            'status': 'Canceled',
-            'total_price': order.total_price,
-        })
-
-    # ✅ Sort by date
-    all_orders.sort(key=lambda order: order['date'], reverse=True)
-
-    return render(request, 'order_history.html', {'orders': all_orders , 'categories': categories,})
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * ORDER_HISTORY_PAGE_SIZE
+
+    # ✅ One query per page over (user, placed_at), newest first; the extra row tells if there is a next page
+    entries = list(
+        OrderHistoryEntry.objects.filter(user=request.user)
+        .order_by('-placed_at', '-order_id')[offset:offset + ORDER_HISTORY_PAGE_SIZE + 1]
+    )
+
+    return render(request, 'order_history.html', {
+        'orders': entries[:ORDER_HISTORY_PAGE_SIZE],
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if len(entries) > ORDER_HISTORY_PAGE_SIZE else None,
+    })
 
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import login_required
@@ -252,38 +246,16 @@ from django.http import JsonResponse
 from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Order, Canceled, Product
+from .models import Order, Product
+from . import orders
 
 @login_required
 def cancel_order(request, order_id):
     if request.method == "POST":
         order = get_object_or_404(Order, id=order_id, user=request.user)
 
-        with transaction.atomic():
-            # ✅ Restock the product
-            if isinstance(order.products, str):  
-                product_list = eval(order.products)  # Convert string to dictionary
-            else:
-                product_list = order.products
-
-            for product_name, quantity in product_list.items():
-                product = Product.objects.filter(name=product_name).first()
-                if product:
-                    product.quantity_available += quantity  # ✅ Increase quantity
-                    product.save()
-
-            # ✅ Move order to Canceled table
-            Canceled.objects.create(
-                user=order.user,
-                products=order.products,
-                total_price=order.total_price,
-                shipping=order.shipping,
-                address=order.address,
-                canceled_date=timezone.now(),
-            )
-
-            # ✅ Delete order from Order table
-            order.delete()
+        # ✅ Restocks and marks the order canceled in one transaction
+        orders.cancel(Order.objects.filter(id=order.id, status="pending"))
 
         return redirect("cart:order_history")
 
@@ -295,54 +267,14 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import get_object_or_404, redirect
 from django.db import transaction
 from django.utils import timezone
-from cart.models import Order, Shipped, Delivered, Canceled, Product
+from cart.models import Order, Product
 
 @staff_member_required
 def update_order_status(request, order_id):
     order = get_object_or_404(Order, id=order_id)  # Ensure we fetch the correct order
     new_status = request.POST.get('status')
 
-    with transaction.atomic():
-        if new_status == "shipped":
-            # Move to Shipped table
-            Shipped.objects.create(
-                user=order.user,
-                products=order.products,
-                total_price=order.total_price,
-                shipping=order.shipping,
-                address=order.address,
-                shipped_date=timezone.now(),
-                status="shipped"
-            )
-            order.delete()  # ✅ Remove from Order table
-
-        elif new_status == "delivered":
-            shipped_order = get_object_or_404(Shipped, user=order.user, product=order.product)  # ✅ Fetch from Shipped
-            Delivered.objects.create(
-                user=shipped_order.user,
-                products=shipped_order.products,
-                total_price=shipped_order.total_price,
-                shipping=shipped_order.shipping,
-                address=shipped_order.address,
-                
-            )
-            shipped_order.delete()  # ✅ Remove from Shipped table
-
-        elif new_status == "canceled":
-            Canceled.objects.create(
-                user=order.user,
-                products=order.products,
-                total_price=order.total_price,
-                shipping=order.shipping,
-                address=order.address,
-            )
-
-            # ✅ Restock inventory
-            for product_name, quantity in order.products.items():
-                product = Product.objects.get(name=product_name)
-                product.quantity_available += quantity
-                product.save()
-
-            order.delete()  # ✅ Remove from Order table
+    if new_status in orders.TRANSITIONS:
+        orders.transition(Order.objects.filter(id=order.id), new_status)
 
     return redirect("cart:order_history")
@@ -3,6 +3,18 @@ ASGI config for petshop project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, one worker per core, e.g.
+
+    uvicorn petshop.asgi:application --workers 4 --no-access-log
+
+SERVER_INTERFACE routes the cart count, typeahead and cart quantity
+endpoints to their async views (store/urls.py, cart/urls.py), which run on
+the event loop without a thread each, as every middleware is
+async-capable; other views still get a thread from the pool. It also
+switches the database settings to their ASGI profile (see
+petshop/database.py). `manage.py benchmark_interfaces` compares this with
+WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +24,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'petshop.settings')
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
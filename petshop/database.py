@@ -0,0 +1,93 @@
+"""
+Database settings from the environment.
+
+DATABASE_ENGINE picks `sqlite` (the default) or `postgresql`; DATABASE_NAME,
+DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST and DATABASE_PORT fill in
+the usual keys and DATABASE_CONN_MAX_AGE overrides how long connections are
+kept between requests.
+
+SQLite waits for the write lock instead of failing with "database is
+locked"; its PRAGMAs are per connection, so they are run from the
+`init_command` option on every new connection. Set DATABASE_SQLITE_WAL on
+a deployed database to switch it to WAL mode, so that checkouts writing
+stock and orders do not block readers. WAL is a property of the file
+rather than the connection, so it is opt-in: the bundled db.sqlite3 keeps
+its rollback journal and is not rewritten by every `manage.py` run.
+
+PostgreSQL keeps connections open across requests, checked before reuse,
+and streams `QuerySet.iterator()` through server-side cursors; set
+DATABASE_DISABLE_SERVER_SIDE_CURSORS behind a transaction-pooling pgbouncer.
+
+Under ASGI (petshop/asgi.py sets SERVER_INTERFACE=asgi) async views run
+their queries in worker threads that outlive requests, so persistent
+connections are replaced by a psycopg connection pool of
+DATABASE_POOL_SIZE connections (needs the `psycopg[pool]` package).
+"""
+import os
+
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # Milliseconds to wait for another writer
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# With DATABASE_SQLITE_WAL; journal_mode persists in the database file
+SQLITE_WAL_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable enough with WAL: a crash can only lose the last commits, never corrupt.
+    # With the rollback journal it could, so the default (FULL) stays there.
+    'synchronous': 'NORMAL',
+}
+
+POSTGRESQL_CONN_MAX_AGE = 600
+
+POSTGRESQL_POOL_SIZE = 10
+
+
+def _flag(environ, name):
+    return environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def sqlite_init_command(pragmas):
+    """ The SQLite `init_command` option running `pragmas` on each new connection. """
+    return ';'.join(f'PRAGMA {name} = {value}' for name, value in pragmas.items())
+
+
+def database_settings(base_dir, environ=os.environ):
+    """ The `default` entry of DATABASES, read from `environ`. """
+    engine = environ.get('DATABASE_ENGINE', 'sqlite')
+    asgi = environ.get('SERVER_INTERFACE', 'wsgi') == 'asgi'
+    if engine == 'sqlite':
+        pragmas = {**(SQLITE_WAL_PRAGMAS if _flag(environ, 'DATABASE_SQLITE_WAL') else {}), **SQLITE_PRAGMAS}
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': environ.get('DATABASE_NAME', base_dir / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 0)),
+            'OPTIONS': {
+                # Take the write lock at BEGIN: a deferred transaction that read first
+                # cannot wait for it later and fails with "database is locked".
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': sqlite_init_command(pragmas),
+            },
+        }
+    elif engine == 'postgresql':
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': environ.get('DATABASE_NAME', 'petshop'),
+            'USER': environ.get('DATABASE_USER', ''),
+            'PASSWORD': environ.get('DATABASE_PASSWORD', ''),
+            'HOST': environ.get('DATABASE_HOST', ''),
+            'PORT': environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 0 if asgi else POSTGRESQL_CONN_MAX_AGE)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': _flag(environ, 'DATABASE_DISABLE_SERVER_SIDE_CURSORS'),
+        }
+        if asgi:
+            if database['CONN_MAX_AGE']:
+                raise ValueError("DATABASE_CONN_MAX_AGE must be 0 under ASGI, which uses a connection pool")
+            database['OPTIONS'] = {
+                'pool': {'min_size': 1, 'max_size': int(environ.get('DATABASE_POOL_SIZE', POSTGRESQL_POOL_SIZE))},
+            }
+    else:
+        raise ValueError(f"Unsupported DATABASE_ENGINE {engine!r}; use 'sqlite' or 'postgresql'")
+    return database
+
@@ -0,0 +1,226 @@
+"""
+Per-request query and latency instrumentation.
+
+RequestMetricsMiddleware times every request and, through an execute
+wrapper installed on each database connection as it opens, each SQL
+statement it runs; the template backend below adds the time spent rendering
+templates. The current request is found through a ContextVar, which also
+follows async views into the threads that run their ORM calls. Each response gets a
+`Server-Timing` header (visible in the browser's network panel) and the
+numbers are folded into in-process histograms per URL name, served as JSON
+to staff at /metrics/.
+
+Lazy querysets run while the template renders, so their time is counted in
+both `sql` and `tpl`.
+
+Set SLOW_REQUEST_MS to log requests slower than that, with their queries,
+to the `petshop.instrumentation` logger.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets; the last is open-ended
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Queries kept per request for the slow request log
+SLOW_REQUEST_QUERIES = 20
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """ What one request spent; the current one is reachable through `_current`. """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.queries = []  # (milliseconds, sql), slowest kept
+
+    def __call__(self, execute, sql, params, many, context):
+        # Called by time_queries for every statement of the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.sql_count += 1
+            self.sql_ms += elapsed
+            self.queries.append((elapsed, sql))
+            if len(self.queries) > SLOW_REQUEST_QUERIES * 2:
+                self.queries = sorted(self.queries, reverse=True)[:SLOW_REQUEST_QUERIES]
+
+    def slowest_queries(self):
+        return sorted(self.queries, reverse=True)[:SLOW_REQUEST_QUERIES]
+
+
+def time_queries(execute, sql, params, many, context):
+    """ Execute wrapper of every connection, passing statements to the current request's metrics. """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """ connection_created receiver adding `time_queries` to the connection, once. """
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+class RouteStats:
+    """ Aggregated metrics of one URL name. """
+
+    def __init__(self):
+        self.requests = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, metrics, total_ms):
+        self.requests += 1
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, total_ms)
+        self.sql_count += metrics.sql_count
+        self.sql_ms += metrics.sql_ms
+        self.template_ms += metrics.template_ms
+        self.buckets[bisect_left(BUCKETS_MS, total_ms)] += 1
+
+    def as_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_ms / n, 2),
+            'max_ms': round(self.max_ms, 2),
+            'mean_sql_queries': round(self.sql_count / n, 2),
+            'mean_sql_ms': round(self.sql_ms / n, 2),
+            'mean_template_ms': round(self.template_ms / n, 2),
+            'latency_histogram_ms': {
+                **{f"<={bound}": count for bound, count in zip(BUCKETS_MS, self.buckets)},
+                f">{BUCKETS_MS[-1]}": self.buckets[-1],
+            },
+        }
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record(route, metrics, total_ms):
+    with _stats_lock:
+        _stats.setdefault(route, RouteStats()).add(metrics, total_ms)
+
+
+def snapshot():
+    with _stats_lock:
+        return {route: stats.as_dict() for route, stats in sorted(_stats.items())}
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _server_timing(metrics, total_ms):
+    return (
+        f'sql;dur={metrics.sql_ms:.1f};desc="{metrics.sql_count} queries", '
+        f'tpl;dur={metrics.template_ms:.1f};desc="Templates", '
+        f'total;dur={total_ms:.1f}'
+    )
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = request.resolver_match
+        route = match.view_name if match else '<unresolved>'
+        record(route, metrics, total_ms)
+        response['Server-Timing'] = _server_timing(metrics, total_ms)
+
+        slow_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+        if slow_ms is not None and total_ms >= slow_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms\n%s",
+                request.method, request.path, route, total_ms, metrics.sql_count, metrics.sql_ms,
+                metrics.template_ms,
+                "\n".join(f"  {ms:8.1f} ms  {sql}" for ms, sql in metrics.slowest_queries()),
+            )
+        return response
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Only the outermost render counts: nested renders are part of its time
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_ms += (time.perf_counter() - start) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """ The Django template backend, with render time reported to RequestMetricsMiddleware. """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+@staff_member_required
+def metrics_view(request):
+    return JsonResponse({'buckets_ms': BUCKETS_MS, 'routes': snapshot()})
@@ -0,0 +1,63 @@
+"""
+Password hashing profile.
+
+PASSWORD_HASHER picks how new passwords are hashed: `scrypt` (the
+default), `argon2` (needs the `argon2-cffi` package) or `pbkdf2`, Django's
+default. The other hashers stay listed so existing hashes still verify;
+Django rehashes a password with the chosen profile, or with changed
+parameters, the next time its owner logs in.
+
+PBKDF2 at Django's 870,000 iterations spends all its cost on CPU, about
+300 ms per login on one core. The memory-hard hashers below make an
+attacker's GPUs pay in memory instead, so they reach comparable strength
+for a fraction of the CPU: about 120 ms for scrypt with 32 MiB, about 25 ms
+for Argon2id with the OWASP parameters (19 MiB, 2 passes). Run
+`manage.py benchmark_logins` to measure them on the target machine.
+"""
+import os
+
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    # N=2^15, r=8: 32 MiB per hash. Django's default spends 5 sequential passes (p=5) at 16 MiB.
+    work_factor = 2 ** 15
+    block_size = 8
+    parallelism = 1
+    maxmem = 64 * 1024 * 1024  # OpenSSL's default limit of 32 MiB is just too small for N=2^15
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # OWASP's Argon2id minimum; Django's default uses 100 MiB and 8 lanes
+    time_cost = 2
+    memory_cost = 19 * 1024  # KiB
+    parallelism = 1
+
+
+# Every hasher that can verify a stored password. Hashers are looked up by
+# algorithm name, so the tuned classes replace Django's scrypt and argon2
+# ones; they verify hashes made with any parameters, which are stored in the
+# hash, and flag the outdated ones for rehashing.
+VERIFYING_HASHERS = [
+    'petshop.passwords.TunedScryptPasswordHasher',
+    'petshop.passwords.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# PASSWORD_HASHER -> hasher of new passwords
+PROFILES = {
+    'scrypt': 'petshop.passwords.TunedScryptPasswordHasher',
+    'argon2': 'petshop.passwords.TunedArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+
+
+def password_hashers(environ=os.environ):
+    """ PASSWORD_HASHERS for the profile named by PASSWORD_HASHER in `environ`. """
+    profile = environ.get('PASSWORD_HASHER', 'scrypt')
+    if profile not in PROFILES:
+        raise ValueError(f"Unsupported PASSWORD_HASHER {profile!r}; use one of {', '.join(PROFILES)}")
+    preferred = PROFILES[profile]
+    return [preferred] + [hasher for hasher in VERIFYING_HASHERS if hasher != preferred]
@@ -0,0 +1,32 @@
+"""
+Session backend profile.
+
+SESSION_BACKEND picks where sessions live:
+
+- `db` (the default): a django_session row, read on every request.
+- `cached_db`: the same rows, read through the cache and written through
+  to the database. Every process must share the cache (set
+  CACHE_LOCATION), or a process can read a session another one changed.
+- `signed_cookies`: the session is the cookie itself, signed with
+  SECRET_KEY, so nothing is read or written server side. Logging out only
+  clears the cookie, so a copied cookie stays valid until it expires.
+
+Whatever the backend, AuthenticationMiddleware looks the user up through
+a per-process cache (see userlogin/middleware.py).
+"""
+import os
+
+# SESSION_BACKEND -> SESSION_ENGINE
+PROFILES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+def session_engine(environ=os.environ):
+    """ SESSION_ENGINE for the profile named by SESSION_BACKEND in `environ`. """
+    profile = environ.get('SESSION_BACKEND', 'db')
+    if profile not in PROFILES:
+        raise ValueError(f"Unsupported SESSION_BACKEND {profile!r}; use one of {', '.join(PROFILES)}")
+    return PROFILES[profile]
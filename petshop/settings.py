@@ -13,6 +13,10 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from petshop.database import database_settings
+from petshop.passwords import password_hashers
+from petshop.sessions import session_engine
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,15 +46,18 @@ INSTALLED_APPS = [
     'userlogin',
     'store',
     'cart',
+    'petshop',  # Project-wide hooks: query timing
     
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'petshop.staticfiles.StaticFilesMiddleware',  # Collected, pre-compressed static files (off with DEBUG)
+    'petshop.instrumentation.RequestMetricsMiddleware',  # Server-Timing header and /metrics/
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'userlogin.middleware.CachedAuthenticationMiddleware',  # AuthenticationMiddleware with a per-process user cache
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,7 +66,7 @@ ROOT_URLCONF = 'petshop.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'petshop.instrumentation.InstrumentedDjangoTemplates',  # DjangoTemplates, timed per request
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -68,6 +75,9 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.categories',
+                'cart.context_processors.cart_summary',
+                'store.context_processors.page_cache',  # Must follow the csrf processor it overrides
             ],
         },
     },
@@ -75,15 +85,19 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'petshop.wsgi.application'
 
+# 'asgi' when served by petshop/asgi.py: routes the async views and picks the ASGI database profile
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+
+# Log requests slower than this many milliseconds, with their queries (petshop/instrumentation.py)
+SLOW_REQUEST_MS = int(os.environ['SLOW_REQUEST_MS']) if os.environ.get('SLOW_REQUEST_MS') else None
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite by default (WAL with DATABASE_SQLITE_WAL), PostgreSQL with DATABASE_ENGINE=postgresql; see petshop/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(BASE_DIR),
 }
 
 
@@ -105,6 +119,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# scrypt unless PASSWORD_HASHER says otherwise; older hashes are upgraded at login (see petshop/passwords.py)
+PASSWORD_HASHERS = password_hashers()
+
+# db unless SESSION_BACKEND says otherwise (see petshop/sessions.py)
+SESSION_ENGINE = session_engine()
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -124,6 +144,23 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]  # For static files in the 'static' folder
 STATIC_ROOT = BASE_DIR / "staticfiles"    # Collect static files here when using `collectstatic`
 
+# Hashed file names plus .gz/.br copies, written by `collectstatic` (petshop/staticfiles.py)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "petshop.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+
+# Page, fragment and summary caches. Local memory is per process: set
+# CACHE_LOCATION to a directory to share one file-based cache between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CACHE_LOCATION'],
+    } if os.environ.get('CACHE_LOCATION') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
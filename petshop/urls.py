@@ -1,10 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from . import settings
+from .instrumentation import metrics_view
 from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),  # Staff only
     path('user/', include('userlogin.urls' , namespace='userlogin')),
     path('',include('store.urls' , namespace='store')) ,
     path('cart/', include('cart.urls' , namespace='cart')) ,
@@ -14,8 +14,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ("name", "category", "subcategory", "price", "quantity_available", "best_selling")
     list_filter = ("category", "subcategory", "best_selling")
     search_fields = ("name", "description", "category__name", "subcategory__name")
+    list_select_related = ("category", "subcategory__category")
     inlines = [ProductImageInline]  
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """ SubCategory.__str__ reads its category, so fetch both in one query. """
+        if db_field.name == "subcategory":
+            kwargs["queryset"] = SubCategory.objects.select_related("category")
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
     def save_model(self, request, obj, form, change):
         """
         Ensures `old_price` and `discount` are properly calculated before saving.
@@ -67,6 +74,7 @@ class CategoryAdmin(admin.ModelAdmin):
 class SubCategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "category")
     list_filter = ("category",)
+    list_select_related = ("category",)
     search_fields = ("name", "category__name")
 
     def has_delete_permission(self, request, obj=None):
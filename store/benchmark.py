@@ -0,0 +1,64 @@
+"""
+Helpers shared by the `benchmark_*` management commands.
+"""
+import importlib
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import clear_url_caches
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Run the block against a freshly migrated test database that is dropped
+    afterwards, so benchmarks never touch the real data.
+    """
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def routed_for(interface):
+    """
+    Route the URLs to the views `interface` ('wsgi' or 'asgi') is served
+    with, as SERVER_INTERFACE does at startup (store/urls.py, cart/urls.py).
+    """
+    def reload_urls():
+        # Apps first: petshop.urls builds its resolvers from their patterns
+        for name in ('store.urls', 'cart.urls', 'petshop.urls'):
+            importlib.reload(importlib.import_module(name))
+        clear_url_caches()
+
+    with override_settings(SERVER_INTERFACE=interface):
+        reload_urls()
+    try:
+        yield
+    finally:
+        reload_urls()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, repeat=20):
+    """ Call `func` `repeat` times and return latency statistics in milliseconds. """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+    }
@@ -0,0 +1,65 @@
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_CACHE_KEY = 'store:catalog-version'
+STOREFRONT_VERSION_CACHE_KEY = 'store:storefront-version'
+STOCK_VERSION_CACHE_KEY = 'store:stock-version'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = _bump_version(key)
+    return version
+
+
+def _bump_version(key):
+    version = str(time.time_ns())
+    cache.set(key, version, None)
+    return version
+
+
+def get_catalog_version():
+    """
+    Return a token that changes whenever products or categories change.
+    In-process indexes compare it to know when they must be rebuilt.
+    """
+    return _get_version(CATALOG_VERSION_CACHE_KEY)
+
+
+def bump_catalog_version():
+    bump_storefront_version()
+    return _bump_version(CATALOG_VERSION_CACHE_KEY)
+
+
+def get_storefront_version():
+    """
+    Return a token that changes whenever anything shown on catalog pages
+    changes: the catalog itself, images, recommendations or a product going
+    out of or back into stock. Cached pages and fragments are keyed by it
+    (see page_cache.py).
+    """
+    return _get_version(STOREFRONT_VERSION_CACHE_KEY)
+
+
+def bump_storefront_version():
+    return _bump_version(STOREFRONT_VERSION_CACHE_KEY)
+
+
+def _stock_version_key(scope):
+    return f"{STOCK_VERSION_CACHE_KEY}:{scope}"
+
+
+def get_stock_version(scope):
+    """
+    Return a token that changes whenever the stock levels shown on the pages
+    of `scope` change: 'product:<id>', 'category:<id>' or 'best-selling'.
+    Cached pages listing those products are keyed by it as well.
+    """
+    return _get_version(_stock_version_key(scope))
+
+
+def bump_stock_versions(scopes):
+    version = str(time.time_ns())
+    cache.set_many({_stock_version_key(scope): version for scope in scopes}, None)
@@ -0,0 +1,21 @@
+from django.utils.functional import SimpleLazyObject
+
+from .catalog import get_storefront_version
+from .navigation import get_category_tree
+from .page_cache import CSRF_PLACEHOLDER
+
+
+def categories(request):
+    """ Serve the header/menu category tree from the cache on every page. """
+    return {'categories': get_category_tree()}
+
+
+def page_cache(request):
+    """
+    Version that `{% cache %}` fragments of catalog pages vary on, and the
+    CSRF placeholder while a page is rendered for the anonymous page cache.
+    """
+    context = {'page_cache_version': SimpleLazyObject(get_storefront_version)}
+    if getattr(request, 'rendering_cached_page', False):
+        context['csrf_token'] = CSRF_PLACEHOLDER
+    return context
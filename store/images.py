@@ -0,0 +1,88 @@
+"""
+Resized image derivatives.
+
+Every uploaded ProductImage, Category and SliderImage image gets WebP and
+JPEG copies at each width in WIDTHS narrower than the original, stored
+next to the media files under `derivatives/`. Derivative names are derived
+from the original's name and width, so templates can build a srcset from
+the recorded `width` without touching storage (see
+templatetags/responsive_images.py).
+
+New uploads are processed from the post_save signal; existing images with
+`manage.py generate_image_derivatives`.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+WIDTHS = (160, 320, 640, 1280)
+
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVES_DIR = 'derivatives'
+
+
+def derivative_widths(width):
+    """ Derivative widths made for an original `width` pixels wide. """
+    return [w for w in WIDTHS if width and w < width]
+
+
+def derivative_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f"{DERIVATIVES_DIR}/{root}-{width}w.{FORMATS[fmt][0]}"
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, **FORMATS[fmt][1])
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Write every derivative of the stored image `name` and return the
+    original's (width, height), or None when the file is missing or is not
+    an image.
+    """
+    try:
+        with storage.open(name, 'rb') as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+    except (OSError, ValueError):
+        return None
+
+    for width in derivative_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for fmt in FORMATS:
+            target = derivative_name(name, width, fmt)
+            # Names are predictable on purpose, so replace instead of letting storage rename
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(_encode(resized, fmt)))
+    return image.width, image.height
+
+
+def delete_derivatives(name, width, storage=default_storage):
+    for w in derivative_widths(width):
+        for fmt in FORMATS:
+            storage.delete(derivative_name(name, w, fmt))
+
+
+def srcset(name, width, fmt, storage=default_storage):
+    """ `srcset` value for the stored image `name`, `width` pixels wide. """
+    candidates = [f"{storage.url(derivative_name(name, w, fmt))} {w}w" for w in derivative_widths(width)]
+    if fmt == 'jpeg' or os.path.splitext(name)[1].lower() == '.webp':
+        candidates.append(f"{storage.url(name)} {width}w")
+    return ", ".join(candidates)
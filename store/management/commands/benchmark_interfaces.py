@@ -0,0 +1,203 @@
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from cart.models import CartItem
+from store import search
+from store.benchmark import percentile, routed_for, throwaway_database
+from store.synthetic import WORDS, create_catalog, create_shoppers
+
+CSRF_TOKEN = get_random_string(32)
+
+
+class Shopper:
+    """ A logged in browser: its cookies and one of its cart lines, to click +/- on. """
+
+    def __init__(self, user, item_id):
+        client = Client()
+        client.force_login(user)
+        self.cookie = f"sessionid={client.cookies['sessionid'].value}; csrftoken={CSRF_TOKEN}"
+        self.item_id = item_id
+
+    def next_request(self, rng):
+        """ (method, path, query string, body) of one of the JSON endpoints. """
+        endpoint = rng.choice(('count', 'search', 'update'))
+        if endpoint == 'count':
+            return 'GET', reverse('store:get_cart_item_count'), '', b''
+        if endpoint == 'search':
+            return 'GET', reverse('store:ajax_search'), urlencode({'q': rng.choice(WORDS)[:3]}), b''
+        change = rng.choice(('increase', 'decrease'))
+        return 'POST', reverse('cart:update_cart', args=[self.item_id]), '', urlencode({'quantity_change': change}).encode()
+
+
+def wsgi_call(handler, shopper, method, path, query, body):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': shopper.cookie,
+        'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_call(handler, shopper, method, path, query, body):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+        'headers': [
+            (b'host', b'localhost'),
+            (b'cookie', shopper.cookie.encode()),
+            (b'x-csrftoken', CSRF_TOKEN.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }
+    requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.Event().wait()  # The client never disconnects early
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many concurrent connections one process serves on the JSON endpoints "
+        "(cart count, typeahead, cart +/-) under WSGI, with a fixed pool of worker threads and the sync "
+        "views, and under ASGI with their async versions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 64, 256],
+                            help="Simultaneous connections, each sending its next request as soon as one returns.")
+        parser.add_argument('--requests', type=int, default=20, help="Requests per connection.")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads, as in gunicorn's gthread.")
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=64)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        original_test = settings_dict.get('TEST')
+        workdir = tempfile.mkdtemp()
+        if connection.vendor == 'sqlite':
+            # The shared in-memory test database locks whole tables between threads
+            settings_dict['TEST'] = {**(original_test or {}), 'NAME': os.path.join(workdir, 'interfaces.sqlite3')}
+        try:
+            with throwaway_database():
+                self.run(options)
+        finally:
+            settings_dict['TEST'] = original_test
+            os.rmdir(workdir)
+
+    def run(self, options):
+        create_catalog(options['products'], images_per_product=0, seed=options['seed'])
+        create_shoppers(options['users'], orders_per_user=0, cart_items=1, seed=options['seed'])
+        search.rebuild_index()
+        shoppers = [
+            Shopper(item.cart.user, item.id)
+            for item in CartItem.objects.select_related('cart__user').order_by('id')
+        ]
+        connection.close()  # Each handler thread opens its own
+
+        self.stdout.write(
+            f"{'interface':<10}{'conns':>7}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+        )
+        for concurrency in options['concurrency']:
+            for interface in ('wsgi', 'asgi'):
+                with routed_for(interface):  # Sync views under WSGI, async ones under ASGI
+                    result = asyncio.run(self.drive(interface, concurrency, shoppers, options))
+                self.stdout.write(
+                    f"{interface:<10}{concurrency:>7}{len(result['latencies']):>10}{result['errors']:>8}"
+                    f"{len(result['latencies']) / result['seconds']:>9.1f}"
+                    f"{percentile(result['latencies'], 50):>9.1f}{percentile(result['latencies'], 99):>9.1f}"
+                )
+
+    async def drive(self, interface, concurrency, shoppers, options):
+        """ Run `concurrency` closed-loop connections against one handler in this process. """
+        if interface == 'wsgi':
+            handler = WSGIHandler()
+            pool = ThreadPoolExecutor(max_workers=options['threads'])
+            loop = asyncio.get_running_loop()
+
+            def call(*request):
+                return loop.run_in_executor(pool, wsgi_call, handler, *request)
+        else:
+            handler = ASGIHandler()
+            pool = None
+
+            def call(*request):
+                return asgi_call(handler, *request)
+
+        latencies = []
+        errors = 0
+
+        async def connection_loop(i):
+            nonlocal errors
+            rng = random.Random(f"{options['seed']}:{i}")
+            shopper = shoppers[i % len(shoppers)]
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                status = await call(shopper, *shopper.next_request(rng))
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(connection_loop(i) for i in range(concurrency)))
+        seconds = time.perf_counter() - start
+        if pool is not None:
+            pool.shutdown()
+        return {'latencies': latencies, 'errors': errors, 'seconds': seconds}
@@ -0,0 +1,43 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from store.benchmark import measure, throwaway_database
+from store.models import Category, Product
+from store.related import related_products
+from store.synthetic import create_catalog
+
+
+def legacy_related_products(product):
+    # What product_detail did before: hydrate the whole category, then sample
+    products = list(Product.objects.filter(category=product.category).exclude(id=product.id).with_main_image())
+    if len(products) > 4:
+        products = random.sample(products, 4)
+    return products
+
+
+class Command(BaseCommand):
+    help = "Compare related-products sampling with loading the whole category, per category size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000,20000', help="Comma-separated category sizes.")
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with throwaway_database():
+            self.stdout.write(f"{'category size':>14}  {'strategy':<10}{'queries':>9}{'p50 ms':>10}{'p99 ms':>10}")
+            for size in sizes:
+                create_catalog(size, categories=1, subcategories_per_category=1)
+                category = Category.objects.latest('id')
+                products = list(Product.objects.filter(category=category).order_by('?')[:options['repeat']])
+                for label, sample in (('legacy', legacy_related_products), ('probing', related_products)):
+                    with CaptureQueriesContext(connection) as queries:
+                        sample(products[0])
+                    queue = iter(products * 2)
+                    stats = measure(lambda: sample(next(queue)), options['repeat'])
+                    self.stdout.write(
+                        f"{size:>14}  {label:<10}{len(queries):>9}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                    )
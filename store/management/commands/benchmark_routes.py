@@ -0,0 +1,203 @@
+import json
+import platform
+import random
+import re
+import statistics
+import threading
+import time
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from store import search
+from store.benchmark import percentile, throwaway_database
+from store.models import Category, Product
+from store.synthetic import WORDS, create_catalog, create_shoppers
+from userlogin.models import ContactInfo, CustomUser
+
+# Written by RequestMetricsMiddleware (petshop/instrumentation.py)
+SERVER_TIMING_QUERIES = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+
+
+class ClientTransport:
+    """ Requests through the Django test client, in process. """
+
+    def __init__(self, user):
+        self.client = Client(SERVER_NAME='localhost')
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method.lower())(path, data)
+        return response.status_code, response.get('Server-Timing', '')
+
+    def close(self):
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class WSGITransport:
+    """ Real HTTP requests to a wsgiref server running the project in a background thread. """
+
+    def __init__(self, user):
+        self.server = make_server('127.0.0.1', 0, WSGIHandler(), handler_class=QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.http = HTTPConnection('127.0.0.1', self.server.server_port)
+        client = Client()
+        client.force_login(user)
+        self.cookies = {'sessionid': client.cookies['sessionid'].value}
+        # Unlike the test client, the server enforces CSRF on POSTs
+        self.request('GET', reverse('cart:checkout'))
+
+    def request(self, method, path, data=None):
+        headers = {
+            'Host': 'localhost',
+            'Cookie': '; '.join(f"{name}={value}" for name, value in self.cookies.items()),
+        }
+        body = None
+        if method == 'GET' and data:
+            path = f"{path}?{urlencode(data)}"
+        elif method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+        self.http.request(method, path, body, headers)
+        response = self.http.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, response.headers.get('Server-Timing', '')
+
+    def close(self):
+        self.http.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+TRANSPORTS = {'client': ClientTransport, 'wsgi': WSGITransport}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main URL routes against a synthetic catalog in a throwaway database "
+        "and report throughput, latency percentiles and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=10, help="Past orders per user.")
+        parser.add_argument('--requests', type=int, default=50, help="Measured requests per route.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per route.")
+        parser.add_argument('--transport', choices=sorted(TRANSPORTS), default='client')
+        parser.add_argument('--cold-cache', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            scale = create_catalog(options['products'], seed=options['seed'])
+            scale.update(create_shoppers(options['users'], orders_per_user=options['orders'], seed=options['seed']))
+            search.rebuild_index()
+            Product.objects.update(quantity_available=1_000_000)  # place_order must never run out
+
+            self.user = CustomUser.objects.order_by('id').first()
+            self.address_id = ContactInfo.objects.filter(user=self.user).values_list('id', flat=True).first()
+            self.cart = Cart.objects.get(user=self.user)
+            self.category_ids = list(Category.objects.values_list('id', flat=True))
+            self.product_ids = list(Product.objects.values_list('id', flat=True))
+
+            transport = TRANSPORTS[options['transport']](self.user)
+            try:
+                routes = {
+                    name: self.run_route(transport, name, options)
+                    for name in (
+                        'store:index', 'store:category_detail', 'store:search_results', 'store:product_detail',
+                        'cart:view_cart', 'cart:place_order', 'cart:order_history',
+                    )
+                }
+            finally:
+                transport.close()
+
+            report = {
+                'generated_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'transport': options['transport'],
+                'cold_cache': options['cold_cache'],
+                'seed': options['seed'],
+                'scale': scale,
+                'routes': routes,
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def next_request(self, name, rng):
+        """ (method, path, data) of the next request to `name`, after any untimed setup it needs. """
+        if name == 'store:category_detail':
+            return 'GET', reverse(name, args=[rng.choice(self.category_ids)]), None
+        if name == 'store:product_detail':
+            return 'GET', reverse(name, args=[rng.choice(self.product_ids)]), None
+        if name == 'store:search_results':
+            return 'GET', reverse(name), {'q': rng.choice(WORDS)}
+        if name == 'cart:place_order':
+            CartItem.objects.bulk_create(
+                CartItem(cart=self.cart, product_id=pk, quantity=1) for pk in rng.sample(self.product_ids, 3)
+            )
+            return 'POST', reverse(name), {'address_id': self.address_id}
+        return 'GET', reverse(name), None
+
+    def run_route(self, transport, name, options):
+        rng = random.Random(f"{options['seed']}:{name}")
+        latencies = []
+        queries = []
+        statuses = {}
+        for i in range(options['warmup'] + options['requests']):
+            method, path, data = self.next_request(name, rng)
+            if options['cold_cache']:
+                cache.clear()
+            start = time.perf_counter()
+            status, server_timing = transport.request(method, path, data)
+            elapsed = (time.perf_counter() - start) * 1000
+            if i < options['warmup']:
+                continue
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            match = SERVER_TIMING_QUERIES.search(server_timing)
+            if match:
+                queries.append(int(match.group(1)))
+
+        return {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / (sum(latencies) / 1000), 1),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+            'status_codes': statuses,
+        }
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from store import search
+from store.benchmark import measure, throwaway_database
+from store.models import Product
+from store.synthetic import create_catalog
+
+QUERIES = ("dog", "royal canin", "chew toy", "salmon", "org", "premium grain free", "zebra")
+
+
+def legacy_search(query):
+    # The four-way icontains scan search_results used before the index
+    return list(Product.objects.filter(
+        Q(name__icontains=query) |
+        Q(category__name__icontains=query) |
+        Q(subcategory__name__icontains=query) |
+        Q(description__icontains=query)
+    ).distinct().values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = "Compare the product search index with the legacy icontains query on a synthetic catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write(f"Generating {options['products']} products...")
+            create_catalog(options['products'])
+            search.rebuild_index()
+
+            backends = [('legacy ORM', None)]
+            if search.SQLiteFTSBackend.is_available():
+                backends.append(('sqlite fts5', search.SQLiteFTSBackend()))
+            memory = search.MemoryBackend()
+            memory.rebuild()
+            backends.append(('python index', memory))
+
+            self.stdout.write(f"{'query':<22}{'backend':<15}{'matches':>9}{'p50 ms':>10}{'p99 ms':>10}")
+            for query in QUERIES:
+                for label, backend in backends:
+                    run = (lambda: legacy_search(query)) if backend is None else (lambda: backend.search(query))
+                    matches = len(run())
+                    stats = measure(run, options['repeat'])
+                    self.stdout.write(
+                        f"{query:<22}{label:<15}{matches:>9}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                    )
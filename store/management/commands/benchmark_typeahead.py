@@ -0,0 +1,43 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from store import typeahead
+from store.benchmark import measure, throwaway_database
+from store.synthetic import WORDS, create_catalog
+
+
+class Command(BaseCommand):
+    help = "Measure typeahead latency (index lookup and full endpoint) on a synthetic catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--lookups', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        # What a user types: every prefix of one or two catalog words
+        prefixes = []
+        for _ in range(options['lookups']):
+            phrase = ' '.join(rng.sample(WORDS, rng.choice((1, 2))))
+            prefixes.append(phrase[:rng.randint(1, len(phrase))])
+
+        with throwaway_database():
+            self.stdout.write(f"Generating {options['products']} products...")
+            create_catalog(options['products'])
+
+            build = measure(typeahead.build_index, repeat=1)
+            self.stdout.write(f"index build: {build['mean_ms']:.0f} ms")
+
+            index = typeahead.get_index()
+            queue = iter(prefixes)
+            stats = measure(lambda: index.lookup(next(queue)), repeat=len(prefixes))
+            self.stdout.write(f"index lookup:  p50 {stats['p50_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms")
+
+            client = Client(SERVER_NAME='localhost')
+            url = reverse('store:ajax_search')
+            queue = iter(prefixes)
+            stats = measure(lambda: client.get(url, {'q': next(queue)}), repeat=len(prefixes))
+            self.stdout.write(f"endpoint:      p50 {stats['p50_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms")
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from store import search
+from store.catalog import bump_catalog_version
+from store.synthetic import SHOPPER_PASSWORD, create_catalog, create_shoppers
+
+
+class Command(BaseCommand):
+    help = "Fill the configured database with a synthetic catalog, shoppers, carts and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--subcategories', type=int, default=5, help="Subcategories per category.")
+        parser.add_argument('--images', type=int, default=1, help="Images per product.")
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=3, help="Orders per user.")
+        parser.add_argument('--lines', type=int, default=3, help="Lines per order.")
+        parser.add_argument('--cart-items', type=int, default=2, help="Items in each user's cart.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Writing to {connection.settings_dict['NAME']}...")
+        with transaction.atomic():
+            counts = create_catalog(
+                options['products'],
+                categories=options['categories'],
+                subcategories_per_category=options['subcategories'],
+                images_per_product=options['images'],
+                seed=options['seed'],
+            )
+            counts.update(create_shoppers(
+                options['users'],
+                orders_per_user=options['orders'],
+                lines_per_order=options['lines'],
+                cart_items=options['cart_items'],
+                seed=options['seed'],
+            ))
+        # bulk_create bypassed the signals that keep these up to date
+        search.rebuild_index()
+        bump_catalog_version()
+
+        for model, count in counts.items():
+            self.stdout.write(f"{model:<15}{count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Done. Shoppers sign in with the password {SHOPPER_PASSWORD!r}."))
@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store import images
+from store.models import Category, ProductImage, SliderImage
+
+IMAGE_MODELS = (ProductImage, Category, SliderImage)
+
+
+def _process(name):
+    # Runs in a worker process; only touches storage, never the database
+    return name, images.generate_derivatives(name)
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG derivatives and record dimensions for existing images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes.")
+        parser.add_argument('--force', action='store_true', help="Regenerate images that already have derivatives.")
+
+    def handle(self, *args, **options):
+        pending = {}  # image name -> [(model, pk)]
+        for model in IMAGE_MODELS:
+            rows = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['force']:
+                rows = rows.filter(width__isnull=True)
+            for pk, name in rows.values_list('pk', 'image'):
+                pending.setdefault(name, []).append((model, pk))
+
+        if not pending:
+            self.stdout.write("Every image already has its derivatives.")
+            return
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        done = missing = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for name, dimensions in pool.map(_process, pending, chunksize=8):
+                if dimensions is None:
+                    missing += 1
+                    self.stderr.write(f"Skipped {name}: missing or not an image.")
+                    continue
+                width, height = dimensions
+                for model, pk in pending[name]:
+                    model.objects.filter(pk=pk).update(width=width, height=height)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {done} images; skipped {missing}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store import search
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from scratch."
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Product.objects.count()} products with {type(backend).__name__}."
+        ))
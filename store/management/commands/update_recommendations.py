@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import reset_recommendations, update_recommendations
+
+
+class Command(BaseCommand):
+    help = "Fold orders placed since the last run into the 'frequently bought together' recommendations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Discard the statistics and start from the first order.")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            reset_recommendations()
+        run = update_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded in {run.orders} orders; recommendations are up to date with orders placed before {run.placed_before}."
+        ))
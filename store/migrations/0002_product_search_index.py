@@ -0,0 +1,51 @@
+import sqlite3
+
+from django.db import migrations
+
+# Copied from store.search as of this migration, which must not change with it
+FTS_TABLE = 'store_product_fts'
+
+POPULATE_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, category, subcategory, description) '
+    'SELECT p.id, p.name, c.name, s.name, p.description FROM store_product p '
+    'INNER JOIN store_category c ON c.id = p.category_id '
+    'LEFT OUTER JOIN store_subcategory s ON s.id = p.subcategory_id'
+)
+
+
+def sqlite_has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE fts5_probe USING fts5(body)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not sqlite_has_fts5():
+        return  # store.search falls back to its in-memory index
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, category, subcategory, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        cursor.execute(POPULATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('best_selling', True)), fields=['id'], name='store_product_bestseller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='store_product_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(condition=models.Q(('is_main', True)), fields=['product', 'id'], name='store_prodimage_main_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:10
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# store.recommendations.LATE_COMMIT_MARGIN when this was written
+LATE_COMMIT_MARGIN = timedelta(minutes=10)
+
+
+def checkpoint_by_placed_at(apps, schema_editor):
+    """
+    Turn each run's last order id into a time no later than any order it did
+    not count, and remember the orders it counted that the next run will look
+    back over again.
+    """
+    Order = apps.get_model('cart', 'Order')
+    RecommendationRun = apps.get_model('store', 'RecommendationRun')
+    RecommendedOrder = apps.get_model('store', 'RecommendedOrder')
+
+    for run in RecommendationRun.objects.all():
+        first_uncounted = Order.objects.filter(id__gt=run.last_order_id).order_by('placed_at').first()
+        last_counted = Order.objects.filter(id__lte=run.last_order_id).order_by('-placed_at').first()
+        if first_uncounted:
+            run.placed_before = first_uncounted.placed_at
+        elif last_counted:
+            run.placed_before = last_counted.placed_at + timedelta(microseconds=1)
+        else:
+            run.placed_before = timezone.now()
+        run.save(update_fields=['placed_before'])
+
+    last_run = RecommendationRun.objects.order_by('-id').first()
+    if last_run:
+        RecommendedOrder.objects.bulk_create(
+            RecommendedOrder(order_id=order_id, placed_at=placed_at)
+            for order_id, placed_at in Order.objects.filter(
+                id__lte=last_run.last_order_id, placed_at__gte=last_run.placed_before - LATE_COMMIT_MARGIN,
+            ).values_list('id', 'placed_at')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0013_order_placed_index'),
+        ('store', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendedOrder',
+            fields=[
+                ('order_id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('placed_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Recommended Order',
+            },
+        ),
+        migrations.AddField(
+            model_name='recommendationrun',
+            name='placed_before',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(checkpoint_by_placed_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recommendationrun',
+            name='placed_before',
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveField(
+            model_name='recommendationrun',
+            name='last_order_id',
+        ),
+    ]
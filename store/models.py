@@ -1,11 +1,15 @@
 from django.db import models
+from django.db.models import Prefetch
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 
 class SliderImage(models.Model):
     image = models.ImageField(upload_to='slider_images/')
     title = models.CharField(max_length=200, blank=True, null=True)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)  # Recorded with the derivatives (store/images.py)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
     
 
     def __str__(self):
@@ -17,6 +21,8 @@ class SliderImage(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, blank=False, null=False)
     image = models.ImageField(upload_to='category_images/', blank=True, null=True)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     def delete(self, *args, **kwargs):
         
@@ -48,6 +54,23 @@ class SubCategory(models.Model):
     class Meta:
         verbose_name_plural ="SubCategory"
 
+def main_image_prefetch(lookup='images'):
+    """
+    Prefetch only the main image of each product into `main_images`, so a
+    listing of N products costs one extra query instead of N.
+    """
+    return Prefetch(
+        lookup,
+        queryset=ProductImage.objects.filter(is_main=True).order_by('id'),
+        to_attr='main_images',
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_main_image(self):
+        return self.prefetch_related(main_image_prefetch())
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200, blank=False)
     description = models.TextField(blank=True, null=True)
@@ -59,6 +82,8 @@ class Product(models.Model):
     discount = models.PositiveIntegerField(blank=True, null=True)  # Auto-calculated if applicable
     best_selling = models.BooleanField(default=False)
 
+    objects = ProductQuerySet.as_manager()
+
     def clean(self):
         if self.price < 0:
             raise ValidationError("Price cannot be negative.")
@@ -78,19 +103,94 @@ class Product(models.Model):
 
         super().save(*args, **kwargs)
 
+    @property
+    def main_image(self):
+        # Served from the prefetch when the queryset used `with_main_image()`
+        if hasattr(self, 'main_images'):
+            return self.main_images[0] if self.main_images else None
+        return self.images.filter(is_main=True).order_by('id').first()
+
     def __str__(self):
         return self.name
 
     class Meta:
         verbose_name_plural ="Product"
+        indexes = [
+            # The home page's handful of best sellers, without scanning the catalog
+            models.Index(fields=['id'], condition=models.Q(best_selling=True), name='store_product_bestseller_idx'),
+            # Category listings sorted by price (pagination.SORTS)
+            models.Index(fields=['category', 'price', 'id'], name='store_product_cat_price_idx'),
+        ]
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='product_images/')
     is_main = models.BooleanField(default=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.product.name}"
 
     class Meta:
-        verbose_name_plural ="Product Image"
\ No newline at end of file
+        verbose_name_plural ="Product Image"
+        indexes = [
+            # main_image_prefetch(): the main images of a page of products, in id order
+            models.Index(fields=['product', 'id'], condition=models.Q(is_main=True), name='store_prodimage_main_idx'),
+        ]
+
+class CoPurchase(models.Model):
+    """
+    Number of orders containing both `product` and `other`. Every pair is
+    stored in both directions so a product's neighbours are one index range.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+    class Meta:
+        verbose_name_plural ="Co-purchase"
+        constraints = [models.UniqueConstraint(fields=['product', 'other'], name='store_copurchase_pair_unique')]
+
+class Recommendation(models.Model):
+    """ The top products bought together with `product`, best first. Rebuilt by `update_recommendations`. """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    score = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.product} -> {self.recommended} (#{self.rank})"
+
+    class Meta:
+        verbose_name_plural ="Recommendation"
+        constraints = [models.UniqueConstraint(fields=['product', 'rank'], name='store_recommendation_rank_unique')]
+
+class RecommendationRun(models.Model):
+    """ One `update_recommendations` run; the latest is the checkpoint for the next. """
+    placed_before = models.DateTimeField()  # When the run started; later runs look back from here
+    orders = models.PositiveIntegerField()  # Orders folded into the statistics by this run
+    finished_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Recommendations up to {self.placed_before:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        verbose_name_plural ="Recommendation Run"
+
+class RecommendedOrder(models.Model):
+    """
+    An order already folded into the statistics, kept while it is within
+    the look-back window of the next run so it is not counted twice.
+    """
+    order_id = models.PositiveIntegerField(primary_key=True)
+    placed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Order {self.order_id}"
+
+    class Meta:
+        verbose_name_plural ="Recommended Order"
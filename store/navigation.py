@@ -0,0 +1,21 @@
+from django.core.cache import cache
+
+from .models import Category
+
+CATEGORY_TREE_CACHE_KEY = 'store:category-tree'
+
+
+def get_category_tree():
+    """
+    Return every Category with its subcategories prefetched. The tree is
+    cached until a Category or SubCategory is saved or deleted.
+    """
+    tree = cache.get(CATEGORY_TREE_CACHE_KEY)
+    if tree is None:
+        tree = list(Category.objects.prefetch_related('subcategories'))
+        cache.set(CATEGORY_TREE_CACHE_KEY, tree, None)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_CACHE_KEY)
@@ -0,0 +1,75 @@
+"""
+Response and fragment caching for catalog pages.
+
+Anonymous visitors all see the same page, so `cache_anonymous_page` stores
+the whole rendered response, keyed by the storefront version and the full
+path (query string included); any catalog or image change starts a new set
+of keys. Views listing products also pass `stock_scope`, so a stock change
+only starts new keys for the pages showing that product (see
+cart/stock.py). The CSRF token is the one per-visitor value in those
+pages: it is rendered as CSRF_PLACEHOLDER and swapped for the visitor's own
+token on the way out.
+
+Signed-in users get their page rendered, but the templates wrap everything
+except the per-user cart buttons in `{% cache %}` fragments keyed by the
+same `page_cache_version` (see context_processors.page_cache); product
+cards add the quantity available to their keys.
+"""
+import hashlib
+from functools import partial, wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .catalog import get_stock_version, get_storefront_version
+
+# Only bounds how long a page keeps e.g. its random related products;
+# content changes invalidate through the storefront version.
+PAGE_CACHE_TIMEOUT = 600
+
+CSRF_PLACEHOLDER = '__page_cache_csrf_token__'
+
+
+def _cache_key(request, stock_scope=None):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    stock_version = get_stock_version(stock_scope) if stock_scope else ''
+    return f"page:{get_storefront_version()}:{stock_version}:{path}"
+
+
+def _is_cacheable(request):
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+
+
+def _with_csrf_token(request, content):
+    return content.replace(CSRF_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+def cache_anonymous_page(view_func=None, *, stock_scope=None):
+    """
+    Serve anonymous GETs of `view_func` from the page cache. `stock_scope`
+    maps the view's arguments to the stock scope of the products it shows.
+    """
+    if view_func is None:
+        return partial(cache_anonymous_page, stock_scope=stock_scope)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = _cache_key(request, stock_scope and stock_scope(*args, **kwargs))
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(_with_csrf_token(request, content), content_type=content_type)
+
+        request.rendering_cached_page = True
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            cache.set(key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+        if not response.streaming:
+            response.content = _with_csrf_token(request, response.content)
+        return response
+
+    return wrapper
@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Each page is fetched with `WHERE (sort_key, id) > (last_sort_key, last_id)
+ORDER BY sort_key, id LIMIT n`, so the cost of a page does not depend on how
+deep into the listing it is or how big the category is.
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+# sort name -> (label, field, descending)
+SORTS = {
+    'id': ("Default", 'id', False),
+    'price': ("Price: low to high", 'price', False),
+    '-price': ("Price: high to low", 'price', True),
+    '-discount': ("Biggest discount", 'discount_value', True),
+}
+DEFAULT_SORT = 'id'
+
+
+def get_sort(value):
+    return value if value in SORTS else DEFAULT_SORT
+
+
+def get_page_size(value):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def encode_cursor(value, pk):
+    payload = json.dumps([str(value) if isinstance(value, Decimal) else value, pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model_field=None):
+    """
+    Return (value, pk) or None when the cursor is missing or malformed.
+    `value` is converted with `model_field`, the field being sorted on.
+    """
+    if not cursor:
+        return None
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if model_field is not None:
+            value = model_field.to_python(value)
+    except (ValueError, TypeError, ValidationError):
+        return None
+    if value is None or not isinstance(pk, int) or isinstance(pk, bool):
+        return None
+    return value, pk
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor, sort, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.sort = sort
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_keyset(queryset, sort=None, cursor=None, page_size=None):
+    """ Return the KeysetPage of `queryset` that follows `cursor`. """
+    sort = get_sort(sort)
+    page_size = get_page_size(page_size)
+    _, field, descending = SORTS[sort]
+
+    if field == 'discount_value':
+        # Products without a discount sort as 0% instead of NULL
+        queryset = queryset.annotate(discount_value=Coalesce('discount', 0))
+    if descending:
+        queryset = queryset.order_by(F(field).desc(), '-id')
+    else:
+        queryset = queryset.order_by(field, 'id')
+
+    # Annotated discount_value holds discount's values
+    model_field = queryset.model._meta.get_field('discount' if field == 'discount_value' else field)
+    position = decode_cursor(cursor, model_field)
+    if position is not None:
+        value, pk = position
+        after = 'lt' if descending else 'gt'
+        if field == 'id':
+            queryset = queryset.filter(**{f'id__{after}': pk})
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'id__{after}': pk}))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(rows, next_cursor, sort, page_size)
@@ -0,0 +1,141 @@
+"""
+"Frequently bought together" recommendations.
+
+`update_recommendations()` folds the order lines of orders placed since the
+previous run into per-pair purchase counts (CoPurchase), then rewrites the
+top TOP_K neighbours (Recommendation) of only the products those orders
+touched. Each run therefore costs in proportion to the new orders, not the
+whole order history. Orders canceled before a run are skipped; orders
+canceled after being counted stay counted.
+
+An order is placed (`placed_at`) before its checkout transaction commits,
+so one placed just before a run may only become visible after it. Each run
+therefore looks back LATE_COMMIT_MARGIN before the previous run started,
+and skips the orders in that window already folded in (RecommendedOrder).
+
+`bought_together()` is what product_detail reads: one lookup on the
+(product, rank) unique index.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import groupby, permutations
+
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Order, OrderLine
+from .catalog import bump_storefront_version
+from .models import CoPurchase, Product, Recommendation, RecommendationRun, RecommendedOrder
+
+TOP_K = 8
+BOUGHT_TOGETHER = 4
+
+# Orders with more distinct products than this are bulk buys, not signal,
+# and would add a quadratic number of pairs.
+MAX_BASKET_SIZE = 50
+
+BATCH_SIZE = 500
+
+# Longest expected gap between placing an order and committing it, clock skew
+# between app servers included
+LATE_COMMIT_MARGIN = timedelta(minutes=10)
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _new_orders(since=None):
+    """ (id, placed_at) of the orders placed since `since` (None: ever) not yet folded in. """
+    orders = Order.objects.all()
+    if since is not None:
+        folded = RecommendedOrder.objects.filter(placed_at__gte=since).values('order_id')
+        orders = orders.filter(placed_at__gte=since).exclude(id__in=folded)
+    return list(orders.values_list('id', 'placed_at'))
+
+
+def _new_pair_counts(order_ids):
+    """ Count product pairs over the given orders, skipping canceled ones. """
+    pairs = Counter()
+    orders = 0
+    for chunk in _chunks(order_ids):
+        lines = (
+            OrderLine.objects
+            .filter(order_id__in=chunk, product__isnull=False)
+            .exclude(order__status='canceled')
+            .order_by('order_id')
+            .values_list('order_id', 'product_id')
+        )
+        for _, basket in groupby(lines.iterator(), key=lambda line: line[0]):
+            products = {product_id for _, product_id in basket}
+            orders += 1
+            if len(products) <= MAX_BASKET_SIZE:
+                pairs.update(permutations(sorted(products), 2))
+    return pairs, orders
+
+
+def update_recommendations(top_k=TOP_K):
+    """ Fold orders placed since the last run into the recommendations. Returns the new run. """
+    with transaction.atomic():
+        started = timezone.now()
+        last_run = RecommendationRun.objects.order_by('-id').first()
+        new_orders = _new_orders(last_run.placed_before - LATE_COMMIT_MARGIN if last_run else None)
+        new_pairs, orders = _new_pair_counts([order_id for order_id, _ in new_orders])
+
+        touched = {product_id for product_id, _ in new_pairs}
+        neighbours = defaultdict(dict)  # product_id -> {other_id: count}
+        for chunk in _chunks(touched):
+            for product_id, other_id, count in CoPurchase.objects.filter(product_id__in=chunk).values_list(
+                'product_id', 'other_id', 'count'
+            ):
+                neighbours[product_id][other_id] = count
+        for (product_id, other_id), count in new_pairs.items():
+            neighbours[product_id][other_id] = neighbours[product_id].get(other_id, 0) + count
+
+        for chunk in _chunks(new_pairs):
+            CoPurchase.objects.bulk_create(
+                [CoPurchase(product_id=a, other_id=b, count=neighbours[a][b]) for a, b in chunk],
+                update_conflicts=True, unique_fields=['product', 'other'], update_fields=['count'],
+            )
+
+        recommendations = []
+        for product_id in touched:
+            best = sorted(neighbours[product_id].items(), key=lambda item: (-item[1], item[0]))[:top_k]
+            recommendations.extend(
+                Recommendation(product_id=product_id, recommended_id=other_id, rank=rank, score=count)
+                for rank, (other_id, count) in enumerate(best)
+            )
+        for chunk in _chunks(touched):
+            Recommendation.objects.filter(product_id__in=chunk).delete()
+        Recommendation.objects.bulk_create(recommendations, batch_size=BATCH_SIZE)
+
+        # Only the orders the next run looks back over need remembering
+        RecommendedOrder.objects.filter(placed_at__lt=started - LATE_COMMIT_MARGIN).delete()
+        RecommendedOrder.objects.bulk_create(
+            [RecommendedOrder(order_id=order_id, placed_at=placed_at)
+             for order_id, placed_at in new_orders if placed_at >= started - LATE_COMMIT_MARGIN],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        run = RecommendationRun.objects.create(placed_before=started, orders=orders)
+        transaction.on_commit(bump_storefront_version)  # product_detail shows them
+        return run
+
+
+def reset_recommendations():
+    """ Drop all statistics so the next run starts again from the first order. """
+    with transaction.atomic():
+        Recommendation.objects.all().delete()
+        CoPurchase.objects.all().delete()
+        RecommendationRun.objects.all().delete()
+        RecommendedOrder.objects.all().delete()
+        transaction.on_commit(bump_storefront_version)
+
+
+def bought_together(product, limit=BOUGHT_TOGETHER):
+    return list(
+        Product.objects.filter(recommended_for__product=product)
+        .order_by('recommended_for__rank')
+        .with_main_image()[:limit]
+    )
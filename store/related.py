@@ -0,0 +1,61 @@
+"""
+Random related products without loading the whole category.
+
+Products are sampled by random id-range probing: pick random ids between
+the category's smallest and largest product id and take, for each, the
+first product of the category at or after it. All probes are index seeks
+on category_id inside one query, so a detail page costs the same whatever
+the size of the category. Products that follow a gap in the ids are picked
+a little more often, which is fine for "you may also like".
+"""
+import random
+from bisect import bisect_left
+
+from django.db.models import Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+RELATED_PRODUCTS = 4
+
+# Probes per requested product; some land on the same product or past the end
+PROBES_PER_PRODUCT = 2
+
+# First product of a category at or after a pivot id. Built as raw SQL since
+# compiling one ORM subquery per probe cost more than running them.
+PROBE_SQL = (
+    'SELECT id FROM (SELECT id FROM {table} WHERE category_id = %s AND id >= %s AND id <> %s '
+    'ORDER BY id LIMIT 1) AS probe'
+).format(table=Product._meta.db_table)
+FILLER_SQL = (
+    'SELECT id FROM (SELECT id FROM {table} WHERE category_id = %s AND id <> %s '
+    'ORDER BY id LIMIT %s) AS filler'
+).format(table=Product._meta.db_table)
+
+
+def related_products(product, limit=RELATED_PRODUCTS, rng=random):
+    """ Up to `limit` random products of `product`'s category, with main images. """
+    category = Product.objects.filter(category_id=product.category_id)
+    siblings = category.exclude(id=product.id)
+    # Two index seeks; MIN() and MAX() in one SELECT would scan the category instead
+    low, high = Product.objects.filter(id=product.id).values_list(
+        Subquery(category.order_by('id').values('id')[:1]),
+        Subquery(category.order_by('-id').values('id')[:1]),
+    ).get()
+
+    pivots = [rng.randint(low, high) for _ in range(limit * PROBES_PER_PRODUCT)]
+    params = [param for pivot in pivots for param in (product.category_id, pivot, product.id)]
+    # The category's first products come along to top up small or sparse categories
+    candidates = RawSQL(
+        ' UNION ALL '.join([PROBE_SQL] * len(pivots) + [FILLER_SQL]),
+        params + [product.category_id, product.id, limit],
+    )
+    products = {p.id: p for p in siblings.filter(id__in=candidates).with_main_image()}
+
+    # Each probe hit the first candidate at or after its pivot
+    ids = sorted(products)
+    probed = sorted({ids[i] for i in (bisect_left(ids, pivot) for pivot in pivots) if i < len(ids)})
+    sample = rng.sample(probed, min(limit, len(probed)))
+    sample += [pk for pk in ids if pk not in probed][:limit - len(sample)]
+    rng.shuffle(sample)
+    return [products[pk] for pk in sample]
@@ -0,0 +1,246 @@
+"""
+Product search index.
+
+Products are indexed on name, category, subcategory and description and
+searched with ranked, prefix-matching AND queries. On SQLite the index is the
+FTS5 table created by migration 0002; on other databases, or an SQLite built
+without FTS5, a pure-Python inverted index kept in process memory is used
+instead. Each process rebuilds its in-memory index when the catalog version
+changes, so edits made through other processes reach it too.
+
+The index is updated from the Product/Category/SubCategory signals and can be
+rebuilt from scratch with `manage.py rebuild_search_index`.
+"""
+import functools
+import math
+import re
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .catalog import get_catalog_version
+from .models import Product
+
+FTS_TABLE = 'store_product_fts'
+
+# Relative weight of a match in name, category, subcategory and description.
+FIELD_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+TOKEN_RE = re.compile(r'\w+')
+
+POPULATE_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, category, subcategory, description) '
+    'SELECT p.id, p.name, c.name, s.name, p.description FROM store_product p '
+    'INNER JOIN store_category c ON c.id = p.category_id '
+    'LEFT OUTER JOIN store_subcategory s ON s.id = p.subcategory_id'
+)
+
+
+@functools.cache
+def sqlite_has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE fts5_probe USING fts5(body)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _documents(product_ids=None):
+    """ Yield (id, name, category, subcategory, description) rows. """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    return products.values_list('id', 'name', 'category__name', 'subcategory__name', 'description').iterator()
+
+
+class SQLiteFTSBackend:
+    """ Index stored in the SQLite FTS5 virtual table `store_product_fts`. """
+
+    RANK = 'bm25({}, {})'.format(FTS_TABLE, ', '.join(str(w) for w in FIELD_WEIGHTS))
+
+    @staticmethod
+    def is_available():
+        # Migration 0002 creates the table whenever SQLite supports FTS5
+        return connection.vendor == 'sqlite' and sqlite_has_fts5()
+
+    @staticmethod
+    def match_expression(tokens):
+        # Quote every token so FTS5 operators typed by users are matched
+        # literally, and make each one a prefix query like the old icontains.
+        return ' '.join('"{}"*'.format(token) for token in tokens)
+
+    def search(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY {self.RANK}, rowid',
+                [self.match_expression(tokens)],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter_queryset(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self.match_expression(tokens)])
+        return queryset.filter(id__in=matches)
+
+    def index(self, product_ids):
+        product_ids = list(product_ids)
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, category, subcategory, description) VALUES (%s, %s, %s, %s, %s)',
+                list(_documents(product_ids)),
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, list(product_ids))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(POPULATE_SQL)
+
+    @staticmethod
+    def _delete(cursor, product_ids):
+        if product_ids:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+
+class MemoryBackend:
+    """
+    Inverted index held in process memory, built from the database on first
+    use and again whenever the catalog version changes. Prefix queries walk
+    a sorted copy of the vocabulary with bisect.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None  # Catalog version the index was built at
+        self._postings = None  # token -> {product_id: weighted term frequency}
+        self._documents = {}  # product_id -> set of tokens, for removals
+        self._vocabulary = []
+
+    def search(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self._ensure_built()
+            scores = None
+            total = max(len(self._documents), 1)
+            for token in tokens:
+                token_scores = defaultdict(float)
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for product_id, weight in postings.items():
+                        token_scores[product_id] += weight * idf
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+                if not scores:
+                    return []
+        return sorted(scores, key=lambda pid: (-scores[pid], pid))
+
+    def filter_queryset(self, queryset, query):
+        return queryset.filter(id__in=self.search(query))
+
+    def index(self, product_ids):
+        with self._lock:
+            if self._postings is None:
+                return  # Built from the database on first search anyway
+            product_ids = list(product_ids)
+            self._remove(product_ids)
+            for document in _documents(product_ids):
+                self._add(*document)
+            self._vocabulary = sorted(self._postings)
+
+    def remove(self, product_ids):
+        with self._lock:
+            if self._postings is not None:
+                self._remove(product_ids)
+                self._vocabulary = sorted(self._postings)
+
+    def rebuild(self):
+        with self._lock:
+            # Read first: a change committed during the build bumps it again
+            self._version = get_catalog_version()
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            for document in _documents():
+                self._add(*document)
+            self._vocabulary = sorted(self._postings)
+
+    def _ensure_built(self):
+        if self._postings is None or self._version != get_catalog_version():
+            self.rebuild()
+
+    def _expand(self, prefix):
+        vocabulary = self._vocabulary
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            yield vocabulary[position]
+            position += 1
+
+    def _add(self, product_id, *fields):
+        tokens = set()
+        for text, weight in zip(fields, FIELD_WEIGHTS):
+            for token in tokenize(text):
+                postings = self._postings[token]
+                postings[product_id] = postings.get(product_id, 0.0) + weight
+                tokens.add(token)
+        self._documents[product_id] = tokens
+
+    def _remove(self, product_ids):
+        for product_id in product_ids:
+            for token in self._documents.pop(product_id, ()):
+                postings = self._postings[token]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+
+
+_memory_backend = MemoryBackend()
+
+
+def get_backend():
+    if SQLiteFTSBackend.is_available():
+        return SQLiteFTSBackend()
+    return _memory_backend
+
+
+def search_products(query):
+    """ Return the ids of products matching `query`, best match first. """
+    return get_backend().search(query)
+
+
+def filter_products(queryset, query):
+    """ Restrict `queryset` to products matching `query`, for custom orderings. """
+    return get_backend().filter_queryset(queryset, query)
+
+
+def index_products(product_ids):
+    get_backend().index(product_ids)
+
+
+def remove_products(product_ids):
+    get_backend().remove(product_ids)
+
+
+def rebuild_index():
+    get_backend().rebuild()
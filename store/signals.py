@@ -0,0 +1,79 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version, bump_storefront_version
+from .models import Category, SubCategory, Product, ProductImage, SliderImage
+from .navigation import invalidate_category_tree
+from . import images, search
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+def category_tree_changed(sender, **kwargs):
+    invalidate_category_tree()
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Product)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def reindex_category_products(sender, instance, created, **kwargs):
+    # Products are indexed with their category and subcategory names
+    if not created:
+        search.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=SliderImage)
+def remember_previous_image(sender, instance, raw, **kwargs):
+    instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_image = sender.objects.filter(pk=instance.pk).values_list('image', 'width').first()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SliderImage)
+def update_image_derivatives(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    name = instance.image.name if instance.image else ''
+    previous_name, previous_width = getattr(instance, '_previous_image', None) or ('', None)
+    if name == previous_name and (instance.width or not name):
+        return  # Image unchanged and already processed
+    if previous_name and previous_name != name:
+        images.delete_derivatives(previous_name, previous_width)
+
+    instance.width, instance.height = (name and images.generate_derivatives(name)) or (None, None)
+    sender.objects.filter(pk=instance.pk).update(width=instance.width, height=instance.height)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SliderImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    if instance.image:
+        images.delete_derivatives(instance.image.name, instance.width)
+
+
+# After the receivers above, so pages are re-rendered with the new derivatives
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=SliderImage)
+def storefront_changed(sender, **kwargs):
+    bump_storefront_version()
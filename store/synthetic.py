@@ -0,0 +1,165 @@
+"""
+Synthetic catalog and shopper generator used by the benchmarks and
+`manage.py generate_catalog`.
+
+Everything is written with bulk_create, so model save() hooks and signals do
+not run: computed fields are filled in here and the search index must be
+rebuilt afterwards.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from cart import history
+from cart.models import Cart, CartItem, Order, OrderLine, Shipping
+from userlogin.models import ContactInfo, CustomUser
+from .models import Category, SubCategory, Product, ProductImage
+
+# Every synthetic shopper signs in with this password
+SHOPPER_PASSWORD = "shopper-pass"
+
+WORDS = (
+    "dog", "cat", "bird", "fish", "puppy", "kitten", "food", "treat", "toy", "bowl",
+    "leash", "collar", "bed", "cage", "shampoo", "brush", "chew", "ball", "rope", "mouse",
+    "royal", "canin", "premium", "organic", "grain", "free", "chicken", "salmon", "lamb", "adult",
+    "mini", "large", "small", "soft", "crunchy", "dental", "classic", "deluxe", "travel", "winter",
+)
+
+
+def _phrase(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def create_catalog(products, categories=20, subcategories_per_category=5, images_per_product=1,
+                   best_selling_ratio=0.05, seed=0, batch_size=5000):
+    """ Create a random catalog and return the number of rows created per model. """
+    rng = random.Random(seed)
+    start = Category.objects.count()
+    category_objs = Category.objects.bulk_create(
+        Category(name=f"Category {start + i}", image=f"category_images/synthetic-{i}.jpg")
+        for i in range(categories)
+    )
+    subcategory_objs = SubCategory.objects.bulk_create(
+        SubCategory(category=category, name=f"{_phrase(rng, 1).title()} {i}")
+        for category in category_objs
+        for i in range(subcategories_per_category)
+    )
+
+    product_objs = []
+    for i in range(products):
+        subcategory = rng.choice(subcategory_objs)
+        price = Decimal(rng.randint(100, 10000)) / 100
+        old_price = price * Decimal("1.25") if rng.random() < 0.3 else None
+        product_objs.append(Product(
+            name=_phrase(rng, 3).title(),
+            description=_phrase(rng, 8),
+            category_id=subcategory.category_id,
+            subcategory=subcategory,
+            price=price,
+            old_price=old_price,
+            discount=20 if old_price else None,
+            quantity_available=rng.randint(0, 500),
+            best_selling=rng.random() < best_selling_ratio,
+        ))
+    product_objs = Product.objects.bulk_create(product_objs, batch_size=batch_size)
+
+    image_objs = ProductImage.objects.bulk_create(
+        (
+            ProductImage(product=product, image=f"product_images/synthetic-{product.id}-{n}.jpg", is_main=n == 0)
+            for product in product_objs
+            for n in range(images_per_product)
+        ),
+        batch_size=batch_size,
+    )
+    return {
+        'categories': len(category_objs),
+        'subcategories': len(subcategory_objs),
+        'products': len(product_objs),
+        'images': len(image_objs),
+    }
+
+
+def create_shoppers(users, orders_per_user=3, lines_per_order=3, cart_items=2, seed=0, batch_size=5000):
+    """
+    Create `users` shoppers over the existing products, each with an
+    address, a cart of `cart_items` products and `orders_per_user` past
+    orders in random states. Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    products = list(Product.objects.values_list('id', 'name', 'price'))
+    shipping = Shipping.objects.first() or Shipping.objects.create(charge=Decimal('70.00'))
+    start = CustomUser.objects.count()
+    password = make_password(SHOPPER_PASSWORD)  # Hashed once: the hasher is slow on purpose
+
+    user_objs = CustomUser.objects.bulk_create(
+        (
+            CustomUser(email=f"shopper{start + i}@example.com", username=f"shopper{start + i}", password=password)
+            for i in range(users)
+        ),
+        batch_size=batch_size,
+    )
+    address_objs = ContactInfo.objects.bulk_create(
+        (ContactInfo(user=user, address=f"{i} Main Street", city="Pune") for i, user in enumerate(user_objs)),
+        batch_size=batch_size,
+    )
+    carts = [
+        (user, [(line, rng.randint(1, 3)) for line in rng.sample(products, min(cart_items, len(products)))])
+        for user in user_objs
+    ]
+    # bulk_create skips cart/totals.py, so the running totals are filled in here
+    cart_objs = Cart.objects.bulk_create(
+        (
+            Cart(user=user, item_count=len(basket), subtotal=sum(price * quantity for (_, _, price), quantity in basket))
+            for user, basket in carts
+        ),
+        batch_size=batch_size,
+    )
+    item_objs = CartItem.objects.bulk_create(
+        (
+            CartItem(cart=cart, product_id=pk, quantity=quantity)
+            for cart, (_, basket) in zip(cart_objs, carts)
+            for (pk, _, _), quantity in basket
+        ),
+        batch_size=batch_size,
+    )
+
+    now = timezone.now()
+    order_objs = []
+    baskets = []
+    for user, address in zip(user_objs, address_objs):
+        for _ in range(orders_per_user):
+            basket = [(line, rng.randint(1, 3)) for line in rng.sample(products, min(lines_per_order, len(products)))]
+            placed_at = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+            status = rng.choice(('pending', 'shipped', 'delivered', 'delivered', 'canceled'))
+            order_objs.append(Order(
+                user=user,
+                address=address,
+                shipping=shipping,
+                total_price=sum(price * quantity for (_, _, price), quantity in basket) + shipping.charge,
+                status=status,
+                order_day=placed_at.strftime('%A'),
+                placed_at=placed_at,
+                **({f'{status}_at': placed_at + timedelta(days=2)} if status != 'pending' else {}),
+            ))
+            baskets.append(basket)
+    order_objs = Order.objects.bulk_create(order_objs, batch_size=batch_size)
+    line_objs = OrderLine.objects.bulk_create(
+        (
+            OrderLine(order=order, product_id=pk, product_name=name, unit_price=price, quantity=quantity)
+            for order, basket in zip(order_objs, baskets)
+            for (pk, name, price), quantity in basket
+        ),
+        batch_size=batch_size,
+    )
+    history.record(order.id for order in order_objs)
+    return {
+        'users': len(user_objs),
+        'carts': len(cart_objs),
+        'cart items': len(item_objs),
+        'orders': len(order_objs),
+        'order lines': len(line_objs),
+    }
+
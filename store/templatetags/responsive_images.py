@@ -0,0 +1,33 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from store import images
+
+register = template.Library()
+
+# Product grid cards are roughly 300 CSS pixels wide, two per row on phones
+DEFAULT_SIZES = "(max-width: 600px) 50vw, 300px"
+
+
+@register.simple_tag
+def responsive_image(obj, alt='', css_class='', sizes=DEFAULT_SIZES, loading='lazy'):
+    """
+    <picture> for a ProductImage, Category or SliderImage: WebP and JPEG
+    srcsets of its derivatives, and width/height so the layout does not
+    shift while it loads. Falls back to a plain <img> until the derivatives
+    exist.
+    """
+    image = getattr(obj, 'image', None)
+    if not image:
+        return format_html('<img src="{}" alt="{}" class="{}">', static('default-image.jpg'), alt, css_class)
+    if not obj.width:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}">', image.url, alt, css_class, loading)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        images.srcset(image.name, obj.width, 'webp'), sizes,
+        image.url, images.srcset(image.name, obj.width, 'jpeg'), sizes,
+        obj.width, obj.height, alt, css_class, loading,
+    )
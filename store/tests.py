@@ -1,3 +1,857 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import random
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from PIL import Image
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.utils import timezone
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from petshop import database, instrumentation, staticfiles
+from userlogin.models import ContactInfo, CustomUser
+from cart import stock
+from cart import totals as cart_totals
+from cart.models import Cart, CartItem, Order, OrderLine
+from .models import Category, SubCategory, Product, ProductImage, CoPurchase, Recommendation
+from .navigation import get_category_tree
+from .views import SEARCH_RESULTS_PER_PAGE
+from . import catalog, images, page_cache, pagination, search, synthetic, typeahead
+from .pagination import paginate_keyset
+from .related import related_products
+from .recommendations import bought_together, update_recommendations
+
+
+def add_products(category, subcategory, count, start=0):
+    products = []
+    for i in range(start, start + count):
+        product = Product.objects.create(
+            name=f"Dog Food {i}",
+            description="Crunchy kibble",
+            category=category,
+            subcategory=subcategory,
+            price=100 + i,
+            quantity_available=10,
+            best_selling=True,
+        )
+        ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg", is_main=True)
+        ProductImage.objects.create(product=product, image=f"product_images/{i}_alt.jpg")
+        products.append(product)
+    return products
+
+
+class MainImageQueryCountTests(TestCase):
+    """
+    Listing views must cost the same number of queries whatever the number
+    of products they render.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Dogs")
+        self.subcategory = SubCategory.objects.create(category=self.category, name="Food")
+        self.products = add_products(self.category, self.subcategory, 2)
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        before = self.count_queries(url)
+        add_products(self.category, self.subcategory, 5, start=2)
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_index(self):
+        self.assertConstantQueries(reverse('store:index'))
+
+    def test_index_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries(reverse('store:index'))
+
+    def test_category_detail(self):
+        self.assertConstantQueries(reverse('store:category_detail', args=[self.category.id]))
+
+    def test_subcategory_detail(self):
+        self.assertConstantQueries(
+            reverse('store:subcategory_detail', args=[self.category.id, self.subcategory.id])
+        )
+
+    def test_search_results(self):
+        self.assertConstantQueries(reverse('store:search_results') + '?q=food')
+
+    def test_product_detail(self):
+        self.assertConstantQueries(reverse('store:product_detail', args=[self.products[0].id]))
+
+    def test_main_image_is_rendered(self):
+        response = self.client.get(reverse('store:category_detail', args=[self.category.id]))
+        self.assertContains(response, "product_images/0.jpg")
+        self.assertNotContains(response, "product_images/0_alt.jpg")
+
+
+class CategoryTreeCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Birds")
+        SubCategory.objects.create(category=self.category, name="Cages")
+
+    def category_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:about_us'))
+        self.assertContains(response, "Birds")
+        return [q for q in queries if 'store_category' in q['sql'] or 'store_subcategory' in q['sql']]
+
+    def test_only_first_request_hits_database(self):
+        self.assertTrue(self.category_queries())
+        self.assertEqual(self.category_queries(), [])
+
+    def test_changes_invalidate_tree(self):
+        self.category_queries()
+        SubCategory.objects.create(category=self.category, name="Seeds")
+        self.assertTrue(self.category_queries())
+        self.assertEqual(self.category_queries(), [])
+
+        self.category.name = "Birds & Parrots"
+        self.category.save()
+        response = self.client.get(reverse('store:Privacy-policy'))
+        self.assertContains(response, "Birds &amp; Parrots")
+
+    def test_subcategory_str_uses_prefetched_category(self):
+        tree = get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertEqual([str(s) for s in tree[0].subcategories.all()], ["Cages (Birds)"])
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.dogs = Category.objects.create(name="Dogs")
+        self.fish = Category.objects.create(name="Fish")
+        self.food = SubCategory.objects.create(category=self.dogs, name="Food")
+        self.kibble = Product.objects.create(name="Salmon Kibble", category=self.dogs, subcategory=self.food, price=10)
+        self.tank = Product.objects.create(
+            name="Glass Tank", description="Keeps your salmon happy", category=self.fish, price=99
+        )
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(search.search_products("salmon"), [self.kibble.id, self.tank.id])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(search.search_products("salm kib"), [self.kibble.id])
+        self.assertEqual(search.search_products("dog"), [self.kibble.id])
+        self.assertEqual(search.search_products('"tank* ('), [self.tank.id])
+
+    def test_index_follows_product_changes(self):
+        self.kibble.name = "Chicken Kibble"
+        self.kibble.save()
+        self.assertEqual(search.search_products("salmon"), [self.tank.id])
+        self.tank.delete()
+        self.assertEqual(search.search_products("salmon"), [])
+        self.dogs.name = "Puppies"
+        self.dogs.save()
+        self.assertEqual(search.search_products("pupp"), [self.kibble.id])
+
+    def test_memory_backend_matches_database_backend(self):
+        backend = search.MemoryBackend()
+        backend.rebuild()
+        for query in ("salmon", "salm kib", "dog", "glass happy", "nothing"):
+            self.assertEqual(backend.search(query), search.search_products(query))
+
+    def test_memory_backend_follows_changes_from_other_processes(self):
+        backend = search.MemoryBackend()
+        self.assertEqual(backend.search("chicken"), [])
+        # Another worker's save: no signal reaches this process's index, only the shared catalog version
+        Product.objects.filter(id=self.kibble.id).update(name="Chicken Kibble")
+        catalog.bump_catalog_version()
+        self.assertEqual(backend.search("chicken"), [self.kibble.id])
+
+    def test_search_results_are_paginated(self):
+        for i in range(SEARCH_RESULTS_PER_PAGE + 1):
+            Product.objects.create(name=f"Tank {i}", category=self.fish, price=5)
+        response = self.client.get(reverse('store:search_results'), {'q': 'tank', 'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['results']), 2)
+
+
+class TypeaheadTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.dogs = Category.objects.create(name="Dogs")
+        SubCategory.objects.create(category=self.dogs, name="Dog Beds")
+        self.popular = Product.objects.create(name="Dog Bowl", category=self.dogs, price=5, best_selling=True)
+        for i in range(typeahead.TYPEAHEAD_LIMIT + 2):
+            Product.objects.create(name=f"Dog Toy {i}", category=self.dogs, price=5)
+
+    def search(self, query, **headers):
+        return self.client.get(reverse('store:ajax_search'), {'q': query}, **headers)
+
+    def test_matches_word_prefixes_capped_by_popularity(self):
+        results = self.search("do").json()['results']
+        self.assertEqual(len(results['products']), typeahead.TYPEAHEAD_LIMIT)
+        self.assertEqual(results['products'][0], {'id': self.popular.id, 'name': "Dog Bowl"})
+        self.assertEqual(results['categories'], [{'id': self.dogs.id, 'name': "Dogs"}])
+        self.assertEqual(results['subcategories'][0]['category__name'], "Dogs")
+        self.assertEqual(self.search("bowl").json()['results']['products'][0]['id'], self.popular.id)
+
+    def test_heavy_prefixes_match_a_full_scan(self):
+        with mock.patch.object(typeahead, 'HEAVY_PREFIX_SIZE', 2):
+            index = typeahead.build_index()
+        self.assertIn("dog t", index.heavy_prefixes)
+        for prefix, precomputed in index.heavy_prefixes.items():
+            refs = {ref for key, ref in zip(index.keys, index.refs) if key.startswith(prefix)}
+            self.assertEqual(precomputed, index._top(refs))
+
+    def test_repeated_prefix_skips_database(self):
+        self.search("dog")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.search("dog")
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.search("dog", HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_refreshes_when_catalog_changes(self):
+        etag = self.search("cat").headers['ETag']
+        self.assertEqual(self.search("cat").json()['results']['products'], [])
+        Product.objects.create(name="Cat Tree", category=self.dogs, price=5)
+        response = self.search("cat", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results']['products'][0]['name'], "Cat Tree")
+
+    async def test_async_lookup_serves_the_previous_index_during_a_rebuild(self):
+        previous = await sync_to_async(typeahead.build_index)()
+        with mock.patch.multiple(typeahead, _index=previous, _index_version='old'), \
+                mock.patch.object(typeahead, 'get_index') as get_index:
+            with typeahead._lock:  # Another request is rebuilding
+                results = await typeahead.atypeahead("dog")
+        get_index.assert_not_called()  # Would wait in a thread for the rebuild
+        self.assertEqual(results['products'][0]['name'], "Dog Bowl")
+
+    async def test_async_rebuild_leaves_the_shared_sync_thread_free(self):
+        shared_thread = await sync_to_async(threading.get_ident)()
+        rebuilt_in = []
+        index = mock.Mock()
+        index.lookup.return_value = {}
+
+        def build_index():
+            rebuilt_in.append(threading.get_ident())
+            return index
+
+        with mock.patch.multiple(typeahead, _index=None, _index_version=None, build_index=build_index):
+            await typeahead.atypeahead("dog")
+        self.assertNotEqual(rebuilt_in, [shared_thread])
+        self.assertEqual(len(rebuilt_in), 1)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Fish")
+        for i in range(7):
+            # Repeated prices and discounts exercise the id tie-breaker
+            Product.objects.create(
+                name=f"Fish Tank {i}", category=self.category, price=10 + i % 3,
+                old_price=20 if i % 2 else None,
+            )
+
+    def walk(self, sort, page_size=3):
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(Product.objects.all(), sort, cursor, page_size)
+            self.assertLessEqual(len(page), page_size)
+            seen.extend(page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_walks_every_product_once_in_order(self):
+        for sort, (_, field, descending) in pagination.SORTS.items():
+            with self.subTest(sort=sort):
+                products = self.walk(sort)
+                self.assertEqual(len({p.id for p in products}), Product.objects.count())
+                keys = [((p.discount or 0) if field == 'discount_value' else getattr(p, field)) for p in products]
+                self.assertEqual(keys, sorted(keys, reverse=descending))
+
+    def test_bad_cursor_and_page_size(self):
+        page = paginate_keyset(Product.objects.all(), 'price', 'not-a-cursor', '1000')
+        self.assertEqual(len(page), Product.objects.count())
+        self.assertEqual(page.page_size, pagination.MAX_PAGE_SIZE)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        url = reverse('store:category_detail', args=[self.category.id])
+        for sort, payload in [
+            ('price', ["abc", 1]), ('price', [[1], 1]), ('price', [None, 1]), ('price', ["NaN", 1]),
+            ('-discount', ["x", 1]), ('id', [1, "1"]), ('price', ["10", 1.5]), ('price', ["10", True]),
+        ]:
+            with self.subTest(sort=sort, payload=payload):
+                # Treated as no cursor: the first page
+                response = self.client.get(url, {'sort': sort, 'cursor': cursor(payload)})
+                self.assertEqual(len(response.context['page']), Product.objects.count())
+        response = self.client.get(reverse('store:product_list_json'), {'sort': 'price', 'cursor': cursor(["abc", 1])})
+        self.assertEqual(len(response.json()['products']), Product.objects.count())
+
+    def test_category_detail_pages(self):
+        url = reverse('store:category_detail', args=[self.category.id])
+        response = self.client.get(url, {'page_size': 5, 'sort': '-price'})
+        page = response.context['page']
+        self.assertEqual(len(page), 5)
+        response = self.client.get(url, {'page_size': 5, 'sort': '-price', 'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['page']), 2)
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_sorted_search_results(self):
+        response = self.client.get(reverse('store:search_results'), {'q': 'tank', 'sort': 'price'})
+        prices = [p.price for p in response.context['results']]
+        self.assertEqual(prices, sorted(prices))
+
+    def test_load_more_endpoint(self):
+        url = reverse('store:product_list_json')
+        data = self.client.get(url, {'category': self.category.id, 'q': 'fish', 'page_size': 4}).json()
+        self.assertEqual(len(data['products']), 4)
+        data = self.client.get(url, {'category': self.category.id, 'q': 'fish', 'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(data['products']), 3)
+        self.assertIsNone(data['next_cursor'])
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Dogs")
+        self.subcategory = SubCategory.objects.create(category=self.category, name="Food")
+        self.products = add_products(self.category, self.subcategory, 3)
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        self.url = reverse('store:product_detail', args=[self.products[0].id])
+
+    def test_anonymous_hit_runs_no_queries(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, "Dog Food 0")
+
+    def test_each_visitor_gets_their_own_csrf_token(self):
+        self.client.get(self.url)
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get(self.url)
+        self.assertNotContains(response, page_cache.CSRF_PLACEHOLDER)
+        token = response.content.decode().split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        add = client.post(reverse('cart:add_to_cart', args=[self.products[0].id]), {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(add.status_code, 403)
+
+    def test_query_string_is_part_of_the_key(self):
+        url = reverse('store:category_detail', args=[self.category.id])
+        self.assertContains(self.client.get(url), "Dog Food 2")
+        self.assertNotContains(self.client.get(url, {'sort': 'price', 'page_size': 1}), "Dog Food 2")
+
+    def test_catalog_changes_invalidate(self):
+        self.client.get(self.url)
+        Product.objects.filter(id=self.products[0].id).update(name="Cat Food 0")  # No signal: still cached
+        self.assertContains(self.client.get(self.url), "Dog Food 0")
+        self.products[0].refresh_from_db()
+        self.products[0].save()
+        self.assertContains(self.client.get(self.url), "Cat Food 0")
+
+    def test_stock_changes_invalidate(self):
+        self.assertContains(self.client.get(self.url), "Quantity:10")
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve({self.products[0].id: 3})
+        self.assertContains(self.client.get(self.url), "Quantity:7")
+
+    def test_stock_changes_keep_other_pages_cached(self):
+        other_url = reverse('store:product_detail', args=[self.products[1].id])
+        self.client.get(other_url)
+        version = catalog.get_storefront_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve({self.products[0].id: 3})
+        self.assertEqual(catalog.get_storefront_version(), version)
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+    def test_running_out_of_stock_invalidates_everything(self):
+        version = catalog.get_storefront_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve({self.products[0].id: 10})
+        self.assertNotEqual(catalog.get_storefront_version(), version)
+        version = catalog.get_storefront_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.release({self.products[0].id: 2})
+        self.assertNotEqual(catalog.get_storefront_version(), version)
+        version = catalog.get_storefront_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.release({self.products[0].id: 2})
+        self.assertEqual(catalog.get_storefront_version(), version)
+
+    def test_product_card_fragments_show_current_stock(self):
+        self.client.force_login(self.user)
+        url = reverse('store:category_detail', args=[self.category.id])
+        self.assertContains(self.client.get(url), "Quantity Available: 10")
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve({self.products[0].id: 3})
+        self.assertContains(self.client.get(url), "Quantity Available: 7")
+
+    def test_authenticated_pages_are_not_cached(self):
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=1)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Go to Cart")
+        self.assertContains(response, self.user.email)
+
+    def test_fragments_are_shared_between_users(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('store:index'))
+        Product.objects.filter(id=self.products[0].id).update(name="Cat Food 0")  # No signal: fragment kept
+        other = CustomUser.objects.create_user(email="other@example.com", username="other", password="secret-pass")
+        CartItem.objects.create(cart=Cart.objects.create(user=other), product=self.products[1], quantity=1)
+        self.client.force_login(other)
+        response = self.client.get(reverse('store:index'))
+        self.assertContains(response, "Dog Food 0")
+        self.assertContains(response, "Go to Cart", count=1)
+
+
+class QueryPlanTests(TestCase):
+    """ Every query behind the main pages must reach its rows through an index. """
+
+    # Read whole on purpose: short lists shown in full, or related.py's derived tables
+    FULL_SCANS = {'store_category', 'store_sliderimage', 'cart_shipping', 'probe', 'filler'}
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Dogs")
+        self.subcategory = SubCategory.objects.create(category=self.category, name="Food")
+        self.products = add_products(self.category, self.subcategory, 3)
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        self.address = ContactInfo.objects.create(user=self.user, address="1 Main Street", city="Pune")
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.products[0], quantity=1)
+        self.client.force_login(self.user)
+
+    def assertUsesIndexes(self, url, data=None, method='get'):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query['sql'].startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                for *_, detail in cursor.fetchall():
+                    # "SCAN table" with no "USING ... INDEX" reads the whole table
+                    scan = re.fullmatch(r'SCAN (\w+)', detail)
+                    if scan and scan.group(1) not in self.FULL_SCANS:
+                        scans.append(f"{detail}: {query['sql']}")
+        self.assertEqual(scans, [])
+
+    def test_catalog_pages(self):
+        self.assertUsesIndexes(reverse('store:index'))
+        self.assertUsesIndexes(reverse('store:category_detail', args=[self.category.id]))
+        self.assertUsesIndexes(reverse('store:category_detail', args=[self.category.id]), {'sort': '-price'})
+        self.assertUsesIndexes(reverse('store:subcategory_detail', args=[self.category.id, self.subcategory.id]))
+        self.assertUsesIndexes(reverse('store:product_detail', args=[self.products[0].id]))
+        self.assertUsesIndexes(reverse('store:search_results'), {'q': 'food'})
+
+    def test_cart_pages(self):
+        self.assertUsesIndexes(reverse('cart:view_cart'))
+        self.assertUsesIndexes(reverse('cart:add_to_cart', args=[self.products[1].id]), {'quantity': 1}, 'post')
+        self.assertUsesIndexes(reverse('cart:checkout'))
+        self.assertUsesIndexes(reverse('cart:place_order'), {'address_id': self.address.id}, 'post')
+        self.assertUsesIndexes(reverse('cart:order_history'))
+
+    def test_hot_lookups_use_their_indexes(self):
+        # SQLite builds unique constraints as automatic indexes named after the table
+        plans = {
+            'store_product_bestseller_idx': Product.objects.filter(best_selling=True),
+            'store_product_cat_price_idx': Product.objects.filter(category=self.category).order_by('price', 'id'),
+            'store_prodimage_main_idx': ProductImage.objects.filter(product__in=self.products, is_main=True),
+            'sqlite_autoindex_cart_cartitem_1 (cart_id=? AND product_id=?)':
+                CartItem.objects.filter(cart__user=self.user, product=self.products[0]),
+            'sqlite_autoindex_cart_cart_1 (user_id=?)': Cart.objects.filter(user=self.user),
+        }
+        for index, queryset in plans.items():
+            with self.subTest(index):
+                self.assertIn(index, queryset.explain())
+
+
+class RelatedProductsTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Dogs")
+        self.other = Category.objects.create(name="Cats")
+        self.product = Product.objects.create(name="Dog Bowl", category=self.category, price=5)
+
+    def add(self, count, category=None):
+        return Product.objects.bulk_create(
+            Product(name=f"Dog Toy {i}", category=category or self.category, price=5) for i in range(count)
+        )
+
+    def test_samples_distinct_siblings(self):
+        self.add(3, self.other)
+        siblings = {p.id for p in self.add(30)}
+        for seed in range(20):
+            related = related_products(self.product, rng=random.Random(seed))
+            self.assertEqual(len(related), 4)
+            self.assertEqual(len({p.id for p in related}), 4)
+            self.assertLessEqual({p.id for p in related}, siblings)
+
+    def test_small_category_returns_every_sibling(self):
+        self.assertEqual(related_products(self.product), [])
+        siblings = self.add(2)
+        self.add(5, self.other)
+        self.assertEqual({p.id for p in related_products(self.product)}, {p.id for p in siblings})
+
+    def test_query_count_does_not_grow_with_category(self):
+        self.add(5)
+        with CaptureQueriesContext(connection) as small:
+            related_products(self.product)
+        self.add(500)
+        with CaptureQueriesContext(connection) as large:
+            related = related_products(self.product)
+        self.assertEqual(len(small), len(large))
+        with self.assertNumQueries(0):
+            [p.main_image for p in related]
+
+
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        category = Category.objects.create(name="Dogs")
+        self.bowl, self.food, self.leash, self.toy = [
+            Product.objects.create(name=name, category=category, price=5) for name in ("Bowl", "Food", "Leash", "Toy")
+        ]
+
+    def order(self, *products, status='pending', **fields):
+        order = Order.objects.create(user=self.user, total_price=10, status=status, **fields)
+        OrderLine.objects.bulk_create(
+            OrderLine(order=order, product=p, product_name=p.name, unit_price=p.price, quantity=1) for p in products
+        )
+        return order
+
+    def test_ranks_by_co_purchase_count(self):
+        self.order(self.bowl, self.food)
+        self.order(self.bowl, self.food, self.leash)
+        self.order(self.bowl, self.toy, status='canceled')
+        run = update_recommendations()
+        self.assertEqual(run.orders, 2)
+        self.assertEqual(bought_together(self.bowl), [self.food, self.leash])
+        self.assertEqual(bought_together(self.leash), [self.bowl, self.food])
+        self.assertEqual(bought_together(self.toy), [])
+
+    def test_runs_only_over_new_orders(self):
+        self.order(self.bowl, self.food)
+        self.order(self.bowl, self.food)
+        update_recommendations()
+        with CaptureQueriesContext(connection) as before:
+            self.assertEqual(update_recommendations().orders, 0)
+        for _ in range(10):
+            self.order(self.food, self.toy)
+        update_recommendations()
+        with CaptureQueriesContext(connection) as after:
+            self.assertEqual(update_recommendations().orders, 0)
+        self.assertEqual(len(after), len(before))
+
+        self.order(self.bowl, self.leash)
+        self.order(self.bowl, self.leash)
+        self.order(self.bowl, self.leash)
+        self.assertEqual(update_recommendations().orders, 3)
+        self.assertEqual(CoPurchase.objects.get(product=self.bowl, other=self.food).count, 2)
+        self.assertEqual(CoPurchase.objects.get(product=self.bowl, other=self.leash).count, 3)
+        self.assertEqual(bought_together(self.bowl), [self.leash, self.food])
+        self.assertEqual(bought_together(self.food), [self.toy, self.bowl])
+        self.assertEqual(Recommendation.objects.filter(product=self.leash).count(), 1)
+
+    def test_counts_orders_committed_after_a_run(self):
+        self.order(self.bowl, self.food, id=2)
+        self.assertEqual(update_recommendations().orders, 1)
+
+        # Given a lower id and placed before that run started, but committed after it
+        self.order(self.bowl, self.toy, id=1, placed_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(update_recommendations().orders, 1)
+        self.assertEqual(bought_together(self.bowl), [self.food, self.toy])
+        # Orders within the look-back window are only counted once
+        self.assertEqual(update_recommendations().orders, 0)
+        self.assertEqual(CoPurchase.objects.get(product=self.bowl, other=self.food).count, 1)
+
+    def test_product_detail_shows_bought_together(self):
+        self.order(self.bowl, self.food)
+        update_recommendations()
+        response = self.client.get(reverse('store:product_detail', args=[self.bowl.id]))
+        self.assertContains(response, "Frequently Bought Together")
+        self.assertEqual(response.context['bought_together'], [self.food])
+
+
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        category = Category.objects.create(name="Dogs")
+        self.product = Product.objects.create(name="Dog Bowl", category=category, price=5)
+
+    def upload(self, name, size=(700, 500)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def derivatives(self, image):
+        return [images.derivative_name(image.image.name, w, fmt) for w in (160, 320, 640) for fmt in images.FORMATS]
+
+    def test_upload_records_size_and_writes_derivatives(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload("bowl.png"), is_main=True)
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (700, 500))
+        for name in self.derivatives(image):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(images.derivative_name(image.image.name, 320, 'webp')) as derivative:
+            self.assertEqual(Image.open(derivative).size, (320, 229))
+        self.assertFalse(default_storage.exists(images.derivative_name(image.image.name, 1280, 'webp')))
+
+    def test_replacing_and_deleting_clean_up_derivatives(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload("bowl.png"))
+        old = self.derivatives(image)
+        image.image = self.upload("bowl-new.png", size=(400, 400))
+        image.save()
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+        self.assertEqual(image.width, 400)
+        image.delete()
+        self.assertFalse(default_storage.exists(images.derivative_name(image.image.name, 320, 'jpeg')))
+
+    def test_responsive_image_tag(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload("bowl.png"))
+        html = Template('{% load responsive_images %}{% responsive_image image alt="Bowl" %}').render(
+            Context({'image': image})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-320w.webp 320w', html)
+        self.assertIn('-640w.jpg 640w', html)
+        self.assertIn('width="700" height="500"', html)
+
+        missing = Template('{% load responsive_images %}{% responsive_image image %}').render(Context({'image': None}))
+        self.assertIn('default-image.jpg', missing)
+
+
+class StaticAssetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(STATIC_ROOT=cls.static_root)
+        cls.settings_override.enable()
+        # Full-strength brotli over the admin's vendor assets takes most of a minute
+        with mock.patch.object(staticfiles, 'BROTLI_QUALITY', 1):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.static_root)
+        super().tearDownClass()
+
+    def hashed_url(self, name):
+        return Template('{% load static %}{% static name %}').render(Context({'name': name}))
+
+    def test_collectstatic_hashes_and_compresses(self):
+        url = self.hashed_url('css/style.css')
+        self.assertRegex(url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+        path = self.static_root + url[len('/static'):]
+        with open(path, 'rb') as original, open(path + '.gz', 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), original.read())
+
+    def test_serves_best_encoding_with_immutable_headers(self):
+        url = self.hashed_url('css/style.css')
+        encodings = ['gzip'] + (['br'] if staticfiles.brotli else [])
+        for encoding in encodings:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=f'deflate, {encoding}')
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(response['Cache-Control'], staticfiles.IMMUTABLE_CACHE_CONTROL)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(response['Content-Type'], 'text/css')
+
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'body', b''.join(response.streaming_content))
+
+    def test_refused_encodings_are_not_served(self):
+        url = self.hashed_url('css/style.css')
+        for header in ('gzip;q=0', 'gzip; q=0.0, deflate', '*;q=0', 'br;q=0, gzip;q=0', 'gzipped', '*, gzip;q=0, br;q=0'):
+            with self.subTest(header=header):
+                self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING=header).has_header('Content-Encoding'))
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0.5')['Content-Encoding'], 'gzip')
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, *')['Content-Encoding'], 'gzip')
+
+    def test_missing_manifest_entries_raise(self):
+        with self.assertRaises(ValueError):
+            self.hashed_url('css/missing.css')
+
+    def test_plain_names_are_revalidated(self):
+        response = self.client.get('/static/css/style.css')
+        self.assertEqual(response['Cache-Control'], staticfiles.DEFAULT_CACHE_CONTROL)
+        response = self.client.get('/static/css/style.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_admin_assets_are_hashed(self):
+        self.assertRegex(self.hashed_url('jazzmin/css/main.css'), r'main\.[0-9a-f]{12}\.css$')
+        response = self.client.get(self.hashed_url('jazzmin/css/main.css'))
+        self.assertEqual(response.status_code, 200)
+
+
+class DatabaseSettingsTests(TestCase):
+
+    def test_sqlite_is_the_default(self):
+        config = database.database_settings(settings.BASE_DIR, environ={})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], settings.BASE_DIR / 'db.sqlite3')
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('PRAGMA busy_timeout = 5000', config['OPTIONS']['init_command'])
+        # WAL rewrites the database file, so only on request
+        self.assertNotIn('journal_mode', config['OPTIONS']['init_command'])
+        self.assertNotIn('synchronous', config['OPTIONS']['init_command'])
+        config = database.database_settings(settings.BASE_DIR, environ={'DATABASE_SQLITE_WAL': '1'})
+        self.assertIn('PRAGMA journal_mode = WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA synchronous = NORMAL', config['OPTIONS']['init_command'])
+
+    def test_postgresql_keeps_connections(self):
+        config = database.database_settings(settings.BASE_DIR, environ={
+            'DATABASE_ENGINE': 'postgresql', 'DATABASE_NAME': 'shop', 'DATABASE_HOST': 'db',
+        })
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['HOST']), ('shop', 'db'))
+        self.assertEqual(config['CONN_MAX_AGE'], database.POSTGRESQL_CONN_MAX_AGE)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertFalse(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+        config = database.database_settings(settings.BASE_DIR, environ={
+            'DATABASE_ENGINE': 'postgresql', 'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_DISABLE_SERVER_SIDE_CURSORS': 'true',
+        })
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_postgresql_pools_under_asgi(self):
+        config = database.database_settings(settings.BASE_DIR, environ={
+            'DATABASE_ENGINE': 'postgresql', 'SERVER_INTERFACE': 'asgi', 'DATABASE_POOL_SIZE': '4',
+        })
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS'], {'pool': {'min_size': 1, 'max_size': 4}})
+
+        with self.assertRaises(ValueError):
+            database.database_settings(settings.BASE_DIR, environ={
+                'DATABASE_ENGINE': 'postgresql', 'SERVER_INTERFACE': 'asgi', 'DATABASE_CONN_MAX_AGE': '60',
+            })
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database.database_settings(settings.BASE_DIR, environ={'DATABASE_ENGINE': 'mysql'})
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], database.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 2)  # FULL, as the rollback journal needs
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+        self.category = Category.objects.create(name="Dogs")
+        self.products = add_products(self.category, None, 3)
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_every_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('store:category_detail', args=[self.category.id]))
+        timing = self.server_timing(response)
+        self.assertIn(f'desc="{len(queries)} queries"', timing['sql'])
+        self.assertRegex(timing['tpl'], r'dur=\d+\.\d')
+        self.assertIn('total', timing)
+
+    def test_metrics_are_aggregated_per_url_name(self):
+        for _ in range(3):
+            self.client.get(reverse('store:product_detail', args=[self.products[0].id]))
+        self.client.get(reverse('store:about_us'))
+
+        staff = CustomUser.objects.create_user(email="staff@example.com", username="staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+        routes = self.client.get(reverse('metrics')).json()['routes']
+        detail = routes['store:product_detail']
+        self.assertEqual(detail['requests'], 3)
+        self.assertEqual(sum(detail['latency_histogram_ms'].values()), 3)
+        self.assertGreater(detail['mean_sql_queries'], 0)
+        self.assertEqual(routes['store:about_us']['requests'], 1)
+
+    def test_metrics_are_staff_only(self):
+        user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="x")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('petshop.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('store:category_detail', args=[self.category.id]))
+        self.assertIn('store:category_detail', logs.output[0])
+        self.assertIn('"store_product"', logs.output[0])
+
+
+class SyntheticDataTests(TestCase):
+
+    def test_generate_catalog(self):
+        call_command('generate_catalog', products=40, categories=2, users=3, orders=2, lines=2, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Order.objects.count(), 6)
+        self.assertEqual(OrderLine.objects.count(), 12)
+        self.assertEqual(Cart.objects.count(), 3)
+        self.assertFalse(cart_totals.drifted().exists())
+
+        shopper = CustomUser.objects.order_by('id').first()
+        self.assertTrue(self.client.login(email=shopper.email, password=synthetic.SHOPPER_PASSWORD))
+        response = self.client.get(reverse('cart:order_history'))
+        self.assertEqual(len(response.context['orders']), 2)
+        # The search index was rebuilt after the bulk inserts
+        word = Product.objects.first().name.split()[0]
+        self.assertTrue(search.search_products(word))
 
-# Create your tests here.
@@ -0,0 +1,163 @@
+"""
+In-process prefix index behind the header typeahead (`ajax_search_all`).
+
+Every word start of every product, category and subcategory name is kept in
+one sorted array and looked up with bisect, so a keystroke never reaches the
+database. Matches are capped and ordered by popularity. The index is rebuilt
+lazily when the catalog version changes.
+"""
+import heapq
+import threading
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .catalog import get_catalog_version
+from .models import Category, SubCategory, Product
+from .search import tokenize
+
+# Results returned per kind (products, categories, subcategories)
+TYPEAHEAD_LIMIT = 8
+
+# Prefixes matching more index entries than this get their top results
+# precomputed, so a lookup never scans more than this many entries.
+HEAVY_PREFIX_SIZE = 256
+
+KINDS = ('products', 'categories', 'subcategories')
+
+
+def _word_keys(name):
+    """ 'Royal Canin Mini' -> ['royal canin mini', 'canin mini', 'mini'] """
+    tokens = tokenize(name)
+    return [' '.join(tokens[i:]) for i in range(len(tokens))]
+
+
+class PrefixIndex:
+
+    def __init__(self, rows):
+        """ `rows` are (kind, popularity, payload) with payload['name'] set. """
+        entries = []
+        self.payloads = []
+        for kind, popularity, payload in rows:
+            ref = len(self.payloads)
+            self.payloads.append((kind, popularity, payload))
+            for key in _word_keys(payload['name']):
+                entries.append((key, ref))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = [ref for _, ref in entries]
+        self.heavy_prefixes = self._precompute()
+
+    def _precompute(self):
+        heavy = {}
+        pending = [('', 0, len(self.keys))]
+        while pending:
+            prefix, lo, hi = pending.pop()
+            if hi - lo <= HEAVY_PREFIX_SIZE:
+                continue
+            if prefix:
+                heavy[prefix] = self._top(set(self.refs[lo:hi]))
+            # Split the range by the next character; keys equal to the prefix come first
+            depth = len(prefix)
+            position = lo
+            while position < hi and len(self.keys[position]) == depth:
+                position += 1
+            while position < hi:
+                child = prefix + self.keys[position][depth]
+                end = bisect_left(self.keys, child + '\U0010ffff', position, hi)
+                pending.append((child, position, end))
+                position = end
+        return heavy
+
+    def _top(self, refs):
+        results = {kind: [] for kind in KINDS}
+        by_kind = {kind: [] for kind in KINDS}
+        for ref in refs:
+            kind, popularity, _ = self.payloads[ref]
+            by_kind[kind].append((popularity, -ref))
+        for kind, scored in by_kind.items():
+            for _, neg_ref in heapq.nlargest(TYPEAHEAD_LIMIT, scored):
+                results[kind].append(self.payloads[-neg_ref][2])
+        return results
+
+    def lookup(self, query):
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return {kind: [] for kind in KINDS}
+        if prefix in self.heavy_prefixes:
+            return self.heavy_prefixes[prefix]
+        refs = set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            refs.add(self.refs[position])
+            position += 1
+        return self._top(refs)
+
+
+def build_index():
+    rows = []
+    products = Product.objects.annotate(in_carts=Count('cartitem')).values_list('id', 'name', 'best_selling', 'in_carts')
+    for pk, name, best_selling, in_carts in products.iterator():
+        rows.append(('products', (best_selling, in_carts), {'id': pk, 'name': name}))
+    for pk, name, product_count in Category.objects.annotate(n=Count('products')).values_list('id', 'name', 'n'):
+        rows.append(('categories', (False, product_count), {'id': pk, 'name': name}))
+    subcategories = SubCategory.objects.annotate(n=Count('products')).values_list(
+        'id', 'name', 'category_id', 'category__name', 'n'
+    )
+    for pk, name, category_id, category_name, product_count in subcategories:
+        rows.append(('subcategories', (False, product_count), {
+            'id': pk, 'name': name, 'category_id': category_id, 'category__name': category_name,
+        }))
+    return PrefixIndex(rows)
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_index(version=None):
+    """
+    Return the process-wide index, rebuilding it if the catalog changed.
+    While one thread rebuilds, the others keep serving the previous index.
+    """
+    global _index, _index_version
+    version = version or get_catalog_version()
+    if _index_version == version:
+        return _index
+    if _lock.acquire(blocking=_index is None):
+        try:
+            if _index_version != version:
+                _index = build_index()
+                _index_version = version
+        finally:
+            _lock.release()
+    return _index
+
+
+def typeahead(query, version=None):
+    return get_index(version).lookup(query)
+
+
+def _rebuild(version):
+    try:
+        return get_index(version)
+    finally:
+        close_old_connections()  # An executor thread: no request_finished closes its connection
+
+
+async def atypeahead(query):
+    """
+    typeahead() for async views: only a rebuild of the index leaves the event
+    loop. The rebuild runs in its own thread rather than the process's one
+    thread-sensitive thread, which every other async view's ORM calls share.
+    """
+    version = get_catalog_version()
+    # _index is assigned before _index_version, so a matching version means a current index
+    if _index_version == version or (_index is not None and _lock.locked()):
+        index = _index  # Current, or stale while another request rebuilds it
+    else:
+        index = await sync_to_async(_rebuild, thread_sensitive=False)(version)
+    return index.lookup(query)
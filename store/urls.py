@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'store'
 
+# ✅ The async views only pay off on an event loop; under WSGI each call would cost an async_to_sync hop
+ASYNC_VIEWS = settings.SERVER_INTERFACE == 'asgi'
+
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -12,10 +16,11 @@ urlpatterns = [
     path("change-password/", views.change_password, name="change_password"),
     path('category/<int:id>/', views.category_detail, name='category_detail'),  
     path('category/<int:id>/subcategory/<int:subcategory_id>/', views.category_detail, name='subcategory_detail'),  
-    path('ajax/search/', views.ajax_search_all, name='ajax_search'),
+    path('ajax/search/', views.aajax_search_all if ASYNC_VIEWS else views.ajax_search_all, name='ajax_search'),
     path('search/',views.search_results, name='search_results'),  
+    path('products/', views.product_list_json, name='product_list_json'),
     path('product/<int:id>/', views.product_detail, name='product_detail'),
-    path('get-cart-item-count/', views.get_cart_item_count, name='get_cart_item_count'),
+    path('get-cart-item-count/', views.aget_cart_item_count if ASYNC_VIEWS else views.get_cart_item_count, name='get_cart_item_count'),
     path('about/', views.about_us, name='about_us'),
     path('Privacy_policy/', views.Privacy_policy, name='Privacy-policy'),
 ]
@@ -1,16 +1,28 @@
 from django.shortcuts import render, redirect ,get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from userlogin.models import ContactInfo
 from django.contrib.auth import update_session_auth_hash
+from userlogin.middleware import invalidate_user
 from .models import SliderImage ,Category, SubCategory, Product
 from django.http import JsonResponse
-from django.db.models import Q
-import random
-from cart.models import Cart , CartItem
+from django.core.paginator import Paginator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+import hashlib
+from cart.summary import aget_cart_summary, get_cart_summary
+from .search import search_products, filter_products
+from .pagination import SORTS, paginate_keyset
+from .catalog import get_catalog_version
+from .typeahead import atypeahead, typeahead
+from .related import related_products as get_related_products
+from .recommendations import bought_together as get_bought_together
+from .page_cache import cache_anonymous_page
+
+SEARCH_RESULTS_PER_PAGE = 24
 
 @login_required(login_url='userlogin:login')
 def profile(request):
-    categories = Category.objects.all()
     if request.method == "POST":
         phone_number = request.POST.get("phone_number")
         first_name = request.POST.get("first_name")
@@ -35,12 +47,11 @@ def profile(request):
         )
         return redirect("store:address")  
 
-    return render(request, "profile.html" , {'categories': categories}) 
+    return render(request, "profile.html") 
 
 @login_required(login_url='userlogin:login')
 def update_contact(request, contact_id):
     contact = get_object_or_404(ContactInfo, id=contact_id, user=request.user)
-    categories = Category.objects.all()
     if request.method == "POST":
         contact.phone_number = request.POST.get("phone_number")
         contact.first_name = request.POST.get("first_name")
@@ -53,19 +64,17 @@ def update_contact(request, contact_id):
         contact.save()
         return redirect("store:address")  
 
-    return render(request, "update_contact.html", {"contact": contact ,'categories': categories})
+    return render(request, "update_contact.html", {"contact": contact})
 
 @login_required(login_url='userlogin:login')
 def address(request):
-    categories = Category.objects.all()
-    return render(request, "address.html" , {'categories': categories})
+    return render(request, "address.html")
 
 
 @login_required(login_url='userlogin:login')
 def change_password(request):
     error_message = None
     success_message = None
-    categories = Category.objects.all()
     if request.method == "POST":
         old_password = request.POST.get("old_password")
         new_password = request.POST.get("new_password")
@@ -80,38 +89,41 @@ def change_password(request):
         else:
             request.user.set_password(new_password)
             request.user.save()
+            invalidate_user(request.user)  # Other sessions of this user must be checked against the new hash
             
             update_session_auth_hash(request, request.user)
 
             success_message = "Your password has been changed successfully."
             error_message = None  
 
-    return render(request, "change_password.html", {"error_message": error_message, "success_message": success_message , 'categories': categories})
+    return render(request, "change_password.html", {"error_message": error_message, "success_message": success_message})
 
+@cache_anonymous_page(stock_scope=lambda: 'best-selling')
 def index(request):
     slider_images = SliderImage.objects.all()
-    categories = Category.objects.all()
-    best_selling_products = Product.objects.filter(best_selling=True)
-    
-    for product in best_selling_products:
-        main_image = product.images.filter(is_main=True).first()
-        product.main_image = main_image
+    best_selling_products = Product.objects.filter(best_selling=True).with_main_image()
 
     # Check if the main product is in the cart
-    product_in_cart = False
-    cart_product_ids = []  # Store all product IDs in the cart
-    if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_product_ids = list(cart_items.values_list('product_id', flat=True))
-        product_in_cart = product.id in cart_product_ids
+    cart_product_ids = get_cart_summary(request)['product_ids']  # Store all product IDs in the cart
+    product_in_cart = any(p.id in cart_product_ids for p in best_selling_products)
+
+    return render(request, 'index.html', {'slider_images': slider_images , 'products': best_selling_products,'product_in_cart': product_in_cart,'cart_product_ids': cart_product_ids,})
 
-    return render(request, 'index.html', {'slider_images': slider_images , 'categories': categories , 'products': best_selling_products,'product_in_cart': product_in_cart,'cart_product_ids': cart_product_ids,})
 
+def _keyset_page(request, products):
+    """ Keyset page of `products` for the sort, cursor and page_size query parameters. """
+    return paginate_keyset(
+        products.with_main_image(),
+        sort=request.GET.get('sort'),
+        cursor=request.GET.get('cursor'),
+        page_size=request.GET.get('page_size'),
+    )
 
+
+@cache_anonymous_page(stock_scope=lambda id, subcategory_id=None: f'category:{id}')
 def category_detail(request, id, subcategory_id=None):
     
     category = get_object_or_404(Category, id=id)
-    categories = Category.objects.all()
     
     subcategories = SubCategory.objects.filter(category=category)
     
@@ -122,26 +134,20 @@ def category_detail(request, id, subcategory_id=None):
         selected_subcategory = None
         products = Product.objects.filter(category=category)
 
-    for product in products:
-        main_image = product.images.filter(is_main=True).first()
-        product.main_image = main_image
-
-
+    page = _keyset_page(request, products)
+    products = page.object_list
 
     # Check if the main product is in the cart
-    product_in_cart = False
-    cart_product_ids = []  # Store all product IDs in the cart
-    if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_product_ids = list(cart_items.values_list('product_id', flat=True))
-        product_in_cart = product.id in cart_product_ids
+    cart_product_ids = get_cart_summary(request)['product_ids']  # Store all product IDs in the cart
+    product_in_cart = any(p.id in cart_product_ids for p in products)
 
     return render(request, 'category_details.html', {
         'category': category,
         'subcategories': subcategories,
         'products': products,
+        'page': page,
+        'sorts': SORTS,
         'selected_subcategory': subcategory_id,
-        'categories': categories,
         'product_in_cart':product_in_cart,
         'cart_product_ids':cart_product_ids,
     })
@@ -159,81 +165,116 @@ def subcategory_detail(request, id):
     })
 
 
+def _typeahead_etag(request):
+    query = request.GET.get('q', '').strip().lower()
+    return hashlib.md5(f"{get_catalog_version()}:{query}".encode()).hexdigest()
+
+
+@cache_control(public=True, max_age=60)
+@condition(etag_func=_typeahead_etag)
 def ajax_search_all(request):
+    # Served from the in-process prefix index; repeated prefixes are answered
+    # by the browser cache or with a 304 from the ETag.
     query = request.GET.get('q', '').strip()
     results = {'products': [], 'categories': [], 'subcategories': []}
 
     if query:
-        
-        products = Product.objects.filter(name__icontains=query).values('id', 'name')
-        categories = Category.objects.filter(name__icontains=query).values('id', 'name')
-        subcategories = SubCategory.objects.filter(name__icontains=query).values('id', 'name', 'category_id', 'category__name')
+        results = typeahead(query)
 
-        results['products'] = list(products)
-        results['categories'] = list(categories)
-        results['subcategories'] = list(subcategories)
+    return JsonResponse({'results': results})
+
+
+@cache_control(public=True, max_age=60)
+@condition(etag_func=_typeahead_etag)
+async def aajax_search_all(request):
+    # ajax_search_all for ASGI (store/urls.py)
+    query = request.GET.get('q', '').strip()
+    results = {'products': [], 'categories': [], 'subcategories': []}
+
+    if query:
+        results = await atypeahead(query)
 
     return JsonResponse({'results': results})
 
 
+def product_list_json(request):
+    """
+    "Load more" endpoint: a keyset page of products, optionally restricted to
+    a category, subcategory or search query, plus the cursor of the next page.
+    """
+    products = Product.objects.all()
+    category_id = request.GET.get('category', '')
+    if category_id.isdigit():
+        products = products.filter(category_id=category_id)
+    subcategory_id = request.GET.get('subcategory', '')
+    if subcategory_id.isdigit():
+        products = products.filter(subcategory_id=subcategory_id)
+    query = request.GET.get('q', '').strip()
+    if query:
+        products = filter_products(products, query)
+
+    page = _keyset_page(request, products)
+    cart_product_ids = get_cart_summary(request)['product_ids']
+    return JsonResponse({
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'price': str(product.price),
+                'old_price': str(product.old_price) if product.old_price else None,
+                'discount': product.discount,
+                'quantity_available': product.quantity_available,
+                'image': product.main_image.image.url if product.main_image else None,
+                'url': reverse('store:product_detail', args=[product.id]),
+                'in_cart': product.id in cart_product_ids,
+            }
+            for product in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
 def search_results(request):
     query = request.GET.get('q', '').strip()  
     results = []
-    categories = Category.objects.all()
-    if query:
-        results = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(subcategory__name__icontains=query) |
-            Q(description__icontains=query)
-        ).distinct()
-        for product in results:
-             main_image = product.images.filter(is_main=True).first()
-             product.main_image = main_image
+    page_obj = None
+    page = None
+    if query and request.GET.get('sort') in SORTS:
+        page = _keyset_page(request, filter_products(Product.objects.all(), query))
+        results = page.object_list
+    elif query:
+        # Ranked ids come from the search index; only the current page is loaded
+        paginator = Paginator(search_products(query), SEARCH_RESULTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        products = Product.objects.with_main_image().in_bulk(page_obj.object_list)
+        results = [products[pk] for pk in page_obj.object_list if pk in products]
     
     # Check if the main product is in the cart
-    product_in_cart = False
-    cart_product_ids = []  # Store all product IDs in the cart
-    if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_product_ids = list(cart_items.values_list('product_id', flat=True))
-        product_in_cart = any(p.id in cart_product_ids for p in results)
+    cart_product_ids = get_cart_summary(request)['product_ids']  # Store all product IDs in the cart
+    product_in_cart = any(p.id in cart_product_ids for p in results)
            
-    return render(request, 'search_results.html', {'query': query, 'results': results , 'categories': categories,'product_in_cart':product_in_cart,'cart_product_ids':cart_product_ids,})
+    return render(request, 'search_results.html', {'query': query, 'results': results ,'page_obj': page_obj,'page': page,'sorts': SORTS,'product_in_cart':product_in_cart,'cart_product_ids':cart_product_ids,})
 
 
 
+@cache_anonymous_page(stock_scope=lambda id: f'product:{id}')
 def product_detail(request, id):
     product = get_object_or_404(Product, id=id)
-    categories = Category.objects.all()
     images = product.images.all()  # Get all product images
 
-    # Fetch related products from the same category (excluding the current product)
-    related_products = Product.objects.filter(category=product.category).exclude(id=product.id)
-
-    # Ensure we don't get an IndexError with random.sample
-    related_products = list(related_products)
-    if len(related_products) > 4:
-        related_products = random.sample(related_products, 4)
-
-    # Add main image to each related product
-    for related_product in related_products:
-        main_image = related_product.images.filter(is_main=True).first()
-        related_product.main_image = main_image
+    # Random products from the same category, fetched without loading the whole category
+    related_products = get_related_products(product)
+    bought_together = get_bought_together(product)  # Precomputed by update_recommendations
 
     # Check if the main product is in the cart
-    product_in_cart = False
-    cart_product_ids = []  # Store all product IDs in the cart
-    if request.user.is_authenticated:
-        cart_items = CartItem.objects.filter(cart__user=request.user)
-        cart_product_ids = list(cart_items.values_list('product_id', flat=True))
-        product_in_cart = product.id in cart_product_ids
+    cart_product_ids = get_cart_summary(request)['product_ids']  # Store all product IDs in the cart
+    product_in_cart = product.id in cart_product_ids
 
     context = {
         'product': product,
-        'categories': categories,
         'images': images,
         'related_products': related_products,
+        'bought_together': bought_together,
         'product_in_cart': product_in_cart,  # Pass for the main product button logic
         'cart_product_ids': cart_product_ids,  # Pass for related products button logic
     }
@@ -244,21 +285,22 @@ def product_detail(request, id):
 
 @login_required(login_url='userlogin:login')
 def get_cart_item_count(request):
-    if request.user.is_authenticated:
-        # Get or create the user's cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        # Count the items in the cart (which are instances of CartItem)
-        cart_item_count = cart.items.count()  # Count CartItems related to the Cart
-    else:
-        cart_item_count = 0  # If the user is not authenticated, return 0
+    cart_item_count = get_cart_summary(request)['item_count']  # 0 for anonymous users
+
+    return JsonResponse({'cart_item_count': cart_item_count})
+
+
+@login_required(login_url='userlogin:login')
+async def aget_cart_item_count(request):
+    # get_cart_item_count for ASGI (store/urls.py)
+    cart_item_count = (await aget_cart_summary(request))['item_count']
 
     return JsonResponse({'cart_item_count': cart_item_count})
 
+@cache_anonymous_page
 def about_us(request):
-    categories = Category.objects.all()
-    return render(request, 'about_us.html', {'categories': categories})
+    return render(request, 'about_us.html')
 
+@cache_anonymous_page
 def Privacy_policy(request):
-    categories = Category.objects.all()
-    return render(request, 'Privacy-policy.html', {'categories': categories})
\ No newline at end of file
+    return render(request, 'Privacy-policy.html')
\ No newline at end of file
@@ -0,0 +1,64 @@
+import importlib.util
+import logging
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from petshop.passwords import PROFILES, password_hashers
+from store.benchmark import measure, throwaway_database
+from userlogin import throttle
+from userlogin.models import CustomUser
+
+PASSWORD = "correct horse battery staple"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure logins per second on one core under each password hasher profile, "
+        "and the cost of a login refused by the throttle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help="Measured logins per profile.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':<20}{'hash ms':>9}{'login p50 ms':>14}{'p99 ms':>9}{'logins/s/core':>15}")
+        with throwaway_database():
+            for profile in PROFILES:
+                if profile == 'argon2' and importlib.util.find_spec('argon2') is None:
+                    self.stdout.write(f"{profile:<20}  skipped: argon2-cffi is not installed")
+                    continue
+                with override_settings(PASSWORD_HASHERS=password_hashers({'PASSWORD_HASHER': profile})):
+                    self.run_profile(profile, options)
+
+            # Refused before hashing: the floor a credential stuffing run is held to
+            logging.getLogger('django.request').setLevel(logging.ERROR)  # One 429 warning per attempt
+            client = Client(SERVER_NAME='localhost')
+            email = "throttled@example.com"
+            for _ in range(throttle.LIMITS['email'][0]):
+                client.post(reverse('userlogin:login'), {'email': email, 'password': "wrong"})
+            refused = measure(
+                lambda: client.post(reverse('userlogin:login'), {'email': email, 'password': PASSWORD}),
+                repeat=options['logins'],
+            )
+            self.stdout.write(
+                f"{'throttled':<20}{'-':>9}{refused['p50_ms']:>14.1f}{refused['p99_ms']:>9.1f}"
+                f"{1000 / refused['mean_ms']:>15.1f}"
+            )
+            cache.clear()
+
+    def run_profile(self, profile, options):
+        user = CustomUser.objects.create_user(email=f"{profile}@example.com", username=profile, password=PASSWORD)
+        hash_ms = measure(lambda: get_hasher().encode(PASSWORD, get_hasher().salt()), repeat=3)['mean_ms']
+        client = Client(SERVER_NAME='localhost')
+        login = measure(
+            lambda: client.post(reverse('userlogin:login'), {'email': user.email, 'password': PASSWORD}),
+            repeat=options['logins'],
+        )
+        self.stdout.write(
+            f"{profile:<20}{hash_ms:>9.1f}{login['p50_ms']:>14.1f}{login['p99_ms']:>9.1f}"
+            f"{1000 / login['mean_ms']:>15.1f}"
+        )
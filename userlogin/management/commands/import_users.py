@@ -0,0 +1,99 @@
+import csv
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from userlogin.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Import customers from a CSV file with the columns email, username, password and optionally "
+        "first_name and last_name. `password` must already be hashed in a format listed in "
+        "PASSWORD_HASHERS (e.g. pbkdf2_sha256$...), or be empty for an unusable password; "
+        "hashes are stored as they are and upgraded at each user's first login. Rows whose email "
+        "or username is already taken are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate and count without writing.")
+
+    def handle(self, *args, **options):
+        self.created = self.existing = 0
+        self.invalid = []
+        self.seen_emails = set()
+        self.seen_usernames = set()
+
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            missing = {'email', 'username', 'password'} - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+            rows = enumerate(reader, start=2)  # Line numbers, after the header
+            while batch := list(islice(rows, options['batch_size'])):
+                self.import_batch(batch, options['dry_run'])
+
+        for line, reason in self.invalid:
+            self.stderr.write(f"Line {line}: {reason}")
+        verb = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(
+            f"{verb} {self.created} users; skipped {self.existing} already registered and {len(self.invalid)} invalid."
+        )
+
+    def import_batch(self, batch, dry_run):
+        users = []
+        for line, row in batch:
+            user = self.build_user(line, row)
+            if user is not None:
+                users.append(user)
+
+        # ✅ One query per batch for the emails and usernames already registered
+        taken = CustomUser.objects.filter(
+            Q(email__in=[user.email for user in users]) | Q(username__in=[user.username for user in users if user.username])
+        ).values_list('email', 'username')
+        taken_emails = {email for email, _ in taken}
+        taken_usernames = {username for _, username in taken if username}
+        new_users = [user for user in users if user.email not in taken_emails and user.username not in taken_usernames]
+        self.existing += len(users) - len(new_users)
+
+        if not dry_run:
+            try:
+                with transaction.atomic():
+                    CustomUser.objects.bulk_create(new_users)
+            except IntegrityError as e:
+                raise CommandError(f"Users registered during the import collided with this batch: {e}")
+        self.created += len(new_users)
+
+    def build_user(self, line, row):
+        email = CustomUser.objects.normalize_email((row['email'] or '').strip())
+        username = (row['username'] or '').strip() or None
+        password = (row['password'] or '').strip()
+        if not email:
+            self.invalid.append((line, "no email"))
+            return None
+        if email in self.seen_emails or (username and username in self.seen_usernames):
+            self.invalid.append((line, "email or username repeated in the file"))
+            return None
+        if password:
+            try:
+                identify_hasher(password)
+            except ValueError:
+                self.invalid.append((line, "password is not a hash in a format PASSWORD_HASHERS can verify"))
+                return None
+        else:
+            password = make_password(None)  # Unusable: the customer resets it
+        self.seen_emails.add(email)
+        if username:
+            self.seen_usernames.add(username)
+        return CustomUser(
+            email=email,
+            username=username,
+            password=password,
+            first_name=(row.get('first_name') or '').strip(),
+            last_name=(row.get('last_name') or '').strip(),
+        )
@@ -0,0 +1,77 @@
+"""
+Cached users for AuthenticationMiddleware.
+
+AuthenticationMiddleware loads the user from the database on every request
+that touches `request.user`, cart polling included. The middleware below
+keeps each authenticated user in the cache for USER_CACHE_TIMEOUT seconds
+(per process with the default LocMemCache), next to the session auth hash
+it was verified against. A session carrying another hash, such as after a
+password change, misses and is checked against the database as usual.
+
+`invalidate_user` drops the cached user; it is called on password change,
+logout and every save of the user. With a cache that is not shared between
+processes, another process can serve its copy for at most
+USER_CACHE_TIMEOUT seconds.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+# Seconds a user is served from the cache
+USER_CACHE_TIMEOUT = 30
+
+
+def _cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def invalidate_user(user):
+    """ Drop the cached copy of `user`. """
+    if user.pk is not None:
+        cache.delete(_cache_key(user.pk))
+
+
+def _cached(entry, session_hash):
+    # (session auth hash, user) as stored by get_user; only served to sessions with the same hash
+    if entry is not None and session_hash and entry[0] == session_hash:
+        return entry[1]
+    return None
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        user_id = request.session.get(auth.SESSION_KEY)
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+        user = _cached(cache.get(_cache_key(user_id)), session_hash) if user_id else None
+        if user is None:
+            user = auth.get_user(request)
+            if user.is_authenticated and session_hash:
+                cache.set(_cache_key(user.pk), (session_hash, user), USER_CACHE_TIMEOUT)
+        request._cached_user = user
+    return request._cached_user
+
+
+async def auser(request):
+    if not hasattr(request, '_acached_user'):
+        user_id = await request.session.aget(auth.SESSION_KEY)
+        session_hash = await request.session.aget(auth.HASH_SESSION_KEY)
+        user = _cached(await cache.aget(_cache_key(user_id)), session_hash) if user_id else None
+        if user is None:
+            user = await sync_to_async(auth.get_user)(request)
+            if user.is_authenticated and session_hash:
+                await cache.aset(_cache_key(user.pk), (session_hash, user), USER_CACHE_TIMEOUT)
+        request._acached_user = user
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """ AuthenticationMiddleware, with users served from the cache. """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(auser, request)
@@ -1,3 +1,208 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from petshop import passwords, sessions
+from .models import CustomUser
+from . import middleware, throttle
+
+
+class PasswordHasherProfileTests(TestCase):
+
+    def test_scrypt_is_the_default(self):
+        hashers = passwords.password_hashers(environ={})
+        self.assertEqual(hashers[0], 'petshop.passwords.TunedScryptPasswordHasher')
+        self.assertEqual(sorted(hashers), sorted(passwords.VERIFYING_HASHERS))
+
+    def test_profile_picks_the_preferred_hasher(self):
+        hashers = passwords.password_hashers(environ={'PASSWORD_HASHER': 'pbkdf2'})
+        self.assertEqual(hashers[0], 'django.contrib.auth.hashers.PBKDF2PasswordHasher')
+        with self.assertRaises(ValueError):
+            passwords.password_hashers(environ={'PASSWORD_HASHER': 'md5'})
+
+    def test_one_hasher_per_algorithm(self):
+        algorithms = [hasher.algorithm for hasher in get_hashers()]
+        self.assertEqual(len(algorithms), len(set(algorithms)))
+
+    def test_login_rehashes_old_passwords(self):
+        user = CustomUser.objects.create(
+            email="old@example.com", username="old", password=make_password("secret-pass", hasher='pbkdf2_sha256'),
+        )
+        self.client.post(reverse('userlogin:login'), {'email': user.email, 'password': "secret-pass"})
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$32768$'))
+        self.assertTrue(user.check_password("secret-pass"))
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+
+    def login(self, password, email="buyer@example.com", **extra):
+        return self.client.post(reverse('userlogin:login'), {'email': email, 'password': password}, **extra)
+
+    def test_failures_per_email_are_throttled_before_hashing(self):
+        limit = throttle.LIMITS['email'][0]
+        for _ in range(limit):
+            self.assertEqual(self.login("wrong").status_code, 200)
+        with patch('userlogin.views.authenticate') as authenticate:
+            response = self.login("secret-pass")
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+
+    def test_failures_from_another_ip_do_not_lock_the_owner_out(self):
+        for _ in range(throttle.LIMITS['email'][0]):
+            self.login("wrong", REMOTE_ADDR='10.0.0.9')
+        self.assertEqual(self.login("secret-pass", REMOTE_ADDR='10.0.0.9').status_code, 429)
+        self.assertEqual(self.login("secret-pass").status_code, 302)
+
+    def test_failures_per_ip_are_throttled(self):
+        with patch.dict(throttle.LIMITS, ip=(3, 300)):
+            for i in range(3):
+                self.login("wrong", email=f"guess{i}@example.com")
+            self.assertEqual(self.login("secret-pass").status_code, 429)
+            # Another address is unaffected
+            self.assertEqual(self.login("secret-pass", REMOTE_ADDR='10.0.0.2').status_code, 302)
+
+    def test_success_clears_the_email_count(self):
+        limit = throttle.LIMITS['email'][0]
+        for _ in range(limit - 1):
+            self.login("wrong")
+        self.assertEqual(self.login("secret-pass").status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.login("wrong").status_code, 200)
+        self.assertEqual(self.login("secret-pass").status_code, 302)
+
+
+class RegistrationTests(TestCase):
+
+    def setUp(self):
+        CustomUser.objects.create(email="taken@example.com", username="taken", password=make_password(None))
+
+    def register(self, email, username):
+        return self.client.post(reverse('userlogin:register'), {
+            'email': email, 'username': username, 'password': "secret-pass", 'confirm_password': "secret-pass",
+        })
+
+    def test_duplicates_are_found_with_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.register("taken@example.com", "new")
+        self.assertContains(response, "Email already exists")
+        with self.assertNumQueries(1):
+            response = self.register("new@example.com", "taken")
+        self.assertContains(response, "Username already exists")
+
+    def test_constraint_violation_maps_to_message(self):
+        # Someone else registered between the lookup and the insert
+        with patch('userlogin.views._taken', side_effect=[None, 'Username already exists']):
+            response = self.register("new@example.com", "taken")
+        self.assertContains(response, "Username already exists")
+        self.assertFalse(CustomUser.objects.filter(email="new@example.com").exists())
+
+    def test_register(self):
+        self.assertRedirects(self.register("new@example.com", "new"), reverse('userlogin:login'), fetch_redirect_response=False)
+        self.assertTrue(CustomUser.objects.get(email="new@example.com").check_password("secret-pass"))
+
+
+class ImportUsersTests(TestCase):
+
+    def import_csv(self, content, **options):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'users.csv')
+        with open(path, 'w') as f:
+            f.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_users', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_keeps_hashes_and_skips_existing(self):
+        CustomUser.objects.create(email="old@example.com", username="old", password=make_password(None))
+        legacy_hash = make_password("legacy-pass", hasher='pbkdf2_sha1')
+        out, err = self.import_csv(
+            "email,username,password,first_name\n"
+            f"ana@example.com,ana,{legacy_hash},Ana\n"
+            "ben@example.com,,,\n"
+            "old@example.com,someone,,\n"
+            "cat@example.com,cat,plain-text-password,\n"
+            "ana@example.com,ana2,,\n",
+            batch_size=2,
+        )
+        self.assertIn("Imported 2 users; skipped 1 already registered and 2 invalid.", out)
+        self.assertIn("Line 5:", err)
+        self.assertIn("Line 6:", err)
+
+        ana = CustomUser.objects.get(email="ana@example.com")
+        self.assertEqual((ana.username, ana.first_name, ana.password), ("ana", "Ana", legacy_hash))
+        self.assertTrue(ana.check_password("legacy-pass"))
+        self.assertFalse(CustomUser.objects.get(email="ben@example.com").has_usable_password())
+
+    def test_dry_run_writes_nothing(self):
+        out, _ = self.import_csv("email,username,password\nana@example.com,ana,\n", dry_run=True)
+        self.assertIn("Would import 1 users", out)
+        self.assertFalse(CustomUser.objects.exists())
+
+
+class SessionProfileTests(TestCase):
+
+    def test_profiles(self):
+        self.assertEqual(sessions.session_engine(environ={}), 'django.contrib.sessions.backends.db')
+        self.assertEqual(
+            sessions.session_engine(environ={'SESSION_BACKEND': 'signed_cookies'}),
+            'django.contrib.sessions.backends.signed_cookies',
+        )
+        with self.assertRaises(ValueError):
+            sessions.session_engine(environ={'SESSION_BACKEND': 'file'})
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_skip_the_session_table(self):
+        user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        self.client.post(reverse('userlogin:login'), {'email': user.email, 'password': "secret-pass"})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('cart:view_cart')).status_code, 200)
+        self.assertFalse(any('django_session' in q['sql'] for q in queries))
+
+
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="buyer@example.com", username="buyer", password="secret-pass")
+        self.client.force_login(self.user)
+
+    def user_queries(self, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(reverse('cart:view_cart'))
+        return response, len([q for q in queries if 'FROM "userlogin_customuser"' in q['sql']])
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(self.user_queries()[1], 1)
+        response, queries = self.user_queries()
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_password_change_signs_out_other_sessions(self):
+        other = Client()
+        other.force_login(self.user)
+        self.user_queries(other)  # Cached with the old session hash
+
+        self.client.post(reverse('store:change_password'), {
+            'old_password': "secret-pass", 'new_password': "new-secret-pass", 'confirm_password': "new-secret-pass",
+        })
+        self.assertEqual(self.user_queries()[0].status_code, 200)
+        response, _ = self.user_queries(other)
+        self.assertRedirects(response, f"{reverse('userlogin:login')}?next={reverse('cart:view_cart')}", fetch_redirect_response=False)
+
+    def test_logout_drops_the_cached_user(self):
+        self.user_queries()
+        self.client.get(reverse('userlogin:logout'))
+        self.assertIsNone(cache.get(middleware._cache_key(self.user.pk)))
@@ -0,0 +1,50 @@
+"""
+Login throttling.
+
+Failed logins are counted in the cache per client IP, and per email from
+that IP, over a fixed window. Once either count reaches its limit, further
+attempts are refused before the password is hashed, so credential stuffing
+costs the server a cache lookup instead of a password hash. The email count
+is kept per IP so that failures from elsewhere cannot lock the customer out
+of their own account. A successful login clears it.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+# scope -> (failed attempts allowed, window in seconds)
+LIMITS = {
+    'ip': (30, 300),  # Generous: shoppers behind one NAT share an address
+    'email': (5, 300),  # Per email and IP
+}
+
+
+def _key(scope, value):
+    digest = hashlib.md5(value.strip().lower().encode()).hexdigest()
+    return f"login-throttle:{scope}:{digest}"
+
+
+def _keys(request, email):
+    ip = request.META.get('REMOTE_ADDR', '')
+    return {'ip': _key('ip', ip), 'email': _key('email', f"{email or ''}|{ip}")}
+
+
+def is_throttled(request, email):
+    """ Whether this client or this account has used up its failed attempts. """
+    keys = _keys(request, email)
+    counts = cache.get_many(list(keys.values()))
+    return any(counts.get(key, 0) >= LIMITS[scope][0] for scope, key in keys.items())
+
+
+def record_failure(request, email):
+    for scope, key in _keys(request, email).items():
+        # add() starts the window; incr() leaves its expiry alone
+        if not cache.add(key, 1, LIMITS[scope][1]):
+            try:
+                cache.incr(key)
+            except ValueError:  # Expired between add() and incr()
+                cache.add(key, 1, LIMITS[scope][1])
+
+
+def reset(request, email):
+    cache.delete(_keys(request, email)['email'])
@@ -1,7 +1,20 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from .models import CustomUser
 from django.contrib.auth.hashers import make_password
+from . import throttle
+from .middleware import invalidate_user
+
+def _taken(email, username):
+    """ The error message for an email or username already registered, else None. """
+    clashes = list(CustomUser.objects.filter(Q(email=email) | Q(username=username)).values_list('email', flat=True)[:2])
+    if not clashes:
+        return None
+    if email in clashes:
+        return 'Email already exists'
+    return 'Username already exists'
 
 def register_view(request):
     if request.method == 'POST':
@@ -13,14 +26,18 @@ def register_view(request):
         if password != confirm_password:
             return render(request, 'register.html', {'error': 'Passwords do not match'})
 
-        if CustomUser.objects.filter(email=email).exists():
-            return render(request, 'register.html', {'error': 'Email already exists'})
-
-        if CustomUser.objects.filter(username=username).exists():
-            return render(request, 'register.html', {'error': 'Username already exists'})
+        # ✅ One lookup for both, before spending a password hash
+        error = _taken(email, username)
+        if error:
+            return render(request, 'register.html', {'error': error})
 
         user = CustomUser(email=email, username=username, password=make_password(password))
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            # Registered concurrently since the lookup: the unique constraints have the last word
+            return render(request, 'register.html', {'error': _taken(email, username) or 'Registration failed, please try again'})
         return redirect('userlogin:login')
 
     return render(request, 'register.html')
@@ -30,11 +47,18 @@ def login_view(request):
         email = request.POST.get('email')
         password = request.POST.get('password')
 
+        # ✅ Refused before authenticate() spends a password hash on it
+        if throttle.is_throttled(request, email):
+            return render(request, 'login.html', {'error': 'Too many failed attempts. Try again in a few minutes.'}, status=429)
+
+        # Rehashes the password if its hash predates the current PASSWORD_HASHERS profile
         user = authenticate(request, email=email, password=password)
         if user is not None:
+            throttle.reset(request, email)
             login(request, user)
             return redirect('store:index')
         else:
+            throttle.record_failure(request, email)
             return render(request, 'login.html', {'error': 'Invalid credentials'})
 
     return render(request, 'login.html')
@@ -42,5 +66,6 @@ def login_view(request):
 
 
 def logout_view(request):
+    invalidate_user(request.user)
     logout(request)
     return redirect('store:index')